@@ -0,0 +1,127 @@
+"""
+Compare the JSON codecs on realistic subscription messages.
+
+    python benchmarks/bench_codecs.py [--number N] [--json]
+"""
+import argparse
+import json
+import sys
+import timeit
+from collections import OrderedDict
+
+from graphql_ws.codecs import CODECS
+
+
+def data_message(data):
+    return {"id": "1", "type": "data", "payload": OrderedDict([("data", data)])}
+
+
+PAYLOADS = {
+    "ticker": data_message(
+        {"ticker": {"symbol": "ACME", "price": 101.25, "change": -0.35, "volume": 1200}}
+    ),
+    "feed": data_message(
+        {
+            "feed": [
+                {
+                    "id": "post:{}".format(i),
+                    "author": {"id": "user:{}".format(i % 7), "name": "User Näme"},
+                    "body": "Lorem ipsum dolor sit amet " * 4,
+                    "likes": i * 3,
+                    "tags": ["graphql", "subscriptions", "websockets"],
+                }
+                for i in range(50)
+            ]
+        }
+    ),
+    "table": data_message(
+        {"rows": [{"x": i, "y": i * 0.5, "label": str(i)} for i in range(1000)]}
+    ),
+    "errors": {
+        "id": "1",
+        "type": "data",
+        "payload": {
+            "data": None,
+            "errors": [
+                {
+                    "message": "Cannot query field",
+                    "locations": [{"line": 1, "column": 3}],
+                }
+            ],
+        },
+    },
+}
+
+START_MESSAGE = json.dumps(
+    {
+        "id": "1",
+        "type": "start",
+        "payload": {
+            "query": "subscription Ticker($symbol: String!) { ticker(symbol: $symbol) "
+            "{ symbol price change volume } }",
+            "variables": {"symbol": "ACME"},
+            "operationName": "Ticker",
+        },
+    }
+)
+
+
+def bench(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    results = []
+    for codec_class in CODECS:
+        try:
+            codec = codec_class()
+        except ImportError:
+            continue
+        results.append(
+            {
+                "codec": codec.name,
+                "payload": "start (decode)",
+                "dumps_us": None,
+                "dumpb_us": None,
+                "loads_us": bench(lambda: codec.loads(START_MESSAGE), args.number),
+            }
+        )
+        for name, message in PAYLOADS.items():
+            results.append(
+                {
+                    "codec": codec.name,
+                    "payload": name,
+                    "dumps_us": bench(lambda: codec.dumps(message), args.number),
+                    "dumpb_us": bench(lambda: codec.dumpb(message), args.number),
+                    "loads_us": None,
+                }
+            )
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        return
+
+    def fmt(value):
+        return "-" if value is None else "{:.2f}".format(value)
+
+    row = "{:<10} {:<16} {:>10} {:>10} {:>10}"
+    print(row.format("codec", "payload", "dumps us", "dumpb us", "loads us"))
+    for result in results:
+        print(
+            row.format(
+                result["codec"],
+                result["payload"],
+                fmt(result["dumps_us"]),
+                fmt(result["dumpb_us"]),
+                fmt(result["loads_us"]),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
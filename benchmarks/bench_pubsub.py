@@ -0,0 +1,109 @@
+"""
+Compare publishing events through the topic and filter index of
+graphql_ws.pubsub.PubSub with filtering a global event stream in every
+subscriber, for 1k to 1M subscribers.
+
+Subscribers are spread over one channel per 100 subscribers, and every event
+is published to a single channel.
+
+    python benchmarks/bench_pubsub.py [--events N] [--max-subscribers N] [--json]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from graphql_ws.pubsub import PubSub
+
+SUBSCRIBERS = [1000, 10000, 100000, 1000000]
+PER_CHANNEL = 100
+
+
+class FilteringSubscriber:
+    # The usual resolver pattern: every subscriber sees every event and
+    # checks it against its own arguments.
+    __slots__ = ("channel", "events")
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.events = 0
+
+    def on_event(self, event):
+        if event["channel"] == self.channel:
+            self.events += 1
+
+
+def bench_filtering(subscribers, events):
+    channels = subscribers // PER_CHANNEL
+    stream = [FilteringSubscriber(i % channels) for i in range(subscribers)]
+    start = time.perf_counter()
+    for event in events:
+        for subscriber in stream:
+            subscriber.on_event(event)
+    elapsed = time.perf_counter() - start
+    assert sum(subscriber.events for subscriber in stream) == PER_CHANNEL * len(events)
+    return elapsed / len(events) * 1e6
+
+
+def bench_indexed(subscribers, events):
+    channels = subscribers // PER_CHANNEL
+    pubsub = PubSub(max_buffer_size=1)
+    for i in range(subscribers):
+        pubsub.subscribe("messages", channel=i % channels)
+    start = time.perf_counter()
+    delivered = 0
+    for event in events:
+        delivered += pubsub.publish("messages", event, channel=event["channel"])
+    elapsed = time.perf_counter() - start
+    assert delivered == PER_CHANNEL * len(events)
+    return elapsed / len(events) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--max-subscribers", type=int, default=SUBSCRIBERS[-1])
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = []
+    for subscribers in SUBSCRIBERS:
+        if subscribers > args.max_subscribers:
+            break
+        channels = subscribers // PER_CHANNEL
+        events = [
+            {"channel": random.randrange(channels), "text": "hello"}
+            for _ in range(args.events)
+        ]
+        results.append(
+            {
+                "subscribers": subscribers,
+                "events": args.events,
+                "indexed_us_per_event": bench_indexed(subscribers, events),
+                "filtering_us_per_event": bench_filtering(subscribers, events),
+            }
+        )
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        return
+
+    row = "{:>12} {:>14} {:>16} {:>8}"
+    print(row.format("subscribers", "indexed us", "filtering us", "x"))
+    for result in results:
+        print(
+            row.format(
+                result["subscribers"],
+                "{:.1f}".format(result["indexed_us_per_event"]),
+                "{:.1f}".format(result["filtering_us_per_event"]),
+                "{:.0f}".format(
+                    result["filtering_us_per_event"] / result["indexed_us_per_event"]
+                ),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Compare resolve() with the previous task-per-node implementation across
+result shapes and sizes.
+
+    python benchmarks/bench_resolve.py [--number N] [--json]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from promise import Promise
+
+from graphql_ws.base_async import is_awaitable, resolve
+
+
+async def task_per_node_resolve(data, _container=None, _key=None):
+    # The implementation resolve() replaced, kept for comparison.
+    if is_awaitable(data):
+        data = await data
+        if isinstance(data, Promise):
+            data = data.value
+        if _container is not None:
+            _container[_key] = data
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = enumerate(data)
+    else:
+        items = None
+    if items is not None:
+        children = [
+            asyncio.ensure_future(
+                task_per_node_resolve(child, _container=data, _key=key)
+            )
+            for key, child in items
+        ]
+        if children:
+            await asyncio.wait(children)
+
+
+def flat(size, awaitable_every):
+    return {
+        "field{}".format(i): make_value(i, awaitable_every) for i in range(size)
+    }
+
+
+def wide_list(size, awaitable_every):
+    rows = size // 4
+    return {
+        "rows": [
+            {
+                "id": i,
+                "name": make_value(i, awaitable_every),
+                "score": i * 0.5,
+            }
+            for i in range(rows)
+        ]
+    }
+
+
+def deep(size, awaitable_every):
+    node = {"leaf": make_value(0, awaitable_every)}
+    for i in range(1, size // 2):
+        node = {"value": make_value(i, awaitable_every), "child": node}
+    return node
+
+
+def make_value(i, awaitable_every):
+    if awaitable_every and i % awaitable_every == 0:
+        return Promise.resolve(i)
+    return i
+
+
+SHAPES = {"flat": flat, "wide_list": wide_list, "deep": deep}
+SIZES = [100, 1000, 5000]
+AWAITABLES = {"resolved": 0, "some_promises": 50}
+
+
+def bench(loop, implementation, build, number):
+    total = 0.0
+    for _ in range(number):
+        data = build()
+        start = time.perf_counter()
+        loop.run_until_complete(implementation(data))
+        total += time.perf_counter() - start
+    return total / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(10000)
+    loop = asyncio.new_event_loop()
+    results = []
+    for shape, factory in SHAPES.items():
+        for size in SIZES:
+            for awaitables, every in AWAITABLES.items():
+
+                def build():
+                    return factory(size, every)
+
+                results.append(
+                    {
+                        "shape": shape,
+                        "size": size,
+                        "awaitables": awaitables,
+                        "walker_us": bench(loop, resolve, build, args.number),
+                        "task_per_node_us": bench(
+                            loop, task_per_node_resolve, build, args.number
+                        ),
+                    }
+                )
+    loop.close()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        return
+
+    row = "{:<10} {:>6} {:<14} {:>12} {:>16} {:>8}"
+    print(row.format("shape", "size", "awaitables", "walker us", "task/node us", "x"))
+    for result in results:
+        print(
+            row.format(
+                result["shape"],
+                result["size"],
+                result["awaitables"],
+                "{:.1f}".format(result["walker_us"]),
+                "{:.1f}".format(result["task_per_node_us"]),
+                "{:.1f}".format(result["task_per_node_us"] / result["walker_us"]),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
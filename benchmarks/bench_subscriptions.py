@@ -0,0 +1,132 @@
+"""
+Compare subscription throughput through graphql-core's Rx Observables with
+the native async generator path (``native_subscriptions=True``).
+
+Events are sent to a connection which discards them, so the numbers are
+events per second of CPU time on a single core.
+
+    python benchmarks/bench_subscriptions.py [--events N] [--json]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import graphene
+
+from graphql_ws.base_async import (
+    BaseAsyncConnectionContext,
+    BaseAsyncSubscriptionServer,
+)
+from graphql_ws.constants import GQL_START
+
+
+class Point(graphene.ObjectType):
+    x = graphene.Int()
+    y = graphene.Int()
+    label = graphene.String()
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+
+
+class Subscription(graphene.ObjectType):
+    ticks = graphene.Int(count=graphene.Int())
+    points = graphene.Field(Point, count=graphene.Int())
+
+    async def resolve_ticks(root, info, count):
+        for i in range(count):
+            yield i
+
+    async def resolve_points(root, info, count):
+        for i in range(count):
+            yield {"x": i, "y": -i, "label": "point"}
+
+
+schema = graphene.Schema(query=Query, subscription=Subscription)
+
+QUERIES = {
+    "scalar": "subscription { ticks(count: %d) }",
+    "object": "subscription { points(count: %d) { x y label } }",
+}
+
+
+class Server(BaseAsyncSubscriptionServer):
+    async def handle(self, ws, request_context=None):
+        pass
+
+
+class DiscardingContext(BaseAsyncConnectionContext):
+    closed = False
+
+    def __init__(self):
+        super().__init__(ws=None)
+        self.frames = 0
+
+    async def receive(self):
+        pass
+
+    async def send(self, data):
+        self.frames += 1
+
+    async def send_encoded(self, frame):
+        self.frames += 1
+
+    async def close(self, code):
+        pass
+
+
+def bench(loop, native, query, events):
+    server = Server(schema, keep_alive=False, native_subscriptions=native)
+    context = DiscardingContext()
+    message = {"id": "1", "type": GQL_START, "payload": {"query": query % events}}
+    start = time.process_time()
+    loop.run_until_complete(server.process_message(context, message))
+    elapsed = time.process_time() - start
+    # Every event is sent, followed by the complete message.
+    assert context.frames == events + 1, context.frames
+    return events / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = []
+    for name, query in QUERIES.items():
+        results.append(
+            {
+                "query": name,
+                "events": args.events,
+                "rx_per_sec": bench(loop, False, query, args.events),
+                "native_per_sec": bench(loop, True, query, args.events),
+            }
+        )
+    loop.close()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        return
+
+    row = "{:<8} {:>8} {:>12} {:>12} {:>6}"
+    print(row.format("query", "events", "rx/s", "native/s", "x"))
+    for result in results:
+        print(
+            row.format(
+                result["query"],
+                result["events"],
+                "{:.0f}".format(result["rx_per_sec"]),
+                "{:.0f}".format(result["native_per_sec"]),
+                "{:.1f}".format(result["native_per_sec"] / result["rx_per_sec"]),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Load test every transport: serve the same subscription from each backend in
+a subprocess, and drive simulated graphql-ws clients through
+connection_init, start and the data messages.
+
+Reports connections/sec, events/sec, p50 and p99 event latency (from the
+resolver yielding an event to the client receiving it), and the server's CPU
+time and RSS. Transports whose dependencies aren't installed are skipped.
+
+    python benchmarks/bench_transports.py [--transport NAME] [--clients N]
+        [--events N] [--timeout SECONDS] [--json] [--compare RESULTS.json]
+
+Save the ``--json`` output of one release and pass it to ``--compare`` on
+another to print the ratios between them. CPU and RSS are read from /proc,
+so they are only reported on Linux.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from importlib.util import find_spec
+
+import graphene
+from rx import Observable
+
+HOST = "127.0.0.1"
+PATH = "/subscriptions"
+QUERY = "subscription ($count: Int!) { events(count: $count) }"
+TRANSPORTS = ["aiohttp", "websockets", "gevent", "channels"]
+STARTUP_TIMEOUT = 20
+TIMEOUT = 120
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+
+
+class AsyncSubscription(graphene.ObjectType):
+    events = graphene.Float(count=graphene.Int(required=True))
+
+    async def resolve_events(root, info, count):
+        for _ in range(count):
+            yield time.time()
+            await asyncio.sleep(0)
+
+
+class SyncSubscription(graphene.ObjectType):
+    events = graphene.Float(count=graphene.Int(required=True))
+
+    def resolve_events(root, info, count):
+        # Emitted from greenlets, like the async resolver yielding to the
+        # event loop between events.
+        from rx.concurrency import GEventScheduler
+
+        return Observable.range(0, count, scheduler=GEventScheduler()).map(
+            lambda i: time.time()
+        )
+
+
+async_schema = graphene.Schema(query=Query, subscription=AsyncSubscription)
+sync_schema = graphene.Schema(query=Query, subscription=SyncSubscription)
+
+
+def serve_aiohttp(port):
+    from aiohttp import web
+
+    from graphql_ws.aiohttp import AiohttpSubscriptionServer
+
+    subscription_server = AiohttpSubscriptionServer(async_schema)
+
+    async def subscriptions(request):
+        ws = web.WebSocketResponse(protocols=("graphql-ws",))
+        await ws.prepare(request)
+        await subscription_server.handle(ws)
+        return ws
+
+    app = web.Application()
+    app.router.add_get(PATH, subscriptions)
+    web.run_app(app, host=HOST, port=port, print=None, access_log=None)
+
+
+def serve_websockets(port):
+    import websockets
+
+    from graphql_ws.websockets_lib import WsLibSubscriptionServer
+
+    subscription_server = WsLibSubscriptionServer(async_schema)
+
+    async def subscriptions(ws, path):
+        await subscription_server.handle(ws)
+
+    async def main():
+        async with websockets.serve(
+            subscriptions, HOST, port, subprotocols=["graphql-ws"]
+        ):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def serve_gevent(port):
+    from gevent import pywsgi
+    from geventwebsocket.handler import WebSocketHandler
+
+    from graphql_ws.gevent import GeventSubscriptionServer
+
+    subscription_server = GeventSubscriptionServer(sync_schema)
+
+    def app(environ, start_response):
+        subscription_server.handle(environ["wsgi.websocket"])
+        return []
+
+    app.app_protocol = lambda path: "graphql-ws"
+    pywsgi.WSGIServer(
+        (HOST, port), app, handler_class=WebSocketHandler, log=None
+    ).serve_forever()
+
+
+def serve_channels(port):
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        INSTALLED_APPS=["channels"],
+        GRAPHENE={"SCHEMA": "bench_transports.async_schema"},
+    )
+    django.setup()
+
+    from channels.routing import URLRouter
+    from daphne.endpoints import build_endpoint_description_strings
+    from daphne.server import Server
+    from django.urls import path
+
+    from graphql_ws.django.consumers import GraphQLSubscriptionConsumer
+
+    application = URLRouter(
+        [path(PATH.lstrip("/"), GraphQLSubscriptionConsumer.as_asgi())]
+    )
+    Server(
+        application,
+        endpoints=build_endpoint_description_strings(host=HOST, port=port),
+        verbosity=0,
+    ).run()
+
+
+SERVERS = {
+    "aiohttp": (serve_aiohttp, ["aiohttp"]),
+    "websockets": (serve_websockets, ["websockets"]),
+    "gevent": (serve_gevent, ["gevent", "geventwebsocket"]),
+    "channels": (serve_channels, ["channels", "daphne", "graphene_django"]),
+}
+
+
+def missing_modules(transport):
+    # Some of the modules can't be imported before the server configures them.
+    return [module for module in SERVERS[transport][1] if find_spec(module) is None]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The server exited with {}".format(process.returncode))
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("The server didn't start")
+
+
+def process_stats(pid):
+    """
+    Return the CPU seconds used by a process and its current and peak RSS in
+    MB, or ``None`` where /proc isn't available.
+    """
+    try:
+        with open("/proc/{}/stat".format(pid)) as stat_file:
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        with open("/proc/{}/status".format(pid)) as status_file:
+            status = dict(
+                line.split(":", 1) for line in status_file.read().splitlines()
+            )
+    except OSError:
+        return None, None, None
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+
+    def megabytes(key):
+        return int(status[key].split()[0]) / 1024 if key in status else None
+
+    return cpu, megabytes("VmRSS"), megabytes("VmHWM")
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_client(session, url, events, connected, start, results):
+    connect_start = time.perf_counter()
+    async with session.ws_connect(url, protocols=["graphql-ws"]) as ws:
+        await ws.send_json({"type": "connection_init", "payload": {}})
+        while json.loads((await ws.receive()).data)["type"] != "connection_ack":
+            pass
+        results["connect_times"].append(time.perf_counter() - connect_start)
+        connected()
+        await start.wait()
+        await ws.send_json(
+            {
+                "id": "1",
+                "type": "start",
+                "payload": {"query": QUERY, "variables": {"count": events}},
+            }
+        )
+        latencies = results["latencies"]
+        async for message in ws:
+            data = json.loads(message.data)
+            if data["type"] == "data":
+                latencies.append(time.time() - data["payload"]["data"]["events"])
+            elif data["type"] in ("complete", "error"):
+                break
+
+
+async def drive(port, clients, events):
+    import aiohttp
+
+    url = "http://{}:{}{}".format(HOST, port, PATH)
+    results = {"connect_times": [], "latencies": []}
+    all_connected = asyncio.Event()
+    start = asyncio.Event()
+    remaining = [clients]
+
+    def connected():
+        remaining[0] -= 1
+        if not remaining[0]:
+            all_connected.set()
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        connect_start = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(
+                run_client(session, url, events, connected, start, results)
+            )
+            for _ in range(clients)
+        ]
+        await all_connected.wait()
+        connect_elapsed = time.perf_counter() - connect_start
+        events_start = time.perf_counter()
+        start.set()
+        await asyncio.gather(*tasks)
+        events_elapsed = time.perf_counter() - events_start
+    return results, connect_elapsed, events_elapsed
+
+
+def bench(transport, clients, events, timeout=TIMEOUT):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", transport, str(port)]
+    )
+    try:
+        wait_for_port(port, process)
+        cpu_before = process_stats(process.pid)[0]
+        try:
+            results, connect_elapsed, events_elapsed = asyncio.run(
+                asyncio.wait_for(drive(port, clients, events), timeout)
+            )
+        except asyncio.TimeoutError:
+            return {"transport": transport, "skipped": "timed out"}
+        cpu_after, rss, peak_rss = process_stats(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+    latencies = results["latencies"]
+    return {
+        "transport": transport,
+        "clients": clients,
+        "events_per_client": events,
+        "events_received": len(latencies),
+        "connections_per_sec": clients / connect_elapsed,
+        "events_per_sec": len(latencies) / events_elapsed,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "server_cpu_sec": None if cpu_before is None else cpu_after - cpu_before,
+        "server_rss_mb": rss,
+        "server_peak_rss_mb": peak_rss,
+    }
+
+
+COLUMNS = [
+    ("connections_per_sec", "conn/s", "{:.0f}"),
+    ("events_per_sec", "events/s", "{:.0f}"),
+    ("latency_p50_ms", "p50 ms", "{:.2f}"),
+    ("latency_p99_ms", "p99 ms", "{:.2f}"),
+    ("server_cpu_sec", "cpu s", "{:.2f}"),
+    ("server_peak_rss_mb", "rss MB", "{:.1f}"),
+]
+
+
+def format_value(template, value):
+    return "-" if value is None else template.format(value)
+
+
+def print_table(results, previous=None):
+    row = "{:<11}" + " {:>10}" * len(COLUMNS)
+    print(row.format("transport", *(title for _, title, _ in COLUMNS)))
+    for result in results:
+        if "skipped" in result:
+            print("{:<11} skipped: {}".format(result["transport"], result["skipped"]))
+            continue
+        print(
+            row.format(
+                result["transport"],
+                *(format_value(template, result[key]) for key, _, template in COLUMNS)
+            )
+        )
+        before = (previous or {}).get(result["transport"])
+        if before and "skipped" not in before:
+            print(
+                row.format(
+                    "  x before",
+                    *(
+                        format_value("{:.2f}", ratio(result[key], before.get(key)))
+                        for key, _, _ in COLUMNS
+                    )
+                )
+            )
+
+
+def ratio(value, before):
+    if value is None or not before:
+        return None
+    return value / before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--transport", action="append", choices=TRANSPORTS, help="default: all"
+    )
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--events", type=int, default=100, help="per client")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--compare", help="results of a previous --json run")
+    parser.add_argument(
+        "--timeout", type=float, default=TIMEOUT, help="seconds per transport"
+    )
+    parser.add_argument("--serve", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        transport, port = args.serve
+        SERVERS[transport][0](int(port))
+        return
+
+    import graphql_ws
+
+    results = []
+    for transport in args.transport or TRANSPORTS:
+        missing = missing_modules(transport)
+        if missing:
+            results.append(
+                {"transport": transport, "skipped": "missing " + ", ".join(missing)}
+            )
+            continue
+        results.append(bench(transport, args.clients, args.events, args.timeout))
+
+    if args.json:
+        output = {
+            "graphql_ws": graphql_ws.__version__,
+            "python": platform.python_version(),
+            "results": results,
+        }
+        json.dump(output, sys.stdout, indent=2)
+        return
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as compare_file:
+            previous = {
+                result["transport"]: result
+                for result in json.load(compare_file)["results"]
+            }
+    print_table(results, previous)
+
+
+if __name__ == "__main__":
+    main()
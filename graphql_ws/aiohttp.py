@@ -1,10 +1,28 @@
-import json
-from asyncio import shield
+import struct
+from asyncio import ensure_future, shield
 
-from aiohttp import WSMsgType
+from aiohttp import WSMsgType, web
 
-from .base import ConnectionClosedException
+from .base import ConnectionClosedException, decode_frame, encode_frame
 from .base_async import BaseAsyncConnectionContext, BaseAsyncSubscriptionServer
+from .metrics import PROMETHEUS_CONTENT_TYPE
+
+# The first byte of a final text frame.
+TEXT_FRAME = 0x80 | WSMsgType.TEXT
+
+
+def text_frame(data):
+    """
+    Build an unmasked, uncompressed text frame, as servers send them.
+    """
+    length = len(data)
+    if length < 126:
+        header = struct.pack("!BB", TEXT_FRAME, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", TEXT_FRAME, 126, length)
+    else:
+        header = struct.pack("!BBQ", TEXT_FRAME, 127, length)
+    return header + data
 
 
 class AiohttpConnectionContext(BaseAsyncConnectionContext):
@@ -14,15 +32,50 @@ class AiohttpConnectionContext(BaseAsyncConnectionContext):
             return msg.data
         elif msg.type == WSMsgType.ERROR:
             raise ConnectionClosedException()
+        elif msg.type == WSMsgType.CLOSE:
+            raise ConnectionClosedException()
         elif msg.type == WSMsgType.CLOSING:
             raise ConnectionClosedException()
         elif msg.type == WSMsgType.CLOSED:
             raise ConnectionClosedException()
 
     async def send(self, data):
+        await self.send_encoded(self.encode(data))
+
+    async def send_encoded(self, frame):
         if self.closed:
             return
-        await self.ws.send_str(json.dumps(data))
+        await self.ws.send_str(decode_frame(frame))
+
+    def get_frame_writer(self):
+        """
+        Return aiohttp's frame writer if frames can be written to it as
+        built by :func:`text_frame`, otherwise ``None``.
+        """
+        writer = getattr(self.ws, "_writer", None)
+        if writer is None or writer.compress or writer.use_mask:
+            return None
+        return writer
+
+    @property
+    def writes_bytes(self):
+        return self.get_frame_writer() is not None
+
+    async def send_encoded_batch(self, frames):
+        writer = self.get_frame_writer()
+        if writer is None:
+            return await super().send_encoded_batch(frames)
+        if self.closed:
+            return
+        if writer.transport.is_closing():
+            raise ConnectionResetError("Cannot write to closing transport")
+        # Write every frame at once and wait for the socket once, rather than
+        # going through send_str for each frame.
+        writer.transport.write(
+            b"".join(text_frame(encode_frame(frame)) for frame in frames)
+        )
+        if writer.protocol._paused:
+            await writer.protocol._drain_helper()
 
     @property
     def closed(self):
@@ -34,7 +87,9 @@ class AiohttpConnectionContext(BaseAsyncConnectionContext):
 
 class AiohttpSubscriptionServer(BaseAsyncSubscriptionServer):
     async def _handle(self, ws, request_context=None):
-        connection_context = AiohttpConnectionContext(ws, request_context)
+        connection_context = AiohttpConnectionContext(
+            ws, request_context, codec=self.codec
+        )
         await self.on_open(connection_context)
         while True:
             try:
@@ -48,4 +103,19 @@ class AiohttpSubscriptionServer(BaseAsyncSubscriptionServer):
         await self.on_close(connection_context)
 
     async def handle(self, ws, request_context=None):
-        await shield(self._handle(ws, request_context), loop=self.loop)
+        await shield(
+            ensure_future(self._handle(ws, request_context), loop=self.loop)
+        )
+
+    async def metrics_handler(self, request):
+        """
+        Serve the server's metrics in the Prometheus text format::
+
+            app.router.add_get("/metrics", subscription_server.metrics_handler)
+        """
+        if self.metrics is None:
+            raise web.HTTPNotFound()
+        return web.Response(
+            body=self.metrics.exposition().encode("utf-8"),
+            headers={"Content-Type": PROMETHEUS_CONTENT_TYPE},
+        )
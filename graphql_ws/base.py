@@ -1,43 +1,117 @@
-import json
 from collections import OrderedDict
 
-from graphql import format_error, graphql
+from graphql import graphql
+from graphql.error import GraphQLError
 
+from .codecs import JSONCodec, get_codec
 from .constants import (
     GQL_CONNECTION_ERROR,
     GQL_CONNECTION_INIT,
+    GQL_CONNECTION_KEEP_ALIVE,
     GQL_CONNECTION_TERMINATE,
     GQL_DATA,
     GQL_ERROR,
     GQL_START,
     GQL_STOP,
 )
+from .keepalive import KEEP_ALIVE_INTERVAL, TimerWheel
+from .persisted_queries import (
+    PERSISTED_QUERY_VERSION,
+    PersistedQueryMismatch,
+    PersistedQueryNotFound,
+    PersistedQueryNotSupported,
+    get_persisted_query,
+    get_query_hash,
+)
+from .registry import OperationRegistry
+from .tracing import DECODE, ENCODE, PARSE, SERIALIZE, WRITE, clock
+
+try:
+    from graphql import format_error
+
+    from .cache import DocumentCache
+except ImportError:  # graphql-core 3, see graphql_ws.core3
+    format_error = DocumentCache = None
+
+
+def execution_result_to_dict(execution_result):
+    result = OrderedDict()
+    if execution_result.data:
+        result["data"] = execution_result.data
+    if execution_result.errors:
+        result["errors"] = [format_error(error) for error in execution_result.errors]
+    return result
 
 
 class ConnectionClosedException(Exception):
     pass
 
 
+def decode_frame(frame):
+    """
+    Return an encoded frame as text, for transports that can only send text
+    messages.
+    """
+    if isinstance(frame, bytes):
+        return frame.decode("utf-8")
+    return frame
+
+
+def encode_frame(frame):
+    """
+    Return an encoded frame as UTF-8 bytes, for writing it to a socket.
+    """
+    if isinstance(frame, bytes):
+        return frame
+    return frame.encode("utf-8")
+
+
+def get_size(message):
+    """
+    Return the length of a received message, or 0 for messages which were
+    decoded by the transport.
+    """
+    if isinstance(message, dict):
+        return 0
+    try:
+        return len(message)
+    except TypeError:
+        return 0
+
+
 class BaseConnectionContext(object):
-    def __init__(self, ws, request_context=None):
+    def __init__(self, ws, request_context=None, codec=None):
         self.ws = ws
-        self.operations = {}
+        self.operations = OperationRegistry()
+        # Operation names for the metrics, see graphql_ws.metrics.Metrics.
+        self.operation_names = {}
         self.request_context = request_context
+        self.codec = codec if codec is not None else JSONCodec()
 
     def has_operation(self, op_id):
         return op_id in self.operations
 
     def register_operation(self, op_id, async_iterator):
-        self.operations[op_id] = async_iterator
+        """
+        Register an operation, returning any operation it replaced. Raises
+        :exc:`RegistryClosed` once every operation has been unsubscribed,
+        as the connection is closing.
+        """
+        return self.operations.register(op_id, async_iterator)
 
     def get_operation(self, op_id):
         return self.operations[op_id]
 
-    def remove_operation(self, op_id):
-        try:
-            return self.operations.pop(op_id)
-        except KeyError:
-            return
+    def remove_operation(self, op_id, operation=None):
+        """
+        Remove an operation and return it. With ``operation``, only that
+        operation is removed, not another one registered with the same id
+        since.
+        """
+        removed = self.operations.remove(op_id, operation)
+        if op_id not in self.operations:
+            self.operation_names.pop(op_id, None)
+        return removed
 
     def unsubscribe(self, op_id):
         async_iterator = self.remove_operation(op_id)
@@ -46,8 +120,11 @@ class BaseConnectionContext(object):
         return async_iterator
 
     def unsubscribe_all(self):
-        for op_id in list(self.operations):
-            self.unsubscribe(op_id)
+        operations = self.operations.close()
+        for op_id, async_iterator in operations.items():
+            self.operation_names.pop(op_id, None)
+            if hasattr(async_iterator, "dispose"):
+                async_iterator.dispose()
 
     def receive(self):
         raise NotImplementedError("receive method not implemented")
@@ -55,6 +132,12 @@ class BaseConnectionContext(object):
     def send(self, data):
         raise NotImplementedError("send method not implemented")
 
+    def send_encoded(self, frame):
+        raise NotImplementedError("send_encoded method not implemented")
+
+    def encode(self, data):
+        return self.codec.dumps(data)
+
     @property
     def closed(self):
         raise NotImplementedError("closed property not implemented")
@@ -66,12 +149,66 @@ class BaseConnectionContext(object):
 class BaseSubscriptionServer(object):
     graphql_executor = None
 
-    def __init__(self, schema, keep_alive=True):
+    def __init__(
+        self,
+        schema,
+        keep_alive=True,
+        document_cache=None,
+        query_store=None,
+        codec=None,
+        tracer=None,
+        metrics=None,
+    ):
         self.schema = schema
         self.keep_alive = keep_alive
+        self.keep_alive_wheel = None
+        if keep_alive:
+            interval = KEEP_ALIVE_INTERVAL if keep_alive is True else keep_alive
+            self.keep_alive_wheel = TimerWheel(interval)
+        self.codec = get_codec(codec)
+        if document_cache is None:
+            document_cache = DocumentCache()
+        self.document_cache = document_cache
+        self.query_store = query_store
+        self.tracer = tracer
+        self.metrics = metrics
+        if query_store is not None:
+            self.precompile_queries()
+
+    def precompile_queries(self):
+        """
+        Warm the document cache with every query in the persisted query store.
+        """
+        if self.schema is None:
+            return
+        for query in self.query_store.queries():
+            try:
+                self.document_cache.document_from_string(self.schema, query)
+            except GraphQLError:
+                continue
 
     def execute(self, params):
-        return graphql(self.schema, **dict(params, allow_subscriptions=True))
+        return graphql(
+            self.schema,
+            **dict(params, allow_subscriptions=True, backend=self.document_cache)
+        )
+
+    def trace_parse(self, connection_context, op_id, params):
+        """
+        Parse and validate an operation's document ahead of executing it, so
+        the time spent is traced on its own: execution then finds the document
+        in the cache.
+        """
+        if not getattr(self.document_cache, "maxsize", 0):
+            return
+        try:
+            with self.tracer.span(PARSE, connection_context, op_id):
+                self.document_cache.document_from_string(
+                    self.schema, params["request_string"]
+                )
+        except Exception:
+            # Execution reports the error.
+            pass
 
     def process_message(self, connection_context, parsed_message):
         op_id = parsed_message.get("id")
@@ -86,7 +223,15 @@ class BaseSubscriptionServer(object):
 
         elif op_type == GQL_START:
             assert isinstance(payload, dict), "The payload must be a dict"
-            params = self.get_graphql_params(connection_context, payload)
+            try:
+                params = self.get_graphql_params(connection_context, payload)
+            except Exception as e:
+                # The operation isn't registered yet, so send_error would
+                # silently drop this message.
+                error_payload = {"message": str(e)}
+                return connection_context.send(
+                    self.build_message(op_id, GQL_ERROR, error_payload)
+                )
             return self.on_start(connection_context, op_id, params)
 
         elif op_type == GQL_STOP:
@@ -107,27 +252,130 @@ class BaseSubscriptionServer(object):
 
     def get_graphql_params(self, connection_context, payload):
         context = payload.get("context", connection_context.request_context)
-        return {
-            "request_string": payload.get("query"),
+        params = {
+            "request_string": self.get_query(payload),
             "variable_values": payload.get("variables"),
             "operation_name": payload.get("operationName"),
             "context_value": context,
-            "executor": self.graphql_executor(),
         }
+        if self.graphql_executor is not None:
+            params["executor"] = self.graphql_executor()
+        return params
+
+    def get_query(self, payload):
+        query = payload.get("query")
+        persisted_query = get_persisted_query(payload)
+        if persisted_query is None:
+            return query
+        version, query_hash = persisted_query
+        if self.query_store is None or version != PERSISTED_QUERY_VERSION:
+            raise PersistedQueryNotSupported()
+        if query is None:
+            query = self.query_store.get(query_hash)
+            if query is None:
+                raise PersistedQueryNotFound()
+            return query
+        if get_query_hash(query) != query_hash:
+            raise PersistedQueryMismatch()
+        if not self.query_store.read_only and self.query_store.get(query_hash) is None:
+            self.query_store.set(query_hash, query)
+        return query
 
     def on_open(self, connection_context):
         raise NotImplementedError("on_open method not implemented")
 
+    def start_keep_alive(self, connection_context):
+        """
+        Send a keep alive message now and then once every keep alive
+        interval, until the connection is closed.
+        """
+        raise NotImplementedError("start_keep_alive method not implemented")
+
+    def stop_keep_alive(self, connection_context):
+        if self.keep_alive_wheel is not None:
+            self.keep_alive_wheel.remove(connection_context)
+
+    def tick_keep_alive(self):
+        """
+        Advance the keep alive timer wheel, returning the connection contexts
+        that are due a keep alive message.
+        """
+        due = []
+        for connection_context in self.keep_alive_wheel.tick():
+            if connection_context.closed:
+                self.stop_keep_alive(connection_context)
+            else:
+                due.append(connection_context)
+        return due
+
+    def build_keep_alive_message(self):
+        return self.build_encoded_message(None, GQL_CONNECTION_KEEP_ALIVE, None)
+
     def on_stop(self, connection_context, op_id):
         return connection_context.unsubscribe(op_id)
 
     def on_close(self, connection_context):
+        if self.metrics is not None:
+            self.metrics.connection_closed(connection_context)
+        self.stop_keep_alive(connection_context)
         return connection_context.unsubscribe_all()
 
     def send_message(self, connection_context, op_id=None, op_type=None, payload=None):
         if op_id is None or connection_context.has_operation(op_id):
             message = self.build_message(op_id, op_type, payload)
-            return connection_context.send(message)
+            if self.tracer is None and self.metrics is None:
+                return connection_context.send(message)
+            frame = self.encode_message(connection_context, op_id, message)
+            return self.send_instrumented_frame(
+                connection_context, op_id, op_type, frame
+            )
+
+    def encode_message(self, connection_context, op_id, message):
+        if self.tracer is None:
+            return connection_context.encode(message)
+        with self.tracer.span(ENCODE, connection_context, op_id):
+            return connection_context.encode(message)
+
+    def send_instrumented_frame(self, connection_context, op_id, op_type, frame):
+        """
+        Send a frame, tracing the write and counting it in the metrics.
+        """
+        start = clock()
+        if self.tracer is None:
+            result = connection_context.send_encoded(frame)
+        else:
+            with self.tracer.span(WRITE, connection_context, op_id):
+                result = connection_context.send_encoded(frame)
+        if self.metrics is not None:
+            self.metrics.message_sent(
+                connection_context, op_id, op_type, frame, clock() - start
+            )
+        return result
+
+    def send_encoded_message(
+        self, connection_context, op_id=None, op_type=None, encoded_payload=None
+    ):
+        if op_id is None or connection_context.has_operation(op_id):
+            frame = self.build_encoded_message(op_id, op_type, encoded_payload)
+            return connection_context.send_encoded(frame)
+
+    def encode_payload(self, payload):
+        return self.codec.dumps(payload)
+
+    def build_encoded_message(self, id, op_type, encoded_payload):
+        """
+        Build a message frame around an already encoded payload, so a payload
+        sent to many operations is only encoded once.
+        """
+        parts = []
+        if id is not None:
+            parts.append('"id": {}'.format(self.codec.dumps(id)))
+        if op_type is not None:
+            parts.append('"type": {}'.format(self.codec.dumps(op_type)))
+        if encoded_payload is not None:
+            parts.append('"payload": {}'.format(decode_frame(encoded_payload)))
+        assert parts, "You need to send at least one thing"
+        return "{" + ", ".join(parts) + "}"
 
     def build_message(self, id, op_type, payload):
         message = {}
@@ -141,18 +389,18 @@ class BaseSubscriptionServer(object):
         return message
 
     def send_execution_result(self, connection_context, op_id, execution_result):
-        result = self.execution_result_to_dict(execution_result)
+        if self.metrics is not None and execution_result.errors:
+            for error in execution_result.errors:
+                self.metrics.error(error)
+        if self.tracer is None:
+            result = self.execution_result_to_dict(execution_result)
+        else:
+            with self.tracer.span(SERIALIZE, connection_context, op_id):
+                result = self.execution_result_to_dict(execution_result)
         return self.send_message(connection_context, op_id, GQL_DATA, result)
 
     def execution_result_to_dict(self, execution_result):
-        result = OrderedDict()
-        if execution_result.data:
-            result["data"] = execution_result.data
-        if execution_result.errors:
-            result["errors"] = [
-                format_error(error) for error in execution_result.errors
-            ]
-        return result
+        return execution_result_to_dict(execution_result)
 
     def send_error(self, connection_context, op_id, error, error_type=None):
         if error_type is None:
@@ -164,17 +412,29 @@ class BaseSubscriptionServer(object):
         )
 
         error_payload = {"message": str(error)}
+        if self.metrics is not None:
+            self.metrics.error(error)
 
         return self.send_message(connection_context, op_id, error_type, error_payload)
 
     def on_message(self, connection_context, message):
         try:
             if not isinstance(message, dict):
-                parsed_message = json.loads(message)
+                if self.tracer is None:
+                    parsed_message = self.codec.loads(message)
+                else:
+                    with self.tracer.span(DECODE, connection_context):
+                        parsed_message = self.codec.loads(message)
                 assert isinstance(parsed_message, dict), "Payload must be an object."
             else:
                 parsed_message = message
         except Exception as e:
+            if self.metrics is not None:
+                self.metrics.message_received(None, get_size(message))
             return self.send_error(connection_context, None, e)
 
+        if self.metrics is not None:
+            self.metrics.message_received(
+                parsed_message.get("type"), get_size(message)
+            )
         return self.process_message(connection_context, parsed_message)
@@ -1,21 +1,59 @@
 import asyncio
 import inspect
+import random
 from abc import ABC, abstractmethod
 from types import CoroutineType, GeneratorType
-from typing import Any, Dict, List, Union
-from weakref import WeakSet
-
-from graphql.execution.executors.asyncio import AsyncioExecutor
-from promise import Promise
+from typing import Any, Dict, List, Tuple, Union
 
 from graphql_ws import base
 
-from .constants import GQL_COMPLETE, GQL_CONNECTION_ACK, GQL_CONNECTION_ERROR
-from .observable_aiter import setup_observable_extension
+from .codecs import EncodedResult
+from .constants import (
+    GQL_COMPLETE,
+    GQL_CONNECTION_ACK,
+    GQL_CONNECTION_ERROR,
+    GQL_CONNECTION_KEEP_ALIVE,
+    GQL_DATA,
+    GQL_ERROR,
+)
+from .observable_aiter import DROP_OLDEST, AIterator, setup_observable_extension
+from .outbound import BLOCK, SLOW_CONSUMER_CLOSE_CODE, OutboundQueue, SlowConsumer
+from .shared import (
+    SharedSubscriber,
+    SharedSubscription,
+    get_shared_key,
+    latest_results,
+)
+from .tracing import ENCODE, EXECUTE, RESOLVE, SERIALIZE, WRITE, clock
+
+try:
+    from graphql.execution.executors.asyncio import AsyncioExecutor
+    from graphql.utils.get_operation_ast import get_operation_ast
+    from promise import Promise
+    from rx.core import Observable
+except ImportError:  # graphql-core 3, see graphql_ws.core3
+    AsyncioExecutor = Observable = Promise = get_operation_ast = None
+else:
+    from .cache import ValidatedDocument
+    from .subscribe import subscribe
+    from .threadpool import ResolverThreadPool, ThreadPoolAsyncioExecutor
+
+    setup_observable_extension()
+
+try:
+    current_task = asyncio.current_task
+except AttributeError:  # Python 3.6
+    current_task = asyncio.Task.current_task
 
-setup_observable_extension()
 CO_ITERABLE_COROUTINE = inspect.CO_ITERABLE_COROUTINE
 
+# Service Restart: clients should reconnect after a randomized backoff.
+SHUTDOWN_CLOSE_CODE = 1012
+SHUTDOWN_TIMEOUT = 10
+CLOSE_BATCH_SIZE = 100
+CLOSE_INTERVAL = 0.1
+DRAIN_POLL_INTERVAL = 0.01
+
 
 # Copied from graphql-core v3.1.0 (graphql/pyutils/is_awaitable.py)
 def is_awaitable(value: Any) -> bool:
@@ -34,38 +72,66 @@ def is_awaitable(value: Any) -> bool:
     )
 
 
-async def resolve(
-    data: Any, _container: Union[List, Dict] = None, _key: Union[str, int] = None
+def find_awaitables(
+    data: Any, awaitables: List[Tuple[Union[List, Dict], Union[str, int], Any]]
 ) -> None:
     """
-    Recursively wait on any awaitable children of a data element and resolve any
-    Promises.
+    Walk a data element, adding a ``(container, key, awaitable)`` entry to
+    ``awaitables`` for every awaitable child.
+    """
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            items = node.items()
+        elif isinstance(node, list):
+            items = enumerate(node)
+        else:
+            continue
+        for key, child in items:
+            if isinstance(child, (dict, list)):
+                stack.append(child)
+            elif is_awaitable(child):
+                awaitables.append((node, key, child))
+
+
+async def resolve(data: Any) -> None:
+    """
+    Wait on any awaitable children of a data element and resolve any Promises,
+    replacing them in place.
+
+    The data is walked synchronously; only the awaitables found are gathered,
+    so fully resolved data returns straight away.
     """
     if is_awaitable(data):
         data = await data
-        if isinstance(data, Promise):
-            data = data.value  # type: Any
-        if _container is not None:
-            _container[_key] = data
-    if isinstance(data, dict):
-        items = data.items()
-    elif isinstance(data, list):
-        items = enumerate(data)
-    else:
-        items = None
-    if items is not None:
-        children = [
-            asyncio.ensure_future(resolve(child, _container=data, _key=key))
-            for key, child in items
-        ]
-        if children:
-            await asyncio.wait(children)
+    awaitables = []  # type: List[Tuple[Union[List, Dict], Union[str, int], Any]]
+    find_awaitables(data, awaitables)
+    while awaitables:
+        values = await asyncio.gather(*(awaitable for _, _, awaitable in awaitables))
+        resolved = awaitables
+        awaitables = []
+        for (container, key, _), value in zip(resolved, values):
+            if Promise is not None and isinstance(value, Promise):
+                value = value.value
+            container[key] = value
+            if is_awaitable(value):
+                awaitables.append((container, key, value))
+            else:
+                find_awaitables(value, awaitables)
 
 
 class BaseAsyncConnectionContext(base.BaseConnectionContext, ABC):
-    def __init__(self, ws, request_context=None):
-        super().__init__(ws, request_context=request_context)
-        self.pending_tasks = WeakSet()
+    def __init__(self, ws, request_context=None, codec=None):
+        super().__init__(ws, request_context=request_context, codec=codec)
+        self.pending_tasks = set()
+        self.outbound = None
+        self.coalesce = None
+        self.writer_task = None
+        self.frame_ready = None
+        self.drained = None
+        # The keep alive message being written, if any.
+        self.keep_alive_write = None
 
     @abstractmethod
     async def receive(self):
@@ -75,6 +141,22 @@ class BaseAsyncConnectionContext(base.BaseConnectionContext, ABC):
     async def send(self, data):
         ...
 
+    async def send_encoded(self, frame):
+        raise NotImplementedError("send_encoded method not implemented")
+
+    @property
+    def writes_bytes(self):
+        """
+        Whether :meth:`send_encoded_batch` writes frames to the socket as
+        bytes, so queued frames are best encoded straight to bytes.
+        """
+        return False
+
+    def encode(self, data):
+        if self.outbound is not None and self.writes_bytes:
+            return self.codec.dumpb(data)
+        return self.codec.dumps(data)
+
     @property
     @abstractmethod
     def closed(self):
@@ -85,20 +167,100 @@ class BaseAsyncConnectionContext(base.BaseConnectionContext, ABC):
         ...
 
     def remember_task(self, task):
+        if task.done():
+            return
         self.pending_tasks.add(task)
-        # Clear completed tasks
-        self.pending_tasks -= WeakSet(
-            task for task in self.pending_tasks if task.done()
-        )
+        # Completed tasks remove themselves.
+        task.add_done_callback(self.pending_tasks.discard)
+
+    @property
+    def in_flight(self):
+        """
+        The number of messages from this connection still being processed.
+        """
+        return len(self.pending_tasks)
+
+    def start_writer(self, outbound, coalesce=None):
+        """
+        Send every frame through an outbound queue, drained by a single
+        writer task.
+
+        Unless ``coalesce`` is ``None``, the writer waits ``coalesce`` seconds
+        (0 waits for the rest of the event loop iteration) after a frame is
+        queued and then writes every waiting frame together.
+        """
+        self.outbound = outbound
+        self.coalesce = coalesce
+        self.frame_ready = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.writer_task = asyncio.ensure_future(self.run_writer())
+
+    def stop_writer(self):
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+            self.outbound.clear()
+            # Release any producers waiting for the queue to drain.
+            self.drained.set()
+
+    async def enqueue(self, frame, op_id=None, droppable=False):
+        outbound = self.outbound
+        # Only data frames wait: control frames, such as keep alives, are
+        # queued past the watermark so they're never held up.
+        while droppable and outbound.paused and outbound.policy == BLOCK:
+            if self.closed or self.writer_task.done():
+                return
+            self.drained.clear()
+            await self.drained.wait()
+        if self.closed or self.writer_task.done():
+            return
+        try:
+            outbound.put(frame, op_id, droppable)
+        except SlowConsumer:
+            self.stop_writer()
+            await self.close(SLOW_CONSUMER_CLOSE_CODE)
+            return
+        self.frame_ready.set()
+
+    async def run_writer(self):
+        outbound = self.outbound
+        while True:
+            while not outbound:
+                self.frame_ready.clear()
+                await self.frame_ready.wait()
+            if self.coalesce is None:
+                frames = [outbound.get()]
+            else:
+                await asyncio.sleep(self.coalesce)
+                if not outbound:
+                    continue
+                frames = outbound.get_all()
+            if not outbound.paused:
+                self.drained.set()
+            try:
+                await self.send_encoded_batch(frames)
+            except Exception:
+                # Failed writes are dropped, as the connection is most
+                # likely closing.
+                outbound.dropped += len(frames)
+
+    async def send_encoded_batch(self, frames):
+        """
+        Write several encoded frames. Transports with a cheaper way to write
+        many frames at once can override this.
+        """
+        for frame in frames:
+            await self.send_encoded(frame)
 
     async def unsubscribe(self, op_id):
         async_iterator = super().unsubscribe(op_id)
         if getattr(async_iterator, "future", None) and async_iterator.future.cancel():
             await async_iterator.future
+        elif hasattr(async_iterator, "aclose"):
+            await async_iterator.aclose()
 
     async def unsubscribe_all(self):
         awaitables = [self.unsubscribe(op_id) for op_id in list(self.operations)]
-        for task in self.pending_tasks:
+        for task in list(self.pending_tasks):
             task.cancel()
             awaitables.append(task)
         if awaitables:
@@ -111,14 +273,122 @@ class BaseAsyncConnectionContext(base.BaseConnectionContext, ABC):
 class BaseAsyncSubscriptionServer(base.BaseSubscriptionServer, ABC):
     graphql_executor = AsyncioExecutor
 
-    def __init__(self, schema, keep_alive=True, loop=None):
+    def __init__(
+        self,
+        schema,
+        keep_alive=True,
+        loop=None,
+        share_subscriptions=False,
+        outbound_queue=None,
+        conflate_subscriptions=False,
+        coalesce_writes=None,
+        subscription_buffer_size=None,
+        subscription_buffer_overflow=DROP_OLDEST,
+        native_subscriptions=False,
+        thread_pool=None,
+        process_pool=None,
+        **kwargs
+    ):
         self.loop = loop
-        super().__init__(schema, keep_alive)
+        self.native_subscriptions = native_subscriptions
+        self.share_subscriptions = share_subscriptions
+        self.conflate_subscriptions = conflate_subscriptions
+        if coalesce_writes is not None and outbound_queue is None:
+            outbound_queue = OutboundQueue
+        self.outbound_queue = outbound_queue
+        self.coalesce_writes = coalesce_writes
+        self.subscription_buffer_size = subscription_buffer_size
+        self.subscription_buffer_overflow = subscription_buffer_overflow
+        self.shared_subscriptions = {}
+        self.keep_alive_task = None
+        self.connections = set()
+        self.shutting_down = False
+        super().__init__(schema, keep_alive, **kwargs)
+        if isinstance(thread_pool, int):
+            thread_pool = ResolverThreadPool(thread_pool)
+        self.thread_pool = thread_pool
+        if thread_pool is not None and self.metrics is not None:
+            self.metrics.watch_thread_pool(thread_pool)
+        if process_pool is not None and process_pool.codec is None:
+            process_pool.codec = self.codec.name
+        self.process_pool = process_pool
 
     @abstractmethod
     async def handle(self, ws, request_context=None):
         ...
 
+    def execute(self, params):
+        if self.native_subscriptions:
+            result = self.subscribe(params)
+            if result is not None:
+                return result
+        return super().execute(params)
+
+    def subscribe(self, params):
+        """
+        Execute a valid subscription operation with subscription resolvers'
+        async iterables, without converting them to Observables.
+
+        Returns ``None`` for any other operation, which is then executed
+        normally.
+        """
+        try:
+            document = self.document_cache.document_from_string(
+                self.schema, params["request_string"]
+            )
+        except Exception:
+            return None
+        if (
+            not isinstance(document, ValidatedDocument)
+            or document.validation_errors
+            or document.get_operation_type(params.get("operation_name"))
+            != "subscription"
+        ):
+            return None
+        return subscribe(
+            self.schema,
+            document.document_ast,
+            root_value=params.get("root_value"),
+            context_value=params.get("context_value"),
+            variable_values=params.get("variable_values"),
+            operation_name=params.get("operation_name"),
+            executor=params.get("executor"),
+            middleware=params.get("middleware"),
+        )
+
+    def execute_in_process(self, params):
+        """
+        Execute a valid operation in the process pool: queries and mutations
+        entirely, and subscriptions event by event.
+
+        Invalid operations are executed normally, to report their errors.
+        """
+        try:
+            document = self.document_cache.document_from_string(
+                self.schema, params["request_string"]
+            )
+        except Exception:
+            document = None
+        if (
+            not isinstance(document, ValidatedDocument)
+            or document.validation_errors
+        ):
+            return self.execute(params)
+        operation_name = params.get("operation_name")
+        if document.get_operation_type(operation_name) != "subscription":
+            return self.process_pool.execute(params)
+        return subscribe(
+            self.schema,
+            document.document_ast,
+            root_value=params.get("root_value"),
+            context_value=params.get("context_value"),
+            variable_values=params.get("variable_values"),
+            operation_name=operation_name,
+            executor=params.get("executor"),
+            middleware=params.get("middleware"),
+            map_event=self.process_pool.map_event(params),
+        )
+
     def process_message(self, connection_context, parsed_message):
         task = asyncio.ensure_future(
             super().process_message(connection_context, parsed_message), loop=self.loop
@@ -127,7 +397,103 @@ class BaseAsyncSubscriptionServer(base.BaseSubscriptionServer, ABC):
         return task
 
     async def on_open(self, connection_context):
-        pass
+        if self.shutting_down:
+            await connection_context.close(SHUTDOWN_CLOSE_CODE)
+            return
+        self.connections.add(connection_context)
+        if self.metrics is not None:
+            self.metrics.connection_opened(connection_context)
+
+    async def on_close(self, connection_context):
+        self.connections.discard(connection_context)
+        await super().on_close(connection_context)
+        connection_context.stop_writer()
+
+    async def shutdown(
+        self,
+        timeout=SHUTDOWN_TIMEOUT,
+        close_batch_size=CLOSE_BATCH_SIZE,
+        close_interval=CLOSE_INTERVAL,
+    ):
+        """
+        Drain and close every connection.
+
+        New connections are closed straight away and new operations refused.
+        Subscriptions are stopped with a complete message, while queries and
+        mutations in flight get up to ``timeout`` seconds (``None`` to wait
+        for them however long they take) to send their results.
+
+        Connections are then closed with code 1012 (Service Restart), in a
+        random order, ``close_batch_size`` at a time every
+        ``close_interval`` seconds, so clients don't all reconnect at once.
+        """
+        self.shutting_down = True
+        connections = list(self.connections)
+        await asyncio.gather(
+            *(
+                self.complete_subscriptions(connection_context)
+                for connection_context in connections
+            )
+        )
+        await self.drain(connections, timeout)
+        random.shuffle(connections)
+        for start in range(0, len(connections), close_batch_size):
+            if start:
+                await asyncio.sleep(close_interval)
+            end = start + close_batch_size
+            batch = connections[start:end]
+            await asyncio.gather(
+                *(
+                    connection_context.close(SHUTDOWN_CLOSE_CODE)
+                    for connection_context in batch
+                    if not connection_context.closed
+                ),
+                return_exceptions=True,
+            )
+
+    async def complete_subscriptions(self, connection_context):
+        op_ids = [
+            op_id
+            for op_id, operation in list(connection_context.operations.items())
+            if hasattr(operation, "__aiter__")
+            or isinstance(operation, (SharedSubscriber, SharedSubscription))
+        ]
+        # Stopping a subscription may cancel the task it runs in.
+        await asyncio.gather(
+            *(connection_context.unsubscribe(op_id) for op_id in op_ids),
+            return_exceptions=True,
+        )
+        frames = [
+            self.build_encoded_message(op_id, GQL_COMPLETE, None) for op_id in op_ids
+        ]
+        await asyncio.gather(
+            *(self.send_frame(connection_context, frame) for frame in frames),
+            return_exceptions=True,
+        )
+
+    async def drain(self, connections, timeout):
+        """
+        Wait for the connections' messages in flight to be processed and their
+        outbound queues to be written, for at most ``timeout`` seconds.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        tasks = set()
+        for connection_context in connections:
+            tasks.update(connection_context.pending_tasks)
+        # shutdown may itself have been called while processing a message.
+        tasks.discard(current_task())
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        while any(
+            connection_context.outbound
+            and not connection_context.closed
+            and not connection_context.writer_task.done()
+            for connection_context in connections
+        ):
+            if deadline is not None and loop.time() >= deadline:
+                break
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
 
     async def on_connect(self, connection_context, payload):
         pass
@@ -136,34 +502,120 @@ class BaseAsyncSubscriptionServer(base.BaseSubscriptionServer, ABC):
         try:
             await self.on_connect(connection_context, payload)
             await self.send_message(connection_context, op_type=GQL_CONNECTION_ACK)
+            if self.keep_alive_wheel is not None:
+                await self.start_keep_alive(connection_context)
         except Exception as e:
             await self.send_error(connection_context, op_id, e, GQL_CONNECTION_ERROR)
             await connection_context.close(1011)
 
+    async def start_keep_alive(self, connection_context):
+        message = self.build_keep_alive_message()
+        if self.metrics is not None:
+            self.metrics.frames_sent(GQL_CONNECTION_KEEP_ALIVE, message, 1)
+        await self.send_frame(connection_context, message)
+        self.keep_alive_wheel.add(connection_context)
+        if self.keep_alive_task is None or self.keep_alive_task.done():
+            self.keep_alive_task = asyncio.ensure_future(
+                self.run_keep_alive(), loop=self.loop
+            )
+
+    async def run_keep_alive(self):
+        """
+        Drive the keep alive timer wheel, sending the keep alive messages for
+        every due connection each tick. Stops once no connections are left.
+
+        Messages are written in the background, so a stalled connection
+        doesn't hold up the others; it's skipped while its previous keep
+        alive message is still being written.
+        """
+        loop = asyncio.get_event_loop()
+        message = self.build_keep_alive_message()
+        next_tick = loop.time()
+        while self.keep_alive_wheel:
+            next_tick += self.keep_alive_wheel.tick_interval
+            await asyncio.sleep(max(0, next_tick - loop.time()))
+            sent = 0
+            for connection_context in self.tick_keep_alive():
+                write = connection_context.keep_alive_write
+                if write is not None and not write.done():
+                    continue
+                connection_context.keep_alive_write = asyncio.ensure_future(
+                    self.send_keep_alive(connection_context, message)
+                )
+                sent += 1
+            if sent and self.metrics is not None:
+                self.metrics.frames_sent(GQL_CONNECTION_KEEP_ALIVE, message, sent)
+
+    async def send_keep_alive(self, connection_context, message):
+        try:
+            await self.send_frame(connection_context, message)
+        except Exception:
+            # The connection is most likely closing.
+            pass
+
     async def on_start(self, connection_context, op_id, params):
+        if self.shutting_down:
+            # The operation isn't registered, so send_error would drop this.
+            error_payload = {"message": "The server is shutting down."}
+            await connection_context.send(
+                self.build_message(op_id, GQL_ERROR, error_payload)
+            )
+            return
         # Attempt to unsubscribe first in case we already have a subscription
         # with this id.
         await connection_context.unsubscribe(op_id)
+        if self.metrics is not None:
+            self.metrics.operation_started(
+                connection_context, op_id, params.get("operation_name")
+            )
 
-        execution_result = self.execute(params)
+        shared_key = self.get_shared_key(connection_context, params)
+        conflate = params.pop("conflate", False)
+        if shared_key in self.shared_subscriptions:
+            execution_result = self.shared_subscriptions[shared_key]
+        else:
+            if self.tracer is None:
+                execution_result = await self.execute_operation(params)
+            else:
+                self.trace_parse(connection_context, op_id, params)
+                with self.tracer.span(EXECUTE, connection_context, op_id):
+                    execution_result = await self.execute_operation(params)
+            if (
+                shared_key is not None
+                # An identical subscription may have started meanwhile.
+                and shared_key not in self.shared_subscriptions
+                and hasattr(execution_result, "__aiter__")
+            ):
+                execution_result = SharedSubscription(
+                    self, shared_key, execution_result, conflate
+                )
+                self.shared_subscriptions[shared_key] = execution_result
 
         connection_context.register_operation(op_id, execution_result)
-        if hasattr(execution_result, "__aiter__"):
-            iterator = await execution_result.__aiter__()
+        if isinstance(execution_result, SharedSubscription):
+            subscriber = execution_result.subscribe(connection_context, op_id)
+            connection_context.register_operation(op_id, subscriber)
+            try:
+                await subscriber.future
+            except Exception as e:
+                await self.send_error(connection_context, op_id, e)
+        elif hasattr(execution_result, "__aiter__"):
+            iterator = await self.get_async_iterator(execution_result)
             connection_context.register_operation(op_id, iterator)
             try:
-                async for single_result in iterator:
-                    if not connection_context.has_operation(op_id):
-                        break
-                    await self.send_execution_result(
-                        connection_context, op_id, single_result
-                    )
+                if conflate:
+                    await self.send_latest_results(connection_context, op_id, iterator)
+                else:
+                    async for single_result in iterator:
+                        if not connection_context.has_operation(op_id):
+                            break
+                        await self.send_execution_result(
+                            connection_context, op_id, single_result
+                        )
             except Exception as e:
                 await self.send_error(connection_context, op_id, e)
         else:
             try:
-                if is_awaitable(execution_result):
-                    execution_result = await execution_result
                 await self.send_execution_result(
                     connection_context, op_id, execution_result
                 )
@@ -173,17 +625,234 @@ class BaseAsyncSubscriptionServer(base.BaseSubscriptionServer, ABC):
         await connection_context.unsubscribe(op_id)
         await self.on_operation_complete(connection_context, op_id)
 
+    async def execute_operation(self, params):
+        """
+        Execute an operation, waiting for its result unless it's a stream of
+        results.
+        """
+        if params.pop("process_pool", False):
+            execution_result = self.execute_in_process(params)
+        else:
+            execution_result = self.execute(params)
+        # Observables are awaitable too, resolving to their last item.
+        if is_awaitable(execution_result) and not hasattr(
+            execution_result, "__aiter__"
+        ):
+            execution_result = await execution_result
+        return execution_result
+
+    async def get_async_iterator(self, execution_result):
+        """
+        Return an async iterator over the results of a subscription.
+        Observables buffer at most ``subscription_buffer_size`` results.
+        """
+        if Observable is not None and isinstance(execution_result, Observable):
+            return AIterator(
+                execution_result,
+                self.subscription_buffer_size,
+                self.subscription_buffer_overflow,
+            )
+        iterator = execution_result.__aiter__()
+        if is_awaitable(iterator):
+            iterator = await iterator
+        return iterator
+
+    async def send_latest_results(self, connection_context, op_id, iterator):
+        """
+        Send the results of a subscription, but only the latest one: a result
+        which hasn't been sent yet is replaced by any newer result.
+        """
+        results = latest_results(iterator)
+        try:
+            async for single_result in results:
+                if not connection_context.has_operation(op_id):
+                    break
+                await self.send_execution_result(
+                    connection_context, op_id, single_result
+                )
+        finally:
+            await results.aclose()
+
+    def get_graphql_params(self, connection_context, payload):
+        params = super().get_graphql_params(connection_context, payload)
+        # Get a Promise rather than blocking on the running event loop until
+        # the result is ready, as graphql-core 2 would.
+        params["return_promise"] = True
+        if self.thread_pool is not None:
+            params["executor"] = ThreadPoolAsyncioExecutor(
+                self.thread_pool, loop=self.loop, metrics=self.metrics
+            )
+        if self.should_conflate(connection_context, payload):
+            params["conflate"] = True
+        if self.process_pool is not None and self.should_execute_in_process(
+            connection_context, params
+        ):
+            params["process_pool"] = True
+        return params
+
+    def should_execute_in_process(self, connection_context, params):
+        """
+        Whether an operation runs in the process pool. By default, operations
+        named in the pool's ``operation_names`` do.
+        """
+        operation_name = params.get("operation_name")
+        if operation_name is None:
+            # The name of the document's only operation.
+            try:
+                document = self.document_cache.document_from_string(
+                    self.schema, params["request_string"]
+                )
+                operation = get_operation_ast(document.document_ast)
+                operation_name = operation.name.value
+            except Exception:
+                return False
+        return operation_name in self.process_pool.operation_names
+
+    def should_conflate(self, connection_context, payload):
+        """
+        Whether only the latest result of a subscription should be sent,
+        rather than every result. Clients can ask for it with a ``conflate``
+        extension in the start payload.
+        """
+        if self.conflate_subscriptions:
+            return True
+        extensions = payload.get("extensions")
+        return isinstance(extensions, dict) and bool(extensions.get("conflate"))
+
+    def get_context_key(self, connection_context, params):
+        """
+        Return a hashable key for the parts of the execution context that
+        subscription results depend on. Only identical subscriptions with the
+        same context key share an execution.
+
+        By default, only subscriptions with the same context value (usually
+        the connection's request context) share one, so results never reach
+        another user. Override this to share across connections, for example
+        by returning the user's id, or ``None`` when results don't depend on
+        the context.
+        """
+        context_value = params.get("context_value")
+        if context_value is None:
+            return None
+        # The shared execution keeps its context value alive, so the id isn't
+        # reused while the key is.
+        return id(context_value)
+
+    def get_shared_key(self, connection_context, params):
+        if not self.share_subscriptions:
+            return None
+        context_key = self.get_context_key(connection_context, params)
+        return get_shared_key(params, context_key)
+
     async def send_message(
         self, connection_context, op_id=None, op_type=None, payload=None
     ):
         if op_id is None or connection_context.has_operation(op_id):
             message = self.build_message(op_id, op_type, payload)
-            return await connection_context.send(message)
+            if self.tracer is not None or self.metrics is not None:
+                frame = self.encode_message(connection_context, op_id, message)
+                return await self.send_instrumented_frame(
+                    connection_context, op_id, op_type, frame
+                )
+            if self.get_outbound_queue(connection_context) is None:
+                return await connection_context.send(message)
+            return await connection_context.enqueue(
+                connection_context.encode(message), op_id, op_type == GQL_DATA
+            )
+
+    async def send_instrumented_frame(self, connection_context, op_id, op_type, frame):
+        start = clock()
+        if self.tracer is None:
+            result = await self.send_frame(
+                connection_context, frame, op_id, op_type == GQL_DATA
+            )
+        else:
+            with self.tracer.span(WRITE, connection_context, op_id):
+                result = await self.send_frame(
+                    connection_context, frame, op_id, op_type == GQL_DATA
+                )
+        if self.metrics is not None:
+            self.metrics.message_sent(
+                connection_context, op_id, op_type, frame, clock() - start
+            )
+        return result
+
+    async def send_encoded_message(
+        self, connection_context, op_id=None, op_type=None, encoded_payload=None
+    ):
+        if op_id is None or connection_context.has_operation(op_id):
+            frame = self.build_encoded_message(op_id, op_type, encoded_payload)
+            if self.tracer is not None or self.metrics is not None:
+                return await self.send_instrumented_frame(
+                    connection_context, op_id, op_type, frame
+                )
+            return await self.send_frame(
+                connection_context, frame, op_id, op_type == GQL_DATA
+            )
+
+    def get_outbound_queue(self, connection_context):
+        """
+        Return the connection's outbound queue, starting its writer on first
+        use. Returns ``None`` when frames are written directly.
+        """
+        if self.outbound_queue is None:
+            return None
+        if connection_context.outbound is None:
+            connection_context.start_writer(
+                self.outbound_queue(), self.coalesce_writes
+            )
+        return connection_context.outbound
+
+    async def send_frame(self, connection_context, frame, op_id=None, droppable=False):
+        if self.get_outbound_queue(connection_context) is None:
+            return await connection_context.send_encoded(frame)
+        return await connection_context.enqueue(frame, op_id, droppable)
 
     async def on_operation_complete(self, connection_context, op_id):
         pass
 
     async def send_execution_result(self, connection_context, op_id, execution_result):
+        if isinstance(execution_result, EncodedResult):
+            return await self.send_encoded_result(
+                connection_context, op_id, execution_result
+            )
         # Resolve any pending promises
-        await resolve(execution_result.data)
+        if self.tracer is None:
+            await resolve(execution_result.data)
+        else:
+            with self.tracer.span(RESOLVE, connection_context, op_id):
+                await resolve(execution_result.data)
         await super().send_execution_result(connection_context, op_id, execution_result)
+
+    async def send_encoded_result(self, connection_context, op_id, encoded_result):
+        """
+        Send a result encoded by the process pool as is.
+        """
+        if self.metrics is not None:
+            for error_type in encoded_result.error_types:
+                self.metrics.errors[error_type] += 1
+        await self.send_encoded_message(
+            connection_context, op_id, GQL_DATA, encoded_result.payload
+        )
+
+    async def send_shared_execution_result(self, subscribers, execution_result):
+        """
+        Resolve and encode an execution result once, and queue it for every
+        :class:`SharedSubscriber`, without waiting for any of them to write it.
+        """
+        tracer = self.tracer
+        if isinstance(execution_result, EncodedResult):
+            encoded_result = execution_result.payload
+        elif tracer is None:
+            await resolve(execution_result.data)
+            result = self.execution_result_to_dict(execution_result)
+            encoded_result = self.encode_payload(result)
+        else:
+            with tracer.span(RESOLVE):
+                await resolve(execution_result.data)
+            with tracer.span(SERIALIZE):
+                result = self.execution_result_to_dict(execution_result)
+            with tracer.span(ENCODE):
+                encoded_result = self.encode_payload(result)
+        for subscriber in subscribers:
+            subscriber.send(encoded_result)
@@ -1,13 +1,32 @@
+import time
+from threading import Event, Lock, Thread
+
 from graphql.execution.executors.sync import SyncExecutor
 from rx import Observable, Observer
 
 from .base import BaseSubscriptionServer
-from .constants import GQL_COMPLETE, GQL_CONNECTION_ACK, GQL_CONNECTION_ERROR
+from .constants import (
+    GQL_COMPLETE,
+    GQL_CONNECTION_ACK,
+    GQL_CONNECTION_ERROR,
+    GQL_CONNECTION_KEEP_ALIVE,
+    GQL_DATA,
+)
+from .outbound import OutboundWriter
+from .registry import RegistryClosed
+from .tracing import EXECUTE, WRITE, clock
 
 
 class BaseSyncSubscriptionServer(BaseSubscriptionServer):
     graphql_executor = SyncExecutor
 
+    def __init__(self, *args, **kwargs):
+        self.outbound_queue = kwargs.pop("outbound_queue", None)
+        super(BaseSyncSubscriptionServer, self).__init__(*args, **kwargs)
+        self.keep_alive_thread = None
+        self._keep_alive_lock = Lock()
+        self._writer_lock = Lock()
+
     def on_operation_complete(self, connection_context, op_id):
         pass
 
@@ -15,7 +34,8 @@ class BaseSyncSubscriptionServer(BaseSubscriptionServer):
         raise NotImplementedError("handle method not implemented")
 
     def on_open(self, connection_context):
-        pass
+        if self.metrics is not None:
+            self.metrics.connection_opened(connection_context)
 
     def on_connect(self, connection_context, payload):
         pass
@@ -24,45 +44,246 @@ class BaseSyncSubscriptionServer(BaseSubscriptionServer):
         try:
             self.on_connect(connection_context, payload)
             self.send_message(connection_context, op_type=GQL_CONNECTION_ACK)
+            if self.keep_alive_wheel is not None:
+                self.start_keep_alive(connection_context)
 
         except Exception as e:
             self.send_error(connection_context, op_id, e, GQL_CONNECTION_ERROR)
             connection_context.close(1011)
 
+    def spawn(self, func, *args):
+        """
+        Run a function in the background, in a daemon thread.
+        """
+        thread = Thread(target=func, args=args)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def make_event(self):
+        return Event()
+
+    def get_writer(self, connection_context):
+        """
+        Return the connection's outbound writer, starting it on first use.
+        Returns ``None`` when frames are written directly.
+        """
+        if self.outbound_queue is None:
+            return None
+        writer = getattr(connection_context, "writer", None)
+        if writer is None:
+            with self._writer_lock:
+                writer = getattr(connection_context, "writer", None)
+                if writer is None:
+                    connection_context.outbound = self.outbound_queue()
+                    writer = connection_context.writer = OutboundWriter(
+                        connection_context,
+                        connection_context.outbound,
+                        self.spawn,
+                        self.make_event,
+                    )
+        return writer
+
+    def send_frame(self, connection_context, frame, op_id=None, droppable=False):
+        writer = self.get_writer(connection_context)
+        if writer is None:
+            return connection_context.send_encoded(frame)
+        return writer.put(frame, op_id, droppable)
+
+    def send_message(self, connection_context, op_id=None, op_type=None, payload=None):
+        if self.outbound_queue is None:
+            return super(BaseSyncSubscriptionServer, self).send_message(
+                connection_context, op_id, op_type, payload
+            )
+        if op_id is None or connection_context.has_operation(op_id):
+            message = self.build_message(op_id, op_type, payload)
+            frame = self.encode_message(connection_context, op_id, message)
+            if self.tracer is not None or self.metrics is not None:
+                return self.send_instrumented_frame(
+                    connection_context, op_id, op_type, frame
+                )
+            return self.send_frame(
+                connection_context, frame, op_id, op_type == GQL_DATA
+            )
+
+    def send_instrumented_frame(self, connection_context, op_id, op_type, frame):
+        start = clock()
+        if self.tracer is None:
+            result = self.send_frame(
+                connection_context, frame, op_id, op_type == GQL_DATA
+            )
+        else:
+            with self.tracer.span(WRITE, connection_context, op_id):
+                result = self.send_frame(
+                    connection_context, frame, op_id, op_type == GQL_DATA
+                )
+        if self.metrics is not None:
+            self.metrics.message_sent(
+                connection_context, op_id, op_type, frame, clock() - start
+            )
+        return result
+
+    def send_encoded_message(
+        self, connection_context, op_id=None, op_type=None, encoded_payload=None
+    ):
+        if op_id is None or connection_context.has_operation(op_id):
+            frame = self.build_encoded_message(op_id, op_type, encoded_payload)
+            return self.send_frame(
+                connection_context, frame, op_id, op_type == GQL_DATA
+            )
+
+    def on_close(self, connection_context):
+        result = super(BaseSyncSubscriptionServer, self).on_close(connection_context)
+        writer = getattr(connection_context, "writer", None)
+        if writer is not None:
+            writer.stop()
+        return result
+
+    def start_keep_alive(self, connection_context):
+        message = self.build_keep_alive_message()
+        if self.metrics is not None:
+            self.metrics.frames_sent(GQL_CONNECTION_KEEP_ALIVE, message, 1)
+        self.send_frame(connection_context, message)
+        self.keep_alive_wheel.add(connection_context)
+        with self._keep_alive_lock:
+            if self.keep_alive_thread is None:
+                self.keep_alive_thread = self.spawn(self.run_keep_alive)
+
+    def run_keep_alive(self):
+        """
+        Drive the keep alive timer wheel, sending the keep alive messages for
+        every due connection each tick. Stops once no connections are left.
+
+        Messages are written in the background, so a stalled connection
+        doesn't hold up the others; it's skipped while its previous keep
+        alive message is still being written.
+        """
+        message = self.build_keep_alive_message()
+        while True:
+            self.sleep(self.keep_alive_wheel.tick_interval)
+            with self._keep_alive_lock:
+                # Checked under the lock, so a connection added meanwhile
+                # starts a new driver.
+                if not self.keep_alive_wheel:
+                    self.keep_alive_thread = None
+                    return
+            sent = 0
+            for connection_context in self.tick_keep_alive():
+                if getattr(connection_context, "keep_alive_writing", False):
+                    continue
+                connection_context.keep_alive_writing = True
+                if self.get_writer(connection_context) is None:
+                    self.spawn(self.send_keep_alive, connection_context, message)
+                else:
+                    # Queued without waiting.
+                    self.send_keep_alive(connection_context, message)
+                sent += 1
+            if sent and self.metrics is not None:
+                self.metrics.frames_sent(GQL_CONNECTION_KEEP_ALIVE, message, sent)
+
+    def send_keep_alive(self, connection_context, message):
+        try:
+            self.send_frame(connection_context, message)
+        except Exception:
+            self.stop_keep_alive(connection_context)
+        finally:
+            connection_context.keep_alive_writing = False
+
     def on_start(self, connection_context, op_id, params):
         # Attempt to unsubscribe first in case we already have a subscription
         # with this id.
         connection_context.unsubscribe(op_id)
+        if self.metrics is not None:
+            self.metrics.operation_started(
+                connection_context, op_id, params.get("operation_name")
+            )
+        # Registered before subscribing, so results emitted while subscribing
+        # are sent, and the subscription can be stopped from other threads
+        # meanwhile.
+        disposable = SubscriptionDisposable()
         try:
-            execution_result = self.execute(params)
+            replaced = connection_context.register_operation(op_id, disposable)
+        except RegistryClosed:
+            return
+        # Another thread may have started an operation with the same id.
+        if hasattr(replaced, "dispose"):
+            replaced.dispose()
+        try:
+            if self.tracer is None:
+                execution_result = self.execute(params)
+            else:
+                self.trace_parse(connection_context, op_id, params)
+                with self.tracer.span(EXECUTE, connection_context, op_id):
+                    execution_result = self.execute(params)
             assert isinstance(
                 execution_result, Observable
             ), "A subscription must return an observable"
-            disposable = execution_result.subscribe(
-                SubscriptionObserver(
-                    connection_context,
-                    op_id,
-                    self.send_execution_result,
-                    self.send_error,
-                    self.send_message,
+            disposable.set(
+                execution_result.subscribe(
+                    SubscriptionObserver(
+                        connection_context,
+                        op_id,
+                        self.send_execution_result,
+                        self.send_error,
+                        self.send_message,
+                        disposable,
+                    )
                 )
             )
-            connection_context.register_operation(op_id, disposable)
 
         except Exception as e:
             self.send_error(connection_context, op_id, e)
             self.send_message(connection_context, op_id, GQL_COMPLETE)
+            connection_context.remove_operation(op_id, disposable)
+
+
+class SubscriptionDisposable(object):
+    """
+    Disposes of a subscription, even if it's disposed of before the
+    subscription is made.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.disposable = None
+        self.disposed = False
+
+    def set(self, disposable):
+        with self.lock:
+            if not self.disposed:
+                self.disposable = disposable
+                return
+        disposable.dispose()
+
+    def dispose(self):
+        with self.lock:
+            if self.disposed:
+                return
+            self.disposed = True
+            disposable, self.disposable = self.disposable, None
+        if disposable is not None:
+            disposable.dispose()
 
 
 class SubscriptionObserver(Observer):
     def __init__(
-        self, connection_context, op_id, send_execution_result, send_error, send_message
+        self,
+        connection_context,
+        op_id,
+        send_execution_result,
+        send_error,
+        send_message,
+        disposable=None,
     ):
         self.connection_context = connection_context
         self.op_id = op_id
         self.send_execution_result = send_execution_result
         self.send_error = send_error
         self.send_message = send_message
+        self.disposable = disposable
 
     def on_next(self, value):
         if isinstance(value, Exception):
@@ -73,7 +294,8 @@ class SubscriptionObserver(Observer):
 
     def on_completed(self):
         self.send_message(self.connection_context, self.op_id, GQL_COMPLETE)
-        self.connection_context.remove_operation(self.op_id)
+        # Leave any newer operation with the same id alone.
+        self.connection_context.remove_operation(self.op_id, self.disposable)
 
     def on_error(self, error):
         self.send_error(self.connection_context, self.op_id, error)
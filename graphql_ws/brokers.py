@@ -0,0 +1,282 @@
+import asyncio
+import fcntl
+import os
+import struct
+
+from .codecs import get_codec
+from .pubsub import PubSub
+
+MAX_BATCH_SIZE = 1000
+MAX_WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+RECONNECT_INTERVAL = 0.1
+CONNECT_TIMEOUT = 1
+
+_header = struct.Struct(">I")
+_scalar_types = (str, int, float, bool, type(None))
+
+
+def check_filter_values(values):
+    # Other values wouldn't compare equal after being decoded by another
+    # process, e.g. tuples come back as lists.
+    for name, value in values.items():
+        if not isinstance(value, _scalar_types):
+            raise TypeError(
+                "Broker filter values must be strings, numbers, booleans or "
+                "None, got {!r} for {}".format(value, name)
+            )
+
+
+class Broker:
+    """
+    Base class for brokers, which deliver the events published in any
+    process to the matching subscriptions of every process.
+
+    Subscriptions are made on a local :class:`~graphql_ws.pubsub.PubSub`.
+    Published events are delivered to it straight away, and batched to be
+    sent to the other processes: a batch is encoded and sent once per event
+    loop iteration, or whenever ``max_batch_size`` events are waiting.
+
+    Brokers for other transports (such as Redis or NATS) implement
+    :meth:`send_batch`, pass every batch they receive from other processes to
+    :meth:`receive_batch`, and connect and disconnect in :meth:`start` and
+    :meth:`close`. Events must be encodable by the ``codec``, and filter
+    values must be strings, numbers, booleans or ``None``. Events from other
+    processes which can't be delivered are counted in
+    :attr:`delivery_errors`.
+    """
+
+    def __init__(self, pubsub=None, codec=None, max_batch_size=MAX_BATCH_SIZE):
+        self.pubsub = PubSub() if pubsub is None else pubsub
+        self.codec = get_codec(codec)
+        self.max_batch_size = max_batch_size
+        self.outbox = []
+        self.flush_handle = None
+        self.batches_sent = 0
+        self.batches_received = 0
+        self.delivery_errors = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        self.flush()
+
+    def subscribe(self, topic, **filters):
+        check_filter_values(filters)
+        return self.pubsub.subscribe(topic, **filters)
+
+    def publish(self, topic, event, **attributes):
+        """
+        Publish an event to every process, and return how many local
+        subscriptions it was delivered to.
+        """
+        check_filter_values(attributes)
+        delivered = self.pubsub.publish(topic, event, **attributes)
+        self.outbox.append((topic, event, attributes))
+        if len(self.outbox) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_event_loop().call_soon(self.flush)
+        return delivered
+
+    def flush(self):
+        """
+        Send the waiting events to the other processes.
+        """
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.outbox:
+            return
+        batch, self.outbox = self.outbox, []
+        self.batches_sent += 1
+        self.send_batch(self.codec.dumpb(batch))
+
+    def send_batch(self, data):
+        raise NotImplementedError("send_batch method not implemented")
+
+    def receive_batch(self, data):
+        """
+        Deliver a batch of events sent by another process.
+        """
+        self.batches_received += 1
+        try:
+            batch = self.codec.loads(data)
+        except Exception:
+            self.delivery_errors += 1
+            return
+        for topic, event, attributes in batch:
+            try:
+                self.pubsub.publish(topic, event, **attributes)
+            except Exception:
+                self.delivery_errors += 1
+
+
+class InProcessBroker(Broker):
+    """
+    A broker for a single process: events are only delivered locally.
+    """
+
+    def publish(self, topic, event, **attributes):
+        return self.pubsub.publish(topic, event, **attributes)
+
+
+def write_frame(writer, data, max_buffer_size=None):
+    """
+    Write a frame, unless more than ``max_buffer_size`` bytes are already
+    waiting to be sent. Returns whether the frame was written.
+    """
+    if (
+        max_buffer_size is not None
+        and writer.transport.get_write_buffer_size() > max_buffer_size
+    ):
+        return False
+    writer.write(_header.pack(len(data)) + data)
+    return True
+
+
+async def read_frame(reader):
+    (size,) = _header.unpack(await reader.readexactly(_header.size))
+    return await reader.readexactly(size)
+
+
+class BrokerHub:
+    """
+    Relays the batches each connected broker sends to every other broker.
+    Batches are forwarded without being decoded. Batches for a broker with
+    more than ``max_buffer_size`` bytes waiting to be sent are dropped
+    (counted in :attr:`dropped_batches`), so one slow broker doesn't make
+    the hub buffer without limit.
+    """
+
+    def __init__(self, max_buffer_size=MAX_WRITE_BUFFER_SIZE):
+        self.max_buffer_size = max_buffer_size
+        self.writers = set()
+        self.closed = False
+        self.dropped_batches = 0
+
+    async def handle(self, reader, writer):
+        if self.closed:
+            writer.close()
+            return
+        self.writers.add(writer)
+        # An empty frame tells the broker it's connected.
+        write_frame(writer, b"")
+        try:
+            while True:
+                data = await read_frame(reader)
+                for other in self.writers:
+                    if other is not writer and not write_frame(
+                        other, data, self.max_buffer_size
+                    ):
+                        self.dropped_batches += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def close(self):
+        self.closed = True
+        for writer in list(self.writers):
+            writer.close()
+
+
+class UnixSocketBroker(Broker):
+    """
+    A broker for the worker processes of one host, connected through a Unix
+    domain socket at ``path``.
+
+    The first broker to start runs the hub every broker connects to, elected
+    with a lock on ``path + ".lock"``. If the process running the hub exits,
+    the other brokers reconnect and elect a new one. Batches published while
+    a broker is disconnected, or while more than ``max_buffer_size`` bytes
+    are waiting to be sent to the hub, are dropped (counted in
+    :attr:`dropped_batches`).
+    """
+
+    def __init__(self, path, max_buffer_size=MAX_WRITE_BUFFER_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_buffer_size = max_buffer_size
+        self.hub = None
+        self.hub_server = None
+        self.lock_fd = None
+        self.writer = None
+        self.reader_task = None
+        self.closing = False
+        self.dropped_batches = 0
+
+    async def start(self):
+        await self.connect()
+
+    async def connect(self):
+        while not self.closing:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not await self.start_hub():
+                    await asyncio.sleep(RECONNECT_INTERVAL)
+                continue
+            try:
+                # Wait for the hub to accept the connection, as a hub which
+                # is closing may never accept it.
+                await asyncio.wait_for(read_frame(reader), CONNECT_TIMEOUT)
+            except (asyncio.IncompleteReadError, ConnectionError, asyncio.TimeoutError):
+                writer.close()
+                continue
+            self.writer = writer
+            self.reader_task = asyncio.ensure_future(self.read(reader))
+            return
+
+    async def start_hub(self):
+        """
+        Run the hub in this process, unless another process already holds
+        the hub lock. Returns whether the hub was started.
+        """
+        lock_fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            return False
+        self.lock_fd = lock_fd
+        # A socket left behind by a hub which exited.
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.hub = BrokerHub(self.max_buffer_size)
+        self.hub_server = await asyncio.start_unix_server(self.hub.handle, self.path)
+        return True
+
+    async def read(self, reader):
+        try:
+            while True:
+                self.receive_batch(await read_frame(reader))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        self.writer = None
+        if not self.closing:
+            await self.connect()
+
+    def send_batch(self, data):
+        if (
+            self.writer is None
+            or self.writer.is_closing()
+            or not write_frame(self.writer, data, self.max_buffer_size)
+        ):
+            self.dropped_batches += 1
+
+    async def close(self):
+        self.flush()
+        self.closing = True
+        if self.writer is not None:
+            self.writer.close()
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.hub_server is not None:
+            self.hub_server.close()
+            self.hub.close()
+            await self.hub_server.wait_closed()
+            os.unlink(self.path)
+            os.close(self.lock_fd)
+            self.hub_server = self.hub = self.lock_fd = None
@@ -0,0 +1,59 @@
+from functools import partial
+
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+from graphql.language import ast
+from graphql.language.parser import parse
+from graphql.language.printer import print_ast
+from graphql.validation import validate
+
+from .lru import DEFAULT_CACHE_SIZE, LRUDocumentCache  # noqa: F401
+
+
+def execute_validated(validation_errors, *args, **kwargs):
+    if validation_errors:
+        return ExecutionResult(errors=validation_errors, invalid=True)
+    return execute(*args, **kwargs)
+
+
+class ValidatedDocument(GraphQLDocument):
+    """
+    A document along with the errors found validating it against the schema.
+    """
+
+    def __init__(self, schema, document_string, document_ast, validation_errors):
+        super(ValidatedDocument, self).__init__(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=partial(execute_validated, validation_errors, schema, document_ast),
+        )
+        self.validation_errors = validation_errors
+
+
+class DocumentCache(LRUDocumentCache, GraphQLBackend):
+    """
+    A graphql-core backend which keeps the most recently used documents parsed
+    and validated, keyed by schema and query string.
+
+    Documents taken from the cache skip straight to execution. Set ``maxsize``
+    to 0 to disable caching.
+    """
+
+    def get_key(self, schema, request_string):
+        if isinstance(request_string, ast.Document):
+            return None
+        return (schema, request_string)
+
+    def build_document(self, schema, request_string):
+        if isinstance(request_string, ast.Document):
+            document_ast = request_string
+            request_string = print_ast(document_ast)
+        else:
+            document_ast = parse(request_string)
+        return ValidatedDocument(
+            schema=schema,
+            document_string=request_string,
+            document_ast=document_ast,
+            validation_errors=validate(schema, document_ast),
+        )
@@ -0,0 +1,110 @@
+import importlib
+import json
+
+
+class JSONCodec(object):
+    """
+    Encodes and decodes protocol messages with the standard library ``json``
+    module.
+
+    Codecs return text from ``dumps``, which transports send as text frames,
+    and bytes from ``dumpb``, such as for brokers publishing events.
+    """
+
+    name = "json"
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+    def dumpb(self, obj):
+        return self.dumps(obj).encode("utf-8")
+
+
+class FastJSONCodec(JSONCodec):
+    """
+    Base class for codecs wrapping a third party JSON library. Anything the
+    library refuses to encode (such as integers wider than 64 bits) is
+    encoded with the standard library instead.
+    """
+
+    module_name = None
+    fallback_errors = (TypeError, ValueError, OverflowError)
+
+    def __init__(self):
+        self.module = importlib.import_module(self.module_name)
+
+    def loads(self, data):
+        return self.module.loads(data)
+
+    def dumps(self, obj):
+        try:
+            return self.module.dumps(obj)
+        except self.fallback_errors:
+            return json.dumps(obj)
+
+
+class OrjsonCodec(FastJSONCodec):
+    name = module_name = "orjson"
+
+    def __init__(self):
+        super(OrjsonCodec, self).__init__()
+        self.options = self.module.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        return self.dumpb(obj).decode("utf-8")
+
+    def dumpb(self, obj):
+        try:
+            return self.module.dumps(obj, option=self.options)
+        except self.fallback_errors:
+            return json.dumps(obj).encode("utf-8")
+
+
+class UjsonCodec(FastJSONCodec):
+    name = module_name = "ujson"
+
+
+class RapidjsonCodec(FastJSONCodec):
+    name = module_name = "rapidjson"
+
+
+class EncodedResult(object):
+    """
+    An execution result already converted and encoded, such as by a worker
+    process.
+
+    ``payload`` is the encoded payload of the data message, and
+    ``error_types`` the type names of any errors it holds.
+    """
+
+    __slots__ = ("payload", "error_types")
+
+    def __init__(self, payload, error_types=()):
+        self.payload = payload
+        self.error_types = error_types
+
+
+CODECS = [OrjsonCodec, UjsonCodec, RapidjsonCodec, JSONCodec]
+
+
+def get_codec(codec=None):
+    """
+    Return a codec instance.
+
+    ``codec`` may be a codec instance, or the name of one of the bundled
+    codecs. When it's ``None`` (or ``"auto"``) the fastest installed codec is
+    used, falling back to the standard library.
+    """
+    if codec is not None and not isinstance(codec, str):
+        return codec
+    for codec_class in CODECS:
+        if codec in (None, "auto", codec_class.name):
+            try:
+                return codec_class()
+            except ImportError:
+                if codec_class.name == codec:
+                    raise
+    raise ValueError("Unknown codec: {}".format(codec))
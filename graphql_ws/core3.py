@@ -0,0 +1,111 @@
+"""
+Execution with graphql-core 3 for the asyncio servers.
+
+Mix :class:`GraphQLCore3Mixin` into any asyncio server to execute operations
+with graphql-core 3 instead of graphql-core 2::
+
+    class SubscriptionServer(GraphQLCore3Mixin, AiohttpSubscriptionServer):
+        pass
+"""
+from collections import OrderedDict
+
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    subscribe,
+    validate,
+)
+
+from .lru import LRUDocumentCache
+
+# Server options which rely on graphql-core 2's executors and documents.
+GRAPHQL_CORE2_OPTIONS = ("native_subscriptions", "thread_pool", "process_pool")
+
+
+class ValidatedDocument:
+    """
+    A parsed document along with the errors found validating it against the
+    schema.
+    """
+
+    def __init__(self, document_ast, validation_errors):
+        self.document_ast = document_ast
+        self.validation_errors = validation_errors
+
+    def get_operation_type(self, operation_name):
+        operation = get_operation_ast(self.document_ast, operation_name)
+        if operation is None:
+            return None
+        return operation.operation.value
+
+
+class DocumentCache(LRUDocumentCache):
+    """
+    Keeps the most recently used documents parsed and validated, keyed by
+    schema and query string. Set ``maxsize`` to 0 to disable caching.
+    """
+
+    def build_document(self, schema, request_string):
+        document_ast = parse(request_string)
+        return ValidatedDocument(document_ast, validate(schema, document_ast))
+
+
+class GraphQLCore3Mixin:
+    """
+    Execute operations with graphql-core 3.
+
+    Queries and mutations go through ``graphql.execute``, and subscriptions
+    through ``graphql.subscribe``, whose ``MapAsyncIterator`` results the
+    server iterates directly. Documents are cached by a
+    :class:`DocumentCache`.
+    """
+
+    graphql_executor = None
+
+    def __init__(self, schema, *args, document_cache=None, **kwargs):
+        for option in GRAPHQL_CORE2_OPTIONS:
+            if kwargs.get(option):
+                raise ValueError(
+                    "{} requires graphql-core 2, and can't be used with "
+                    "GraphQLCore3Mixin".format(option)
+                )
+        if document_cache is None:
+            document_cache = DocumentCache()
+        super().__init__(schema, *args, document_cache=document_cache, **kwargs)
+
+    def execute(self, params):
+        try:
+            document = self.document_cache.document_from_string(
+                self.schema, params["request_string"]
+            )
+        except Exception as error:
+            if not isinstance(error, GraphQLError):
+                error = GraphQLError(str(error), original_error=error)
+            return ExecutionResult(data=None, errors=[error])
+        if document.validation_errors:
+            return ExecutionResult(data=None, errors=document.validation_errors)
+        operation_name = params.get("operation_name")
+        kwargs = dict(
+            schema=self.schema,
+            document=document.document_ast,
+            root_value=params.get("root_value"),
+            context_value=params.get("context_value"),
+            variable_values=params.get("variable_values"),
+            operation_name=operation_name,
+        )
+        operation_type = document.get_operation_type(operation_name)
+        if operation_type == OperationType.SUBSCRIPTION.value:
+            return subscribe(**kwargs)
+        return execute(middleware=params.get("middleware"), **kwargs)
+
+    def execution_result_to_dict(self, execution_result):
+        result = OrderedDict()
+        if execution_result.data:
+            result["data"] = execution_result.data
+        if execution_result.errors:
+            result["errors"] = [error.formatted for error in execution_result.errors]
+        return result
@@ -1,5 +1,3 @@
-import json
-
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
 from ..constants import WS_PROTOCOL
@@ -25,6 +23,13 @@ class GraphQLSubscriptionConsumer(AsyncJsonWebsocketConsumer):
     async def receive_json(self, content):
         subscription_server.on_message(self.connection_context, content)
 
+    @classmethod
+    async def decode_json(cls, text_data):
+        if subscription_server.metrics is not None:
+            # on_message only gets the decoded message.
+            subscription_server.metrics.bytes_received += len(text_data)
+        return subscription_server.codec.loads(text_data)
+
     @classmethod
     async def encode_json(cls, content):
-        return json.dumps(content)
+        return subscription_server.codec.dumps(content)
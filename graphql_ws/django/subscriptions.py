@@ -1,4 +1,5 @@
 from graphene_django.settings import graphene_settings
+from ..base import decode_frame
 from ..base_async import BaseAsyncConnectionContext, BaseAsyncSubscriptionServer
 from ..observable_aiter import setup_observable_extension
 
@@ -15,6 +16,11 @@ class ChannelsConnectionContext(BaseAsyncConnectionContext):
             return
         await self.ws.send_json(data)
 
+    async def send_encoded(self, frame):
+        if self.closed:
+            return
+        await self.ws.send(text_data=decode_frame(frame))
+
     @property
     def closed(self):
         return self.socket_closed
@@ -31,7 +37,9 @@ class ChannelsConnectionContext(BaseAsyncConnectionContext):
 
 class ChannelsSubscriptionServer(BaseAsyncSubscriptionServer):
     async def handle(self, ws, request_context=None):
-        connection_context = ChannelsConnectionContext(ws, request_context)
+        connection_context = ChannelsConnectionContext(
+            ws, request_context, codec=self.codec
+        )
         await self.on_open(connection_context)
         return connection_context
 
@@ -1,5 +1,3 @@
-import json
-
 try:
     # Channels version > 1 renamed the websockets module to websocket.
     from channels.generic.websockets import JsonWebsocketConsumer
@@ -7,19 +5,23 @@ except ImportError:
     from channels.generic.websocket import JsonWebsocketConsumer
 from graphene_django.settings import graphene_settings
 
-from .base import BaseConnectionContext
+from .base import BaseConnectionContext, decode_frame
 from .base_sync import BaseSyncSubscriptionServer
 
 
 class DjangoChannelConnectionContext(BaseConnectionContext):
-    def __init__(self, message):
+    def __init__(self, message, codec=None):
         super(DjangoChannelConnectionContext, self).__init__(
             message.reply_channel,
             request_context={"user": message.user, "session": message.http_session},
+            codec=codec,
         )
 
     def send(self, data):
-        self.ws.send({"text": json.dumps(data)})
+        self.send_encoded(self.encode(data))
+
+    def send_encoded(self, frame):
+        self.ws.send({"text": decode_frame(frame)})
 
     def close(self, reason):
         data = {"close": True, "text": reason}
@@ -27,6 +29,18 @@ class DjangoChannelConnectionContext(BaseConnectionContext):
 
 
 class DjangoChannelSubscriptionServer(BaseSyncSubscriptionServer):
+    def __init__(self, schema, keep_alive=False, **kwargs):
+        # Connection contexts only live for a single message with channels 1,
+        # so there is no connection to keep alive.
+        super(DjangoChannelSubscriptionServer, self).__init__(
+            schema, keep_alive, **kwargs
+        )
+
+    def on_open(self, connection_context):
+        # Connection contexts only live for a single message, so they aren't
+        # counted as connections.
+        pass
+
     def handle(self, message, connection_context):
         self.on_message(connection_context, message)
 
@@ -46,6 +60,8 @@ class GraphQLSubscriptionConsumer(JsonWebsocketConsumer):
         Called when a message is received with either text or bytes
         filled out.
         """
-        context = DjangoChannelConnectionContext(self.message)
+        context = DjangoChannelConnectionContext(
+            self.message, codec=subscription_server.codec
+        )
         subscription_server.on_open(context)
         subscription_server.handle(content, context)
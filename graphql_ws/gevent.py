@@ -1,23 +1,42 @@
 from __future__ import absolute_import
 
-import json
+import gevent
+from gevent.event import Event
+from gevent.pool import Pool
 
 from .base import (
     BaseConnectionContext,
     ConnectionClosedException,
+    decode_frame,
 )
 from .base_sync import BaseSyncSubscriptionServer
 
+# Operations started concurrently per connection.
+POOL_SIZE = 10
+
 
 class GeventConnectionContext(BaseConnectionContext):
+    def __init__(self, ws, request_context=None, codec=None, pool_size=POOL_SIZE):
+        super(GeventConnectionContext, self).__init__(
+            ws, request_context=request_context, codec=codec
+        )
+        self.pool = Pool(pool_size)
+        # The greenlets of the operations being started, by id.
+        self.starting = {}
+
     def receive(self):
         msg = self.ws.receive()
         return msg
 
     def send(self, data):
+        self.send_encoded(self.encode(data))
+
+    def send_encoded(self, frame):
         if self.closed:
             return
-        self.ws.send(json.dumps(data))
+        # On Python 3, gevent-websocket would send the repr of bytes given as
+        # a text frame.
+        self.ws.send(decode_frame(frame))
 
     @property
     def closed(self):
@@ -26,10 +45,41 @@ class GeventConnectionContext(BaseConnectionContext):
     def close(self, code):
         self.ws.close(code)
 
+    def stop_starting(self, op_id):
+        greenlet = self.starting.pop(op_id, None)
+        if greenlet is not None:
+            greenlet.kill()
+
 
 class GeventSubscriptionServer(BaseSyncSubscriptionServer):
+    """
+    Start operations in greenlets, so a connection keeps receiving messages
+    (such as stop messages) while its operations are being started.
+
+    At most ``pool_size`` operations start at once per connection, and
+    ``max_greenlets`` across connections (``None`` for no limit). Once
+    either is reached, a connection stops receiving messages until one of
+    its operations is started.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.pool_size = kwargs.pop("pool_size", POOL_SIZE)
+        self.greenlets = Pool(kwargs.pop("max_greenlets", None))
+        super(GeventSubscriptionServer, self).__init__(*args, **kwargs)
+
+    def spawn(self, func, *args):
+        return gevent.spawn(func, *args)
+
+    def sleep(self, seconds):
+        gevent.sleep(seconds)
+
+    def make_event(self):
+        return Event()
+
     def handle(self, ws, request_context=None):
-        connection_context = GeventConnectionContext(ws, request_context)
+        connection_context = GeventConnectionContext(
+            ws, request_context, codec=self.codec, pool_size=self.pool_size
+        )
         self.on_open(connection_context)
         while True:
             try:
@@ -40,3 +90,37 @@ class GeventSubscriptionServer(BaseSyncSubscriptionServer):
                 self.on_close(connection_context)
                 return
             self.on_message(connection_context, message)
+
+    def on_start(self, connection_context, op_id, params):
+        # A new operation with the same id replaces the one being started.
+        connection_context.stop_starting(op_id)
+        greenlet = gevent.Greenlet(
+            super(GeventSubscriptionServer, self).on_start,
+            connection_context,
+            op_id,
+            params,
+        )
+        # Both wait for a free slot.
+        connection_context.pool.add(greenlet)
+        self.greenlets.add(greenlet)
+        starting = connection_context.starting
+        starting[op_id] = greenlet
+
+        def started(greenlet):
+            if starting.get(op_id) is greenlet:
+                del starting[op_id]
+
+        greenlet.link(started)
+        greenlet.start()
+        return greenlet
+
+    def on_stop(self, connection_context, op_id):
+        connection_context.stop_starting(op_id)
+        return super(GeventSubscriptionServer, self).on_stop(
+            connection_context, op_id
+        )
+
+    def on_close(self, connection_context):
+        connection_context.starting.clear()
+        connection_context.pool.kill()
+        return super(GeventSubscriptionServer, self).on_close(connection_context)
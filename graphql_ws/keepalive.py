@@ -0,0 +1,57 @@
+from threading import Lock
+
+KEEP_ALIVE_INTERVAL = 30
+KEEP_ALIVE_SLOTS = 64
+
+
+class TimerWheel(object):
+    """
+    A hashed timer wheel for items which all repeat with the same interval.
+
+    The interval is split into ``slots`` ticks. Items are hashed into the
+    slot for the tick they were added on, and every call to :meth:`tick`
+    advances the wheel by one slot and returns the items that are due, so a
+    single scheduler serves any number of items. Adding and removing items
+    is O(1).
+    """
+
+    def __init__(self, interval, slots=KEEP_ALIVE_SLOTS):
+        self.interval = interval
+        self.tick_interval = float(interval) / slots
+        self.position = 0
+        self.slots = [set() for _ in range(slots)]
+        self.item_slots = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.item_slots)
+
+    def __contains__(self, item):
+        return item in self.item_slots
+
+    def add(self, item):
+        """
+        Schedule an item to be returned by :meth:`tick` once every interval,
+        starting one interval from now.
+        """
+        with self._lock:
+            self._remove(item)
+            self.slots[self.position].add(item)
+            self.item_slots[item] = self.position
+
+    def remove(self, item):
+        with self._lock:
+            self._remove(item)
+
+    def _remove(self, item):
+        position = self.item_slots.pop(item, None)
+        if position is not None:
+            self.slots[position].discard(item)
+
+    def tick(self):
+        """
+        Advance the wheel by one slot and return the items that are due.
+        """
+        with self._lock:
+            self.position = (self.position + 1) % len(self.slots)
+            return list(self.slots[self.position])
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from threading import Lock
+
+DEFAULT_CACHE_SIZE = 1000
+
+
+class LRUDocumentCache(object):
+    """
+    Keeps the most recently used documents parsed and validated, keyed by
+    schema and query string. Set ``maxsize`` to 0 to disable caching.
+
+    Subclasses implement :meth:`build_document` for their version of
+    graphql-core. Requests whose :meth:`get_key` is ``None`` aren't cached.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._documents = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, key):
+        return key in self._documents
+
+    def get_key(self, schema, request_string):
+        return (schema, request_string)
+
+    def build_document(self, schema, request_string):
+        raise NotImplementedError("build_document method not implemented")
+
+    def document_from_string(self, schema, request_string):
+        key = self.get_key(schema, request_string) if self.maxsize else None
+        if key is None:
+            return self.build_document(schema, request_string)
+        with self._lock:
+            document = self._documents.pop(key, None)
+            if document is not None:
+                self.hits += 1
+                self._documents[key] = document
+                return document
+            self.misses += 1
+        document = self.build_document(schema, request_string)
+        self.add(key, document)
+        return document
+
+    def add(self, key, document):
+        with self._lock:
+            self._documents.pop(key, None)
+            self._documents[key] = document
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    @property
+    def stats(self):
+        return {
+            "size": len(self._documents),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,330 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+from .constants import (
+    GQL_COMPLETE,
+    GQL_CONNECTION_ACK,
+    GQL_CONNECTION_ERROR,
+    GQL_CONNECTION_INIT,
+    GQL_CONNECTION_KEEP_ALIVE,
+    GQL_CONNECTION_TERMINATE,
+    GQL_DATA,
+    GQL_ERROR,
+    GQL_START,
+    GQL_STOP,
+)
+
+LATENCY_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+MAX_OPERATION_NAMES = 100
+OTHER_OPERATIONS = "other"
+
+MESSAGE_TYPES = frozenset(
+    (
+        GQL_COMPLETE,
+        GQL_CONNECTION_ACK,
+        GQL_CONNECTION_ERROR,
+        GQL_CONNECTION_INIT,
+        GQL_CONNECTION_KEEP_ALIVE,
+        GQL_CONNECTION_TERMINATE,
+        GQL_DATA,
+        GQL_ERROR,
+        GQL_START,
+        GQL_STOP,
+    )
+)
+UNKNOWN_TYPE = "unknown"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram(object):
+    """
+    Counts observed values into cumulative buckets, Prometheus style.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last count is for values above every bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        total = 0
+        counts = []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class Metrics(object):
+    """
+    Counters for a server's connections, operations and messages.
+
+    Pass one to a server with ``metrics=``. Updating the counters is a few
+    dict and integer operations per message; the number of active
+    connections and operations is only counted when it's read.
+
+    Messages are counted by type, and data messages by the name of their
+    operation. Only ``max_operation_names`` names are kept apart, so
+    clients can't grow the counters without bounds: data messages of other
+    operations are counted as ``"other"``. Byte counts are the length of the
+    frames, which is their size in bytes for ASCII text.
+    """
+
+    def __init__(
+        self, latency_buckets=LATENCY_BUCKETS, max_operation_names=MAX_OPERATION_NAMES
+    ):
+        self.max_operation_names = max_operation_names
+        self.connection_contexts = set()
+        self.messages_received = defaultdict(int)
+        self.messages_sent = defaultdict(int)
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.send_latency = Histogram(latency_buckets)
+        self.errors = defaultdict(int)
+        self.data_messages = defaultdict(int)
+        self.thread_pool = None
+        self.thread_wait = Histogram(latency_buckets)
+        self.loop_blocked = Histogram(latency_buckets)
+
+    @property
+    def connections(self):
+        return len(self.connection_contexts)
+
+    @property
+    def operations(self):
+        return sum(
+            len(connection_context.operations)
+            for connection_context in list(self.connection_contexts)
+        )
+
+    def connection_opened(self, connection_context):
+        self.connection_contexts.add(connection_context)
+
+    def connection_closed(self, connection_context):
+        self.connection_contexts.discard(connection_context)
+
+    def operation_started(self, connection_context, op_id, operation_name):
+        name = operation_name or ""
+        if (
+            name not in self.data_messages
+            and len(self.data_messages) >= self.max_operation_names
+        ):
+            name = OTHER_OPERATIONS
+        connection_context.operation_names[op_id] = name
+
+    def message_received(self, op_type, size):
+        if op_type not in MESSAGE_TYPES:
+            op_type = UNKNOWN_TYPE
+        self.messages_received[op_type] += 1
+        self.bytes_received += size
+
+    def message_sent(self, connection_context, op_id, op_type, frame, latency):
+        self.messages_sent[op_type] += 1
+        self.bytes_sent += len(frame)
+        self.send_latency.observe(latency)
+        if op_type == GQL_DATA:
+            name = connection_context.operation_names.get(op_id, "")
+            self.data_messages[name] += 1
+
+    def frames_sent(self, op_type, frame, count):
+        """
+        Count a frame sent to several connections at once, such as a keep
+        alive message.
+        """
+        self.messages_sent[op_type] += count
+        self.bytes_sent += len(frame) * count
+
+    def watch_thread_pool(self, thread_pool):
+        """
+        Report the load of a server's resolver thread pool: its size, and the
+        number of resolvers running in it and waiting for a thread.
+        """
+        self.thread_pool = thread_pool
+
+    def error(self, error):
+        self.errors[type(error).__name__] += 1
+
+    def snapshot(self):
+        """
+        Return the current value of every metric, as plain data.
+        """
+        return {
+            "connections": self.connections,
+            "operations": self.operations,
+            "messages_received": dict(self.messages_received),
+            "messages_sent": dict(self.messages_sent),
+            "bytes_received": self.bytes_received,
+            "bytes_sent": self.bytes_sent,
+            "send_latency": histogram_snapshot(self.send_latency),
+            "errors": dict(self.errors),
+            "data_messages": dict(self.data_messages),
+            "thread_pool": None
+            if self.thread_pool is None
+            else {
+                "max_workers": self.thread_pool.max_workers,
+                "busy": self.thread_pool.busy,
+                "queued": self.thread_pool.queued,
+            },
+            "thread_wait": histogram_snapshot(self.thread_wait),
+            "loop_blocked": histogram_snapshot(self.loop_blocked),
+        }
+
+    def exposition(self, prefix="graphql_ws"):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = prefix + "_" + name
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for suffix, labels, value in samples:
+                lines.append(
+                    "{}{}{} {}".format(name, suffix, format_labels(labels), value)
+                )
+
+        def by_label(label, counts):
+            return [("", {label: key}, value) for key, value in sorted(counts.items())]
+
+        def histogram(name, help_text, values):
+            bounds = [repr(float(bucket)) for bucket in values.buckets]
+            bounds.append("+Inf")
+            metric(
+                name,
+                "histogram",
+                help_text,
+                [
+                    ("_bucket", {"le": bound}, count)
+                    for bound, count in zip(bounds, values.cumulative_counts())
+                ]
+                + [("_sum", {}, repr(values.sum)), ("_count", {}, values.count)],
+            )
+
+        metric(
+            "connections", "gauge", "Open connections.", [("", {}, self.connections)]
+        )
+        metric(
+            "operations", "gauge", "Active operations.", [("", {}, self.operations)]
+        )
+        metric(
+            "messages_received_total",
+            "counter",
+            "Messages received, by type.",
+            by_label("type", self.messages_received),
+        )
+        metric(
+            "messages_sent_total",
+            "counter",
+            "Messages sent, by type.",
+            by_label("type", self.messages_sent),
+        )
+        metric(
+            "received_bytes_total",
+            "counter",
+            "Length of the messages received.",
+            [("", {}, self.bytes_received)],
+        )
+        metric(
+            "sent_bytes_total",
+            "counter",
+            "Length of the messages sent.",
+            [("", {}, self.bytes_sent)],
+        )
+        histogram(
+            "send_latency_seconds",
+            "Time to write or queue a message.",
+            self.send_latency,
+        )
+        metric(
+            "errors_total",
+            "counter",
+            "Errors sent to clients, by exception type.",
+            by_label("type", self.errors),
+        )
+        metric(
+            "data_messages_total",
+            "counter",
+            "Data messages sent, by operation name.",
+            by_label("operation", self.data_messages),
+        )
+        if self.thread_pool is not None:
+            thread_pool = self.thread_pool
+            metric(
+                "resolver_threads",
+                "gauge",
+                "Size of the resolver thread pool.",
+                [("", {}, thread_pool.max_workers)],
+            )
+            metric(
+                "resolver_threads_busy",
+                "gauge",
+                "Resolvers running in the thread pool.",
+                [("", {}, thread_pool.busy)],
+            )
+            metric(
+                "resolver_threads_queued",
+                "gauge",
+                "Resolvers waiting for a thread.",
+                [("", {}, thread_pool.queued)],
+            )
+            histogram(
+                "resolver_thread_wait_seconds",
+                "Time resolvers waited for a thread.",
+                self.thread_wait,
+            )
+            histogram(
+                "loop_blocked_seconds",
+                "Time resolvers run on the event loop blocked it.",
+                self.loop_blocked,
+            )
+        return "\n".join(lines) + "\n"
+
+
+def histogram_snapshot(histogram):
+    return {
+        "buckets": list(histogram.buckets),
+        "counts": histogram.cumulative_counts(),
+        "count": histogram.count,
+        "sum": histogram.sum,
+    }
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            '{}="{}"'.format(name, escape_label(value))
+            for name, value in sorted(labels.items())
+        )
+        + "}"
+    )
+
+
+def escape_label(value):
+    return (
+        str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
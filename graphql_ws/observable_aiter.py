@@ -1,51 +1,149 @@
-from asyncio import Future
+import threading
+from asyncio import Event, get_event_loop
+from collections import deque
 
-from rx.core import Observable
-from rx.internal import extensionmethod
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+ERROR = "error"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, ERROR)
 
 
-async def __aiter__(self):
-    source = self
+class BufferOverflow(Exception):
+    pass
+
+
+class AIterator:
+    """
+    Iterate asynchronously over the items of an Observable.
 
-    class AIterator:
-        def __init__(self):
-            self.notifications = []
-            self.future = Future()
+    Items emitted faster than they are consumed are buffered. With a
+    ``max_buffer_size``, the ``overflow`` policy decides what happens to an
+    item arriving at a full buffer: ``drop_oldest`` and ``drop_newest`` drop
+    an item (counted in :attr:`dropped`), and ``error`` stops iteration with
+    :exc:`BufferOverflow`.
 
-            self.disposable = source.materialize().subscribe(self.on_next)
+    The iterator wakes its consumer with a single :class:`asyncio.Event`
+    for its whole lifetime, which is only waited on when the buffer is
+    empty. Use :meth:`next_batch` to take every buffered item at once.
+    """
 
-        def __aiter__(self):
-            return self
+    def __init__(self, source, max_buffer_size=None, overflow=DROP_OLDEST):
+        assert overflow in OVERFLOW_POLICIES, (
+            "overflow should be one of {}".format(OVERFLOW_POLICIES)
+        )
+        self.max_buffer_size = max_buffer_size
+        self.overflow = overflow
+        self.buffer = deque()
+        self.dropped = 0
+        self.error = None
+        self.completed = False
+        self.loop = get_event_loop()
+        self.wakeup = Event()
+        self.thread_id = threading.get_ident()
+        self.disposable = None
+        self.disposable = source.subscribe(
+            on_next=self.on_next, on_error=self.on_error, on_completed=self.on_completed
+        )
+        if self.finished:
+            # The source finished, or overflowed the buffer, while subscribing.
+            self.dispose()
 
-        def dispose(self):
+    def __aiter__(self):
+        return self
+
+    def dispose(self):
+        if self.disposable is not None:
             self.disposable.dispose()
 
-        def feeder(self):
-            if not self.notifications or self.future.done():
+    @property
+    def finished(self):
+        return self.completed or self.error is not None
+
+    async def aclose(self):
+        """
+        Unsubscribe from the Observable and end the iteration, dropping any
+        buffered items.
+        """
+        self.dispose()
+        self.buffer.clear()
+        self.on_completed()
+
+    def notify(self):
+        # Observables may emit from scheduler threads.
+        if threading.get_ident() == self.thread_id:
+            self.wakeup.set()
+        else:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def on_next(self, value):
+        if self.finished:
+            return
+        buffer = self.buffer
+        if self.max_buffer_size is not None and len(buffer) >= self.max_buffer_size:
+            if self.overflow == DROP_NEWEST:
+                self.dropped += 1
+                return
+            elif self.overflow == DROP_OLDEST:
+                buffer.popleft()
+                self.dropped += 1
+            else:
+                buffer.clear()
+                self.dispose()
+                self.on_error(
+                    BufferOverflow(
+                        "More than {} items buffered".format(self.max_buffer_size)
+                    )
+                )
                 return
+        buffer.append(value)
+        self.notify()
+
+    def on_error(self, error):
+        if self.finished:
+            return
+        self.error = error
+        self.notify()
 
-            notification = self.notifications.pop(0)
-            kind = notification.kind
-            if kind == "N":
-                self.future.set_result(notification.value)
-            if kind == "E":
-                self.future.set_exception(notification.exception)
-            if kind == "C":
-                self.future.set_exception(StopAsyncIteration)
+    def on_completed(self):
+        if self.finished:
+            return
+        self.completed = True
+        self.notify()
 
-        def on_next(self, notification):
-            self.notifications.append(notification)
-            self.feeder()
+    async def wait(self):
+        while not self.buffer:
+            if self.error is not None:
+                raise self.error
+            if self.completed:
+                raise StopAsyncIteration
+            self.wakeup.clear()
+            await self.wakeup.wait()
 
-        async def __anext__(self):
-            self.feeder()
+    async def __anext__(self):
+        await self.wait()
+        return self.buffer.popleft()
 
-            value = await self.future
-            self.future = Future()
-            return value
+    async def next_batch(self, max_items=None):
+        """
+        Wait for at least one item, then return every buffered item (or at
+        most ``max_items`` of them).
+        """
+        await self.wait()
+        buffer = self.buffer
+        if max_items is None or max_items >= len(buffer):
+            items = list(buffer)
+            buffer.clear()
+        else:
+            items = [buffer.popleft() for _ in range(max_items)]
+        return items
 
-    return AIterator()
+
+async def __aiter__(self):
+    return AIterator(self)
 
 
 def setup_observable_extension():
+    from rx.core import Observable
+    from rx.internal import extensionmethod
+
     extensionmethod(Observable)(__aiter__)
@@ -0,0 +1,38 @@
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+
+from .tracing import Tracer
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    Report every phase as an OpenTelemetry span named ``graphql_ws.<phase>``,
+    with the operation id and the connection as attributes::
+
+        subscription_server = AiohttpSubscriptionServer(
+            schema, tracer=OpenTelemetryTracer()
+        )
+
+    Spans are started in the current OpenTelemetry context, so they nest
+    under any span active when the server handles the connection.
+    """
+
+    def __init__(self, tracer_provider=None):
+        self.tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+
+    def on_start(self, span):
+        attributes = {"graphql_ws.phase": span.phase}
+        if span.connection_context is not None:
+            attributes["graphql_ws.connection"] = id(span.connection_context)
+        if span.op_id is not None:
+            attributes["graphql_ws.operation_id"] = str(span.op_id)
+        span.data = self.tracer.start_span(
+            "graphql_ws." + span.phase, attributes=attributes
+        )
+
+    def on_end(self, span):
+        otel_span = span.data
+        if span.error is not None:
+            otel_span.record_exception(span.error)
+            otel_span.set_status(Status(StatusCode.ERROR, str(span.error)))
+        otel_span.end()
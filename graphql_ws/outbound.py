@@ -0,0 +1,225 @@
+from collections import deque
+from threading import Event, Lock
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+CONFLATE = "conflate"
+DISCONNECT = "disconnect"
+POLICIES = (BLOCK, DROP_OLDEST, CONFLATE, DISCONNECT)
+
+HIGH_WATERMARK = 1000
+
+# "Try Again Later": the client is too slow to keep up with its operations.
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class SlowConsumer(Exception):
+    pass
+
+
+class OutboundQueue(object):
+    """
+    Encoded frames waiting to be written to a single connection.
+
+    Once ``high_watermark`` frames are waiting, the queue applies its
+    ``policy`` to further frames:
+
+    ``block``
+        Producers of data frames should wait (see :attr:`paused`) until the
+        writer drains the queue down to ``low_watermark`` frames. Other
+        frames are queued without waiting.
+    ``drop_oldest``
+        The oldest droppable frame is discarded to make room.
+    ``conflate``
+        A new droppable frame replaces the frame still waiting for the same
+        operation, if there is one.
+    ``disconnect``
+        :exc:`SlowConsumer` is raised, and the connection should be closed.
+
+    Only data frames are marked droppable; other frames are always queued.
+    The queue does no locking or waiting itself, so it can back both the
+    asyncio and the sync writers.
+    """
+
+    def __init__(self, high_watermark=HIGH_WATERMARK, low_watermark=None, policy=BLOCK):
+        assert policy in POLICIES, "policy should be one of {}".format(POLICIES)
+        if low_watermark is None:
+            low_watermark = high_watermark // 2
+        assert low_watermark <= high_watermark, (
+            "low_watermark can't be greater than high_watermark"
+        )
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.policy = policy
+        self.paused = False
+        self.frames = deque()
+        self.pending = {}
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_depth = 0
+        self.flushes = 0
+        self.max_flush_size = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, frame, op_id=None, droppable=False):
+        if len(self.frames) >= self.high_watermark:
+            if self.policy == BLOCK:
+                self.paused = True
+            elif self.policy == DISCONNECT:
+                raise SlowConsumer(
+                    "More than {} frames waiting to be sent".format(
+                        self.high_watermark
+                    )
+                )
+            elif droppable and self.policy == CONFLATE:
+                entry = self.pending.get(op_id)
+                if entry is not None:
+                    entry[0] = frame
+                    self.conflated += 1
+                    return
+            elif droppable and self.policy == DROP_OLDEST:
+                self.drop_oldest()
+        entry = [frame, op_id, droppable]
+        self.frames.append(entry)
+        if droppable:
+            self.pending[op_id] = entry
+        self.enqueued += 1
+        if len(self.frames) > self.max_depth:
+            self.max_depth = len(self.frames)
+
+    def drop_oldest(self):
+        for index, entry in enumerate(self.frames):
+            if entry[2]:
+                del self.frames[index]
+                self.forget(entry)
+                self.dropped += 1
+                return
+
+    def forget(self, entry):
+        if entry[2] and self.pending.get(entry[1]) is entry:
+            del self.pending[entry[1]]
+
+    def get(self):
+        """
+        Take the oldest frame off the queue.
+        """
+        entry = self.frames.popleft()
+        self.forget(entry)
+        self.sent += 1
+        self.flushed(1)
+        return entry[0]
+
+    def get_all(self):
+        """
+        Take every waiting frame off the queue, to be written together.
+        """
+        frames = [entry[0] for entry in self.frames]
+        self.frames.clear()
+        self.pending.clear()
+        self.sent += len(frames)
+        self.flushed(len(frames))
+        return frames
+
+    def flushed(self, size):
+        self.flushes += 1
+        if size > self.max_flush_size:
+            self.max_flush_size = size
+        if self.paused and len(self.frames) <= self.low_watermark:
+            self.paused = False
+
+    def clear(self):
+        self.dropped += len(self.frames)
+        self.frames.clear()
+        self.pending.clear()
+        self.paused = False
+
+    @property
+    def stats(self):
+        return {
+            "depth": len(self.frames),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "flushes": self.flushes,
+            "max_flush_size": self.max_flush_size,
+        }
+
+
+class OutboundWriter(object):
+    """
+    Drains a connection's outbound queue from a background thread or
+    greenlet, for the sync servers: producers queue frames with :meth:`put`
+    and go on without waiting for the socket, unless the queue's policy is
+    ``block``, it is full and the frame is a data frame.
+
+    ``spawn`` starts the writer, and ``make_event`` makes the events it waits
+    on: threads by default, or greenlets with ``gevent.spawn`` and
+    ``gevent.event.Event``.
+    """
+
+    def __init__(self, connection_context, outbound, spawn, make_event=Event):
+        self.connection_context = connection_context
+        self.outbound = outbound
+        self.lock = Lock()
+        self.frame_ready = make_event()
+        self.drained = make_event()
+        self.stopped = False
+        self.worker = spawn(self.run)
+
+    def put(self, frame, op_id=None, droppable=False):
+        outbound = self.outbound
+        while True:
+            with self.lock:
+                if self.stopped or self.connection_context.closed:
+                    return
+                # Only data frames wait, like with the asyncio servers.
+                if not (droppable and outbound.paused and outbound.policy == BLOCK):
+                    try:
+                        outbound.put(frame, op_id, droppable)
+                    except SlowConsumer:
+                        break
+                    self.frame_ready.set()
+                    return
+                # Cleared while holding the lock, so the writer can't have
+                # drained the queue in between.
+                self.drained.clear()
+            self.drained.wait()
+        self.stop()
+        self.connection_context.close(SLOW_CONSUMER_CLOSE_CODE)
+
+    def run(self):
+        outbound = self.outbound
+        while True:
+            self.frame_ready.wait()
+            with self.lock:
+                if self.stopped:
+                    return
+                if not outbound:
+                    self.frame_ready.clear()
+                    continue
+                frames = outbound.get_all()
+                self.frame_ready.clear()
+                if not outbound.paused:
+                    self.drained.set()
+            for frame in frames:
+                try:
+                    self.connection_context.send_encoded(frame)
+                except Exception:
+                    # Failed writes are dropped, as the connection is most
+                    # likely closing.
+                    with self.lock:
+                        outbound.dropped += 1
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.outbound.clear()
+        # Release the writer and any producers waiting for the queue to drain.
+        self.frame_ready.set()
+        self.drained.set()
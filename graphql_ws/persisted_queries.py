@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+from threading import Lock, Thread
+
+PERSISTED_QUERY_VERSION = 1
+
+# The most queries a store holds, unless told otherwise.
+MAX_QUERIES = 1000
+
+
+class PersistedQueryNotFound(Exception):
+    def __init__(self, message="PersistedQueryNotFound"):
+        super(PersistedQueryNotFound, self).__init__(message)
+
+
+class PersistedQueryNotSupported(Exception):
+    def __init__(self, message="PersistedQueryNotSupported"):
+        super(PersistedQueryNotSupported, self).__init__(message)
+
+
+class PersistedQueryMismatch(Exception):
+    def __init__(self, message="provided sha does not match query"):
+        super(PersistedQueryMismatch, self).__init__(message)
+
+
+def get_query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def get_persisted_query(payload):
+    """
+    Return the ``(version, sha256Hash)`` of an Apollo style
+    ``extensions.persistedQuery`` payload entry, or ``None``.
+    """
+    extensions = payload.get("extensions")
+    if not isinstance(extensions, dict):
+        return None
+    persisted_query = extensions.get("persistedQuery")
+    if not isinstance(persisted_query, dict):
+        return None
+    return persisted_query.get("version"), persisted_query.get("sha256Hash")
+
+
+class BaseQueryStore(object):
+    """
+    Maps query hashes (or any other ID) to query strings.
+    """
+
+    read_only = False
+
+    def get(self, query_id):
+        raise NotImplementedError("get method not implemented")
+
+    def set(self, query_id, query):
+        """
+        Register a query, returning whether it was stored.
+        """
+        raise NotImplementedError("set method not implemented")
+
+    def queries(self):
+        raise NotImplementedError("queries method not implemented")
+
+
+class MemoryQueryStore(BaseQueryStore):
+    """
+    Keeps queries in memory. Once it holds ``max_size`` queries (``None`` for
+    no limit), new queries aren't registered: clients keep sending them in
+    full instead.
+    """
+
+    def __init__(self, queries=None, read_only=False, max_size=MAX_QUERIES):
+        self._queries = dict(queries or {})
+        self.read_only = read_only
+        self.max_size = max_size
+
+    def get(self, query_id):
+        return self._queries.get(query_id)
+
+    def set(self, query_id, query):
+        if (
+            self.max_size is not None
+            and len(self._queries) >= self.max_size
+            and query_id not in self._queries
+        ):
+            return False
+        self._queries[query_id] = query
+        return True
+
+    def queries(self):
+        return list(self._queries.values())
+
+
+class FileQueryStore(MemoryQueryStore):
+    """
+    A query store backed by a JSON file containing an object of
+    ``{"<id>": "<query>"}``, such as a persisted query manifest.
+
+    The store is read only by default. Otherwise, registered queries are
+    written back to the file from a background thread, so writing doesn't
+    hold up the server.
+    """
+
+    def __init__(self, path, read_only=True, max_size=MAX_QUERIES):
+        self.path = path
+        self._lock = Lock()
+        self._dirty = False
+        self._writer = None
+        queries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                queries = json.load(f)
+        super(FileQueryStore, self).__init__(
+            queries, read_only=read_only, max_size=max_size
+        )
+
+    def set(self, query_id, query):
+        with self._lock:
+            if not super(FileQueryStore, self).set(query_id, query):
+                return False
+            self._dirty = True
+            if self._writer is None:
+                self._writer = Thread(target=self._write)
+                self._writer.daemon = True
+                self._writer.start()
+        return True
+
+    def _write(self):
+        # Writes queries registered while writing too, one file at a time.
+        while True:
+            with self._lock:
+                if not self._dirty:
+                    self._writer = None
+                    return
+                self._dirty = False
+                queries = dict(self._queries)
+            tmp_path = "{}.tmp".format(self.path)
+            with open(tmp_path, "w") as f:
+                json.dump(queries, f, indent=2, sort_keys=True)
+            getattr(os, "replace", os.rename)(tmp_path, self.path)
+
+    def flush(self):
+        """
+        Wait until registered queries are written to the file.
+        """
+        writer = self._writer
+        if writer is not None:
+            writer.join()
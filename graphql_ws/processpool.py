@@ -0,0 +1,154 @@
+import asyncio
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from graphql import graphql
+from graphql.execution import ExecutionResult
+from graphql.execution.base import ExecutionContext
+from graphql.execution.executors.sync import SyncExecutor
+
+from .base import execution_result_to_dict
+from .cache import DEFAULT_CACHE_SIZE, DocumentCache
+from .codecs import EncodedResult, get_codec
+from .subscribe import complete_event, resolve_subscription_field
+
+# The state of a worker process, set up by init_worker.
+worker = {}
+
+
+def import_schema(schema_path):
+    module_name, _, attribute = schema_path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def init_worker(schema_path, codec, cache_size):
+    worker["schema"] = import_schema(schema_path)
+    worker["codec"] = get_codec(codec)
+    worker["document_cache"] = DocumentCache(cache_size)
+
+
+def encode_result(execution_result):
+    errors = execution_result.errors or ()
+    return EncodedResult(
+        worker["codec"].dumps(execution_result_to_dict(execution_result)),
+        tuple(type(error).__name__ for error in errors),
+    )
+
+
+def execute_in_worker(request_string, operation_name, variable_values, root_value):
+    execution_result = graphql(
+        worker["schema"],
+        request_string,
+        root_value=root_value,
+        variable_values=variable_values,
+        operation_name=operation_name,
+        backend=worker["document_cache"],
+    )
+    return encode_result(execution_result)
+
+
+def complete_in_worker(
+    request_string, operation_name, variable_values, root_value, event
+):
+    schema = worker["schema"]
+    document = worker["document_cache"].document_from_string(schema, request_string)
+    exe_context = ExecutionContext(
+        schema,
+        document.document_ast,
+        root_value,
+        None,
+        variable_values or {},
+        operation_name,
+        SyncExecutor(),
+        None,
+        True,
+    )
+    response_name, field_asts, field_def, info = resolve_subscription_field(
+        exe_context
+    )
+    return encode_result(
+        complete_event(exe_context, response_name, field_asts, field_def, info, event)
+    )
+
+
+class OperationProcessPool:
+    """
+    A pool of worker processes to execute selected operations in, and to
+    convert and encode their results, off the event loop and on other cores.
+
+    Workers import the schema from ``schema_path`` (``"module:attribute"``)
+    and keep their own cache of parsed and validated documents, so only the
+    query string, variables and root value are sent to them for each
+    operation. Subscriptions resolve their source stream in the server and
+    send each event to a worker to be completed.
+
+    Operations named in ``operation_names`` run in the pool. Root values and
+    subscription events must be picklable, and resolvers in the pool run
+    without a context value. ``codec`` is the name of the codec workers
+    encode payloads with, by default the server's.
+    """
+
+    def __init__(
+        self,
+        schema_path,
+        operation_names=(),
+        max_workers=None,
+        codec=None,
+        cache_size=DEFAULT_CACHE_SIZE,
+        mp_context=None,
+    ):
+        self.schema_path = schema_path
+        self.operation_names = frozenset(operation_names)
+        self.max_workers = max_workers
+        self.codec = codec
+        self.cache_size = cache_size
+        self.mp_context = mp_context
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                self.max_workers,
+                mp_context=self.mp_context,
+                initializer=init_worker,
+                initargs=(self.schema_path, self.codec, self.cache_size),
+            )
+        return self.executor
+
+    def run(self, fn, *args):
+        return asyncio.get_event_loop().run_in_executor(self.get_executor(), fn, *args)
+
+    async def execute(self, params):
+        """
+        Execute a query or a mutation in a worker.
+        """
+        try:
+            return await self.run(
+                execute_in_worker,
+                params["request_string"],
+                params.get("operation_name"),
+                params.get("variable_values"),
+                params.get("root_value"),
+            )
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def map_event(self, params):
+        """
+        Return a function completing the events of a subscription in a
+        worker.
+        """
+        return partial(
+            self.run,
+            complete_in_worker,
+            params["request_string"],
+            params.get("operation_name"),
+            params.get("variable_values"),
+            params.get("root_value"),
+        )
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
@@ -0,0 +1,167 @@
+import asyncio
+from collections import deque
+
+
+class Subscription:
+    """
+    The events published to a :class:`PubSub` topic which match the
+    subscription's filters, as an async iterator.
+
+    Events are buffered until they are consumed; with a ``max_buffer_size``
+    the oldest events are dropped first (counted in :attr:`dropped`).
+    Closing the subscription ends the iteration once the buffered events
+    have been consumed.
+    """
+
+    __slots__ = (
+        "pubsub",
+        "topic",
+        "names",
+        "values",
+        "max_buffer_size",
+        "buffer",
+        "dropped",
+        "closed",
+        "future",
+    )
+
+    def __init__(self, pubsub, topic, names, values, max_buffer_size=None):
+        self.pubsub = pubsub
+        self.topic = topic
+        self.names = names
+        self.values = values
+        self.max_buffer_size = max_buffer_size
+        self.buffer = deque()
+        self.dropped = 0
+        self.closed = False
+        self.future = None
+
+    def put(self, event):
+        if self.closed:
+            return
+        buffer = self.buffer
+        if self.max_buffer_size is not None and len(buffer) >= self.max_buffer_size:
+            buffer.popleft()
+            self.dropped += 1
+        buffer.append(event)
+        self.wake()
+
+    def wake(self):
+        if self.future is not None and not self.future.done():
+            self.future.set_result(None)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.pubsub.unsubscribe(self)
+            self.wake()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.buffer:
+            if self.closed:
+                raise StopAsyncIteration
+            self.future = asyncio.get_event_loop().create_future()
+            await self.future
+        return self.buffer.popleft()
+
+    async def aclose(self):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class PubSub:
+    """
+    An in-memory event broker for subscription resolvers.
+
+    Subscribers are indexed by topic and by the values of their filters, so
+    publishing an event only reaches the subscriptions it matches, however
+    many other subscriptions there are::
+
+        pubsub = PubSub()
+
+        async def resolve_messages(root, info, channel_id):
+            async with pubsub.subscribe("messages", channel_id=channel_id) as events:
+                async for message in events:
+                    yield message
+
+        pubsub.publish("messages", message, channel_id=message.channel_id)
+
+    An event matches a subscription when the attributes it is published with
+    include every filter of the subscription, with equal values. Filter
+    values must be hashable.
+    """
+
+    def __init__(self, max_buffer_size=None):
+        self.max_buffer_size = max_buffer_size
+        # topic -> filter names -> filter values -> subscriptions
+        self.topics = {}
+        self.subscriptions = 0
+
+    def __len__(self):
+        return self.subscriptions
+
+    def subscribe(self, topic, **filters):
+        names = tuple(sorted(filters))
+        values = tuple(filters[name] for name in names)
+        subscription = Subscription(self, topic, names, values, self.max_buffer_size)
+        index = self.topics.setdefault(topic, {}).setdefault(names, {})
+        index.setdefault(values, set()).add(subscription)
+        self.subscriptions += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        try:
+            groups = self.topics[subscription.topic]
+            index = groups[subscription.names]
+            subscriptions = index[subscription.values]
+        except KeyError:
+            return
+        if subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        self.subscriptions -= 1
+        if not subscriptions:
+            del index[subscription.values]
+            if not index:
+                del groups[subscription.names]
+                if not groups:
+                    del self.topics[subscription.topic]
+
+    def publish(self, topic, event, **attributes):
+        """
+        Deliver an event to every matching subscription of a topic, and
+        return how many subscriptions it was delivered to.
+        """
+        groups = self.topics.get(topic)
+        if not groups:
+            return 0
+        delivered = 0
+        for names, index in groups.items():
+            try:
+                values = tuple(attributes[name] for name in names)
+            except KeyError:
+                continue
+            subscriptions = index.get(values)
+            if subscriptions:
+                for subscription in subscriptions:
+                    subscription.put(event)
+                delivered += len(subscriptions)
+        return delivered
+
+    def close(self):
+        """
+        Close every subscription.
+        """
+        for groups in list(self.topics.values()):
+            for index in list(groups.values()):
+                for subscriptions in list(index.values()):
+                    for subscription in list(subscriptions):
+                        subscription.close()
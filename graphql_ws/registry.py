@@ -0,0 +1,85 @@
+from threading import Lock
+
+_MISSING = object()
+
+
+class RegistryClosed(Exception):
+    pass
+
+
+class OperationRegistry(object):
+    """
+    A connection's operations by id, safe to update from several threads,
+    such as the threads Rx schedulers emit results on.
+
+    Reads don't lock: every update replaces the dict of operations with an
+    updated copy under a lock, so readers always see a consistent dict, and
+    can iterate over it while it's being updated. Connections only have a
+    few operations, so copying them is cheap.
+
+    Once closed, registering an operation raises :exc:`RegistryClosed`.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.operations = {}
+        self.closed = False
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __contains__(self, op_id):
+        return op_id in self.operations
+
+    def __iter__(self):
+        return iter(self.operations)
+
+    def __getitem__(self, op_id):
+        return self.operations[op_id]
+
+    def get(self, op_id, default=None):
+        return self.operations.get(op_id, default)
+
+    def items(self):
+        return self.operations.items()
+
+    def register(self, op_id, operation):
+        """
+        Register an operation, and return the operation it replaced, if any,
+        so it can be disposed of.
+        """
+        with self.lock:
+            if self.closed:
+                raise RegistryClosed()
+            replaced = self.operations.get(op_id)
+            operations = self.operations.copy()
+            operations[op_id] = operation
+            self.operations = operations
+        return replaced
+
+    def remove(self, op_id, operation=None):
+        """
+        Remove an operation and return it, or ``None`` if there is none.
+
+        If ``operation`` is given, the operation is only removed if it's
+        still the one registered with that id, and not one which replaced it.
+        """
+        with self.lock:
+            current = self.operations.get(op_id, _MISSING)
+            if current is _MISSING or (
+                operation is not None and current is not operation
+            ):
+                return None
+            operations = self.operations.copy()
+            del operations[op_id]
+            self.operations = operations
+        return current
+
+    def close(self):
+        """
+        Stop registering operations, and remove and return every operation.
+        """
+        with self.lock:
+            self.closed = True
+            operations, self.operations = self.operations, {}
+        return operations
@@ -0,0 +1,197 @@
+import asyncio
+import json
+from asyncio import Future
+from collections import deque
+
+from .constants import GQL_DATA
+
+_EMPTY = object()
+
+# The most results waiting to be sent to a single subscriber.
+MAX_PENDING = 100
+
+
+async def latest_results(iterator):
+    """
+    Iterate over the results of an async iterator, but only the latest one:
+    a result which hasn't been taken yet is replaced by any newer result.
+    """
+    latest = _EMPTY
+    ready = asyncio.Event()
+
+    async def consume():
+        nonlocal latest
+        async for result in iterator:
+            latest = result
+            ready.set()
+
+    consumer = asyncio.ensure_future(consume())
+    consumer.add_done_callback(lambda future: ready.set())
+    try:
+        while True:
+            if latest is _EMPTY:
+                if consumer.done():
+                    # Raise any error from the subscription.
+                    consumer.result()
+                    return
+                await ready.wait()
+                ready.clear()
+                continue
+            result, latest = latest, _EMPTY
+            yield result
+    finally:
+        consumer.cancel()
+
+
+class SharedSubscriber:
+    """
+    A single ``(connection_context, op_id)`` subscribed to a shared
+    subscription. Registered as the connection's operation, so stopping the
+    operation unsubscribes it from the shared execution.
+
+    Results are written by a task of the subscriber's own, so a slow
+    connection only holds up itself. Once ``max_pending`` results are waiting
+    to be written, the oldest one is dropped (counted in :attr:`dropped`);
+    only the latest one waits if the subscription is conflated.
+    """
+
+    def __init__(self, shared, connection_context, op_id, max_pending=MAX_PENDING):
+        self.shared = shared
+        self.connection_context = connection_context
+        self.op_id = op_id
+        self.pending = deque(maxlen=1 if shared.conflate else max_pending)
+        self.dropped = 0
+        self.sender = None
+        self.error = _EMPTY
+        self.future = Future()
+
+    def send(self, encoded_result):
+        """
+        Queue an encoded result to be written, without waiting for it.
+        """
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(encoded_result)
+        if self.sender is None:
+            self.sender = asyncio.ensure_future(self.send_pending())
+
+    async def send_pending(self):
+        server = self.shared.server
+        try:
+            while self.pending:
+                try:
+                    await server.send_encoded_message(
+                        self.connection_context,
+                        self.op_id,
+                        GQL_DATA,
+                        self.pending.popleft(),
+                    )
+                except Exception:
+                    # Failed writes are dropped, as the connection is most
+                    # likely closing.
+                    self.dropped += 1
+        finally:
+            self.sender = None
+        if self.error is not _EMPTY:
+            self.resolve()
+
+    def finish(self, error=None):
+        """
+        End the subscription once the waiting results are written.
+        """
+        self.error = error
+        if self.sender is None:
+            self.resolve()
+
+    def resolve(self):
+        if self.future.done():
+            return
+        if self.error is None:
+            self.future.set_result(None)
+        else:
+            self.future.set_exception(self.error)
+
+    def dispose(self):
+        if self.sender is not None:
+            self.sender.cancel()
+        self.shared.unsubscribe(self.connection_context, self.op_id)
+
+
+class SharedSubscription:
+    """
+    One subscription execution whose results are multicast to every
+    subscriber.
+
+    Subscribers only receive the results produced after they subscribe. With
+    ``conflate``, results superseded before they could be sent to a
+    subscriber are skipped for it.
+    """
+
+    def __init__(self, server, key, execution_result, conflate=False):
+        self.server = server
+        self.key = key
+        self.execution_result = execution_result
+        self.conflate = conflate
+        self.subscribers = {}
+        self.iterator = None
+        self.task = None
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    def subscribe(self, connection_context, op_id):
+        subscriber = SharedSubscriber(self, connection_context, op_id)
+        self.subscribers[(connection_context, op_id)] = subscriber
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run(), loop=self.server.loop)
+        return subscriber
+
+    def unsubscribe(self, connection_context, op_id):
+        self.subscribers.pop((connection_context, op_id), None)
+        if not self.subscribers:
+            self.close()
+
+    def remove(self):
+        if self.server.shared_subscriptions.get(self.key) is self:
+            del self.server.shared_subscriptions[self.key]
+
+    def close(self):
+        self.remove()
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def run(self):
+        error = None
+        try:
+            self.iterator = await self.server.get_async_iterator(
+                self.execution_result
+            )
+            async for result in self.iterator:
+                if not self.subscribers:
+                    break
+                await self.server.send_shared_execution_result(
+                    list(self.subscribers.values()), result
+                )
+        except Exception as e:
+            error = e
+        finally:
+            self.remove()
+            if hasattr(self.iterator, "dispose"):
+                self.iterator.dispose()
+            for subscriber in self.subscribers.values():
+                subscriber.finish(error)
+
+
+def get_shared_key(params, context_key):
+    """
+    Build the key identifying identical subscriptions: the same document,
+    variables and operation name for the same context key, either conflated
+    or not.
+    """
+    return (
+        params.get("request_string"),
+        json.dumps(params.get("variable_values"), sort_keys=True),
+        params.get("operation_name"),
+        context_key,
+        bool(params.get("conflate")),
+    )
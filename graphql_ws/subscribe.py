@@ -0,0 +1,188 @@
+import asyncio
+import inspect
+from copy import copy
+
+from graphql.execution.base import (
+    ExecutionContext,
+    ExecutionResult,
+    ResolveInfo,
+    collect_fields,
+    default_resolve_fn,
+    get_field_def,
+    get_operation_root_type,
+)
+from graphql.execution.executor import complete_value_catching_error
+from graphql.execution.executors.sync import SyncExecutor
+from graphql.pyutils.default_ordered_dict import DefaultOrderedDict
+from promise import is_thenable
+from rx.core import Observable
+
+try:
+    current_task = asyncio.current_task
+except AttributeError:  # Python 3.6
+    current_task = asyncio.Task.current_task
+
+
+class SubscriptionIterator:
+    """
+    Iterate over the events of a subscription's source stream, completing
+    each event through the subscription field into an ``ExecutionResult``.
+
+    ``map_event`` may also return an awaitable of the result. :attr:`future`
+    is the task waiting on the source stream or the result, if any, so
+    unsubscribing can interrupt it.
+    """
+
+    def __init__(self, source, map_event):
+        self.source = source
+        self.map_event = map_event
+        self.future = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self.future = current_task()
+        try:
+            event = await self.source.__anext__()
+            result = self.map_event(event)
+            if inspect.isawaitable(result):
+                result = await result
+        except asyncio.CancelledError:
+            await self.aclose()
+            raise
+        finally:
+            self.future = None
+        return result
+
+    async def aclose(self):
+        aclose = getattr(self.source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def resolve_subscription_field(exe_context):
+    """
+    Return the response name, field ASTs, definition and resolve info of a
+    subscription operation's field.
+    """
+    schema = exe_context.schema
+    operation = exe_context.operation
+    parent_type = get_operation_root_type(schema, operation)
+    fields = collect_fields(
+        exe_context,
+        parent_type,
+        operation.selection_set,
+        DefaultOrderedDict(list),
+        set(),
+    )
+    # Like graphql-core, only the first field of a subscription is used.
+    response_name, field_asts = next(iter(fields.items()))
+    field_name = field_asts[0].name.value
+    field_def = get_field_def(schema, parent_type, field_name)
+    info = ResolveInfo(
+        field_name,
+        field_asts,
+        field_def.type,
+        parent_type,
+        schema=schema,
+        fragments=exe_context.fragments,
+        root_value=exe_context.root_value,
+        operation=operation,
+        variable_values=exe_context.variable_values,
+        context=exe_context.context_value,
+        path=[response_name],
+    )
+    return response_name, field_asts, field_def, info
+
+
+def complete_event(exe_context, response_name, field_asts, field_def, info, event):
+    """
+    Complete one event of a subscription's source stream into an
+    ``ExecutionResult``.
+    """
+    # Errors are reported per event, with an execution context of its own:
+    # nested resolvers returning promises add theirs once they settle.
+    event_context = copy(exe_context)
+    event_context.errors = []
+    data = complete_value_catching_error(
+        event_context, field_def.type, field_asts, info, [response_name], event
+    )
+    if is_thenable(data):
+        # The errors are complete once the data's promises are resolved.
+        return ExecutionResult(
+            data={response_name: data}, errors=event_context.errors
+        )
+    return ExecutionResult(
+        data={response_name: data}, errors=event_context.errors or None
+    )
+
+
+def subscribe(
+    schema,
+    document_ast,
+    root_value=None,
+    context_value=None,
+    variable_values=None,
+    operation_name=None,
+    executor=None,
+    middleware=None,
+    map_event=None,
+):
+    """
+    Execute a subscription operation without going through Rx.
+
+    The subscription field's resolver should return an async iterable; each
+    of its events is completed directly, or by ``map_event`` if given. The
+    events of resolvers returning an Observable are always completed
+    directly, but still through Rx.
+
+    Returns a :class:`SubscriptionIterator` (or an Observable), or an
+    ``ExecutionResult`` holding any errors.
+    """
+    if executor is None:
+        executor = SyncExecutor()
+    try:
+        exe_context = ExecutionContext(
+            schema,
+            document_ast,
+            root_value,
+            context_value,
+            variable_values or {},
+            operation_name,
+            executor,
+            middleware,
+            True,
+        )
+        response_name, field_asts, field_def, info = resolve_subscription_field(
+            exe_context
+        )
+        resolve_fn = exe_context.get_field_resolver(
+            field_def.resolver or default_resolve_fn
+        )
+        args = exe_context.get_argument_values(field_def, field_asts[0])
+        # The resolver is called directly rather than through the executor,
+        # which would turn async generators into Observables.
+        source = resolve_fn(root_value, info, **args)
+    except Exception as e:
+        return ExecutionResult(errors=[e], invalid=True)
+
+    def complete(event):
+        return complete_event(
+            exe_context, response_name, field_asts, field_def, info, event
+        )
+
+    if isinstance(source, Observable):
+        return source.map(complete)
+    if hasattr(source, "__aiter__") and not hasattr(source, "__anext__"):
+        source = source.__aiter__()
+    if not hasattr(source, "__anext__"):
+        return ExecutionResult(
+            errors=[
+                TypeError(
+                    "Subscription must return an async iterable or an Observable. "
+                    "Received: {!r}".format(source)
+                )
+            ]
+        )
+    return SubscriptionIterator(source, map_event or complete)
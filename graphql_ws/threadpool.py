@@ -0,0 +1,191 @@
+import asyncio
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+from graphql.execution.executors.asyncio import AsyncioExecutor
+from promise import Promise
+
+from .tracing import clock
+
+# Where the resolvers of fields without a resolver of their own come from.
+DEFAULT_RESOLVER_MODULES = frozenset(
+    (
+        "graphene.types.resolver",
+        "graphql.execution.utils",
+        "graphql.type.introspection",
+    )
+)
+
+# How a field's resolver is called.
+LOOP = "loop"
+THREAD = "thread"
+DEFAULT = "default"
+
+
+def default_max_workers():
+    # The default of ThreadPoolExecutor on Python 3.8+.
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def is_default_resolver(resolver):
+    while isinstance(resolver, partial):
+        resolver = resolver.func
+    return (
+        resolver is None
+        or getattr(resolver, "__module__", None) in DEFAULT_RESOLVER_MODULES
+    )
+
+
+class ResolverThreadPool:
+    """
+    A bounded pool of threads to run blocking resolvers in, off the event
+    loop.
+
+    By default, every resolver which isn't a coroutine or async generator
+    function runs in the pool, except default resolvers which only read an
+    attribute or a key, and the resolvers of subscription fields.
+    ``offload_fields`` sets where the resolvers of given fields run, by
+    ``"Type.field"`` name: ``True`` for the pool, ``False`` for the loop.
+    With ``offload_sync_resolvers=False``, only those fields run in the pool.
+
+    Resolvers run in the pool must be thread-safe: they share the context
+    value with the rest of the operation.
+    """
+
+    def __init__(
+        self, max_workers=None, offload_fields=None, offload_sync_resolvers=True
+    ):
+        if max_workers is None:
+            max_workers = default_max_workers()
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="graphql_ws-resolver"
+        )
+        self.offload_fields = dict(offload_fields or {})
+        self.offload_sync_resolvers = offload_sync_resolvers
+        self.modes = {}
+        self.lock = Lock()
+        self.submitted = 0
+        self.started = 0
+        self.finished = 0
+
+    @property
+    def busy(self):
+        """
+        The number of resolvers running in the pool.
+        """
+        return self.started - self.finished
+
+    @property
+    def queued(self):
+        """
+        The number of resolvers waiting for a thread.
+        """
+        return self.submitted - self.started
+
+    def get_mode(self, fn, info):
+        """
+        Return where a field's resolver runs: in the pool (:data:`THREAD`), on
+        the loop (:data:`LOOP`), or on the loop without being timed as
+        blocking it (:data:`DEFAULT`).
+        """
+        key = (info.parent_type.name, info.field_name)
+        mode = self.modes.get(key)
+        if mode is None:
+            mode = self.modes[key] = self.find_mode(fn, info)
+        return mode
+
+    def find_mode(self, fn, info):
+        # Subscription fields return their source stream, which graphql-core
+        # must get as is, not as the promise of a thread's result.
+        if info.parent_type is info.schema.get_subscription_type():
+            return LOOP
+        name = "{}.{}".format(info.parent_type.name, info.field_name)
+        offload = self.offload_fields.get(name)
+        if offload is not None:
+            return THREAD if offload else LOOP
+        field = info.parent_type.fields.get(info.field_name)
+        # Look past any middleware at the field's own resolver.
+        resolver = fn if field is None else field.resolver
+        if inspect.iscoroutinefunction(resolver) or inspect.isasyncgenfunction(
+            resolver
+        ):
+            return LOOP
+        if is_default_resolver(resolver):
+            return DEFAULT
+        return THREAD if self.offload_sync_resolvers else LOOP
+
+    async def run(self, fn, args, kwargs):
+        """
+        Call a resolver in the pool. Returns its result and how long it waited
+        for a thread.
+        """
+        submitted = clock()
+        started = []
+
+        def call():
+            with self.lock:
+                self.started += 1
+            started.append(clock())
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.finished += 1
+
+        self.submitted += 1
+        try:
+            result = await asyncio.get_event_loop().run_in_executor(
+                self.executor, call
+            )
+        except BaseException:
+            if not started:
+                # Cancelled before it started: it never will.
+                self.submitted -= 1
+            raise
+        return result, started[0] - submitted
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+class ThreadPoolAsyncioExecutor(AsyncioExecutor):
+    """
+    An ``AsyncioExecutor`` running blocking resolvers in a
+    :class:`ResolverThreadPool`.
+
+    With ``metrics``, the time resolvers wait for a thread is counted, and so
+    is the time resolvers run on the loop block it.
+    """
+
+    def __init__(self, thread_pool, loop=None, metrics=None):
+        super().__init__(loop)
+        self.thread_pool = thread_pool
+        self.metrics = metrics
+
+    def execute(self, fn, *args, **kwargs):
+        mode = self.thread_pool.get_mode(fn, args[1])
+        if mode == THREAD:
+            future = asyncio.ensure_future(
+                self.run_in_thread(fn, args, kwargs), loop=self.loop
+            )
+            self.futures.append(future)
+            return Promise.resolve(future)
+        if mode == DEFAULT or self.metrics is None:
+            return super().execute(fn, *args, **kwargs)
+        start = clock()
+        try:
+            return super().execute(fn, *args, **kwargs)
+        finally:
+            self.metrics.loop_blocked.observe(clock() - start)
+
+    async def run_in_thread(self, fn, args, kwargs):
+        result, waited = await self.thread_pool.run(fn, args, kwargs)
+        if self.metrics is not None:
+            self.metrics.thread_wait.observe(waited)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
@@ -0,0 +1,101 @@
+import time
+
+try:
+    clock = time.perf_counter
+except AttributeError:  # Python 2
+    clock = time.time
+
+# Decoding a received message.
+DECODE = "decode"
+# Parsing and validating an operation's document.
+PARSE = "parse"
+# Executing an operation, up to its result or its stream of results.
+EXECUTE = "execute"
+# Waiting on the awaitables and Promises of a result.
+RESOLVE = "resolve"
+# Converting a result with ``execution_result_to_dict``.
+SERIALIZE = "serialize"
+# Encoding a message.
+ENCODE = "encode"
+# Writing a frame to the socket, or queueing it with an outbound queue.
+WRITE = "write"
+
+PHASES = (DECODE, PARSE, EXECUTE, RESOLVE, SERIALIZE, ENCODE, WRITE)
+
+
+class Span(object):
+    """
+    One phase for one connection and operation, timed with :func:`clock`.
+
+    Used as a context manager, a span ends when the block exits, recording
+    any exception raised in the block as its :attr:`error`. Tracers can keep
+    their own state for the span in :attr:`data`.
+    """
+
+    __slots__ = (
+        "tracer",
+        "phase",
+        "connection_context",
+        "op_id",
+        "start_time",
+        "end_time",
+        "error",
+        "data",
+    )
+
+    def __init__(self, tracer, phase, connection_context=None, op_id=None):
+        self.tracer = tracer
+        self.phase = phase
+        self.connection_context = connection_context
+        self.op_id = op_id
+        self.start_time = clock()
+        self.end_time = None
+        self.error = None
+        self.data = None
+
+    @property
+    def duration(self):
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.end(self, exc_value)
+
+
+class Tracer(object):
+    """
+    Receives the start and the end of each phase that messages and operations
+    go through (see :data:`PHASES`), per connection context and operation id.
+
+    Pass a tracer to a server with ``tracer=``; without one, the phases are
+    not timed at all. This base class ignores every span: subclasses override
+    :meth:`on_start` and :meth:`on_end`.
+
+    Phases that aren't specific to an operation, such as decoding a message,
+    have an ``op_id`` of ``None``. Results shared between subscriptions are
+    resolved and serialized once, in spans without a connection context.
+    """
+
+    def span(self, phase, connection_context=None, op_id=None):
+        """
+        Start a span, to be ended with :meth:`end` or by using it as a
+        context manager.
+        """
+        span = Span(self, phase, connection_context, op_id)
+        self.on_start(span)
+        return span
+
+    def end(self, span, error=None):
+        span.end_time = clock()
+        span.error = error
+        self.on_end(span)
+
+    def on_start(self, span):
+        pass
+
+    def on_end(self, span):
+        pass
@@ -1,9 +1,13 @@
-import json
-from asyncio import shield
+from asyncio import ensure_future, shield
 
 from websockets import ConnectionClosed
 
-from .base import ConnectionClosedException
+try:
+    from websockets.frames import OP_TEXT, Frame
+except ImportError:  # websockets < 10
+    Frame = None
+
+from .base import ConnectionClosedException, decode_frame, encode_frame
 from .base_async import BaseAsyncConnectionContext, BaseAsyncSubscriptionServer
 
 
@@ -16,9 +20,35 @@ class WsLibConnectionContext(BaseAsyncConnectionContext):
             raise ConnectionClosedException()
 
     async def send(self, data):
+        await self.send_encoded(self.encode(data))
+
+    async def send_encoded(self, frame):
+        if self.closed:
+            return
+        await self.ws.send(decode_frame(frame))
+
+    @property
+    def writes_bytes(self):
+        return Frame is not None and hasattr(self.ws, "write_frame_sync")
+
+    async def send_encoded_batch(self, frames):
+        ws = self.ws
+        if not self.writes_bytes:
+            return await super().send_encoded_batch(frames)
         if self.closed:
             return
-        await self.ws.send(json.dumps(data))
+        await ws.ensure_open()
+        # Write every frame at once and drain once, rather than going through
+        # send for each frame.
+        ws.transport.write(
+            b"".join(
+                Frame(OP_TEXT, encode_frame(frame)).serialize(
+                    mask=ws.is_client, extensions=ws.extensions
+                )
+                for frame in frames
+            )
+        )
+        await ws.drain()
 
     @property
     def closed(self):
@@ -30,7 +60,9 @@ class WsLibConnectionContext(BaseAsyncConnectionContext):
 
 class WsLibSubscriptionServer(BaseAsyncSubscriptionServer):
     async def _handle(self, ws, request_context):
-        connection_context = WsLibConnectionContext(ws, request_context)
+        connection_context = WsLibConnectionContext(
+            ws, request_context, codec=self.codec
+        )
         await self.on_open(connection_context)
         while True:
             try:
@@ -44,4 +76,6 @@ class WsLibSubscriptionServer(BaseAsyncSubscriptionServer):
         await self.on_close(connection_context)
 
     async def handle(self, ws, request_context=None):
-        await shield(self._handle(ws, request_context), loop=self.loop)
+        await shield(
+            ensure_future(self._handle(ws, request_context), loop=self.loop)
+        )
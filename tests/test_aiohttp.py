@@ -9,6 +9,7 @@ from unittest import mock
 import pytest
 
 from graphql_ws.base import ConnectionClosedException
+from graphql_ws.outbound import OutboundQueue
 
 if_aiohttp_installed = pytest.mark.skipif(
     WSMsgType is None, reason="aiohttp is not installed"
@@ -65,6 +66,11 @@ class TestConnectionContext:
         await connection_context.send("test")
         mock_ws.send_str.assert_called_with('"test"')
 
+    async def test_send_encoded(self, mock_ws):
+        connection_context = AiohttpConnectionContext(ws=mock_ws)
+        await connection_context.send_encoded(b'{"type": "ka"}')
+        mock_ws.send_str.assert_called_with('{"type": "ka"}')
+
     async def test_send_closed(self, mock_ws):
         mock_ws.closed = True
         connection_context = AiohttpConnectionContext(ws=mock_ws)
@@ -80,3 +86,63 @@ class TestConnectionContext:
 @if_aiohttp_installed
 def test_subscription_server_smoke():
     AiohttpSubscriptionServer(schema=None)
+
+
+@if_aiohttp_installed
+@pytest.mark.asyncio
+async def test_handle_closed(mock_ws):
+    mock_ws.closed = True
+    server = AiohttpSubscriptionServer(schema=None, codec="json")
+    await server._handle(mock_ws)
+    mock_ws.receive.assert_not_called()
+
+
+@if_aiohttp_installed
+@pytest.mark.asyncio
+async def test_metrics_handler():
+    from aiohttp import web
+
+    from graphql_ws.metrics import PROMETHEUS_CONTENT_TYPE, Metrics
+
+    server = AiohttpSubscriptionServer(schema=None)
+    with pytest.raises(web.HTTPNotFound):
+        await server.metrics_handler(None)
+
+    server = AiohttpSubscriptionServer(schema=None, metrics=Metrics())
+    response = await server.metrics_handler(None)
+    assert response.headers["Content-Type"] == PROMETHEUS_CONTENT_TYPE
+    assert b"graphql_ws_connections 0\n" in response.body
+
+
+@if_aiohttp_installed
+@pytest.mark.asyncio
+async def test_send_encoded_batch():
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    frames = ['{"n": 1}', b'{"n": 2}', '"{}"'.format("x" * 200), "x" * 70000]
+
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        connection_context = AiohttpConnectionContext(ws)
+        with mock.patch.object(ws, "send_str") as send_str:
+            await connection_context.send_encoded_batch(frames)
+        assert not send_str.called
+        # Queued frames are encoded straight to bytes.
+        assert connection_context.writes_bytes
+        assert isinstance(connection_context.encode({"n": 1}), str)
+        connection_context.start_writer(OutboundQueue())
+        assert isinstance(connection_context.encode({"n": 1}), bytes)
+        connection_context.stop_writer()
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    async with TestClient(TestServer(app)) as client:
+        ws = await client.ws_connect("/")
+        received = [await ws.receive_str() for frame in frames]
+    assert received == [
+        frame.decode() if isinstance(frame, bytes) else frame for frame in frames
+    ]
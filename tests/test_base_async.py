@@ -1,11 +1,16 @@
+import asyncio
+from functools import partial
 from unittest import mock
 
+import graphene
 import json
 import promise
 
 import pytest
 
-from graphql_ws import base, base_async
+from graphql_ws import base, base_async, constants
+from graphql_ws.outbound import BLOCK, DISCONNECT, DROP_OLDEST, OutboundQueue
+from graphql_ws.subscribe import SubscriptionIterator
 
 pytestmark = pytest.mark.asyncio
 
@@ -20,11 +25,103 @@ class TstServer(base_async.BaseAsyncSubscriptionServer):
         pass  # pragma: no cover
 
 
+class TstConnectionContext(base_async.BaseAsyncConnectionContext):
+    closed = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    async def receive(self):
+        pass  # pragma: no cover
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def send_encoded(self, frame):
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code):
+        pass  # pragma: no cover
+
+
+count_calls = []
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+
+
+class Subscription(graphene.ObjectType):
+    count = graphene.Int(up_to=graphene.Int())
+    burst = graphene.Int(up_to=graphene.Int())
+    not_iterable = graphene.Int()
+
+    async def resolve_count(root, info, up_to):
+        count_calls.append(up_to)
+        for i in range(up_to):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def resolve_burst(root, info, up_to):
+        for i in range(up_to):
+            await asyncio.sleep(0)
+            yield i
+
+    def resolve_not_iterable(root, info):
+        return 1
+
+
+schema = graphene.Schema(query=Query, subscription=Subscription)
+
+
+def start_message(op_id, up_to=3):
+    return {
+        "id": op_id,
+        "type": constants.GQL_START,
+        "payload": {"query": "subscription { count(upTo: %d) }" % up_to},
+    }
+
+
 @pytest.fixture
 def server():
     return TstServer(schema=None)
 
 
+@pytest.fixture
+def shared_server():
+    del count_calls[:]
+    return TstServer(schema=schema, share_subscriptions=True)
+
+
+class SlowConnectionContext(TstConnectionContext):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writable = asyncio.Event()
+        self.closed_with = None
+
+    @property
+    def closed(self):
+        return self.closed_with is not None
+
+    async def send_encoded(self, frame):
+        await self.writable.wait()
+        await super().send_encoded(frame)
+
+    async def close(self, code):
+        self.closed_with = code
+
+
+def queued_server(policy, high_watermark=2):
+    return TstServer(
+        schema=None,
+        keep_alive=False,
+        outbound_queue=partial(
+            OutboundQueue, high_watermark=high_watermark, policy=policy
+        ),
+    )
+
+
 async def test_terminate(server: TstServer):
     context = AsyncMock()
     await server.on_connection_terminate(connection_context=context, op_id=1)
@@ -86,6 +183,32 @@ async def test_resolver_with_promise(server):
     assert result.data == {"test": [1, 2]}
 
 
+async def test_resolve_without_awaitables():
+    data = {"a": [1, {"b": "c"}], "d": None}
+    coroutine = base_async.resolve(data)
+    # Nothing to wait for, so the coroutine finishes without suspending.
+    with pytest.raises(StopIteration):
+        coroutine.send(None)
+    assert data == {"a": [1, {"b": "c"}], "d": None}
+
+
+async def test_resolve_nested_coroutines():
+    async def value(result):
+        return result
+
+    data = {"a": [value(1), value({"b": value([value(2)])})]}
+    await base_async.resolve(data)
+    assert data == {"a": [1, {"b": [2]}]}
+
+
+async def test_resolve_error():
+    async def fail():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        await base_async.resolve({"a": fail()})
+
+
 async def test_resolver_with_nested_promise(server):
     server.send_message = AsyncMock()
     result = mock.Mock()
@@ -98,3 +221,557 @@ async def test_resolver_with_nested_promise(server):
     )
     assert server.send_message.called
     assert result.data == {"test": [1, {"in": 2}]}
+
+
+async def test_shared_subscription(shared_server):
+    contexts = [TstConnectionContext(ws=None) for i in range(3)]
+    await asyncio.gather(
+        *(
+            shared_server.process_message(context, start_message(str(i)))
+            for i, context in enumerate(contexts)
+        )
+    )
+    assert count_calls == [3]
+    for i, context in enumerate(contexts):
+        assert [message["type"] for message in context.sent] == [
+            constants.GQL_DATA
+        ] * 3 + [constants.GQL_COMPLETE]
+        assert {message["id"] for message in context.sent} == {str(i)}
+        assert context.sent[2]["payload"] == {"data": {"count": 2}}
+    assert not shared_server.shared_subscriptions
+
+
+async def test_shared_subscription_different_variables(shared_server):
+    context = TstConnectionContext(ws=None)
+    await asyncio.gather(
+        shared_server.process_message(context, start_message("1", up_to=1)),
+        shared_server.process_message(context, start_message("2", up_to=2)),
+    )
+    assert sorted(count_calls) == [1, 2]
+
+
+async def test_shared_subscription_stop(shared_server):
+    first, second = TstConnectionContext(ws=None), TstConnectionContext(ws=None)
+    first_task = shared_server.process_message(first, start_message("1", 100))
+    second_task = shared_server.process_message(second, start_message("1", 100))
+    await asyncio.sleep(0.05)
+    assert len(shared_server.shared_subscriptions) == 1
+    (shared,) = shared_server.shared_subscriptions.values()
+
+    with pytest.raises(asyncio.CancelledError):
+        await first.unsubscribe("1")
+    assert len(shared) == 1
+
+    with pytest.raises(asyncio.CancelledError):
+        await second.unsubscribe("1")
+    # Cancelling may take a few iterations if the task is sending a result.
+    await asyncio.gather(shared.task, return_exceptions=True)
+    assert shared.task.cancelled()
+    assert not shared_server.shared_subscriptions
+    await asyncio.gather(first_task, second_task, return_exceptions=True)
+
+
+async def test_shared_subscription_per_context(shared_server):
+    user, same_user, other_user = object(), object(), object()
+    contexts = [
+        TstConnectionContext(ws=None, request_context=request_context)
+        for request_context in (user, user, other_user)
+    ]
+    await asyncio.gather(
+        *(
+            shared_server.process_message(context, start_message("1", up_to=1))
+            for context in contexts
+        )
+    )
+    # Results never go to a connection with another context.
+    assert count_calls == [1, 1]
+    assert shared_server.get_shared_key(
+        contexts[0], {"context_value": user}
+    ) != shared_server.get_shared_key(contexts[0], {"context_value": same_user})
+
+
+async def test_shared_subscription_conflate(shared_server):
+    conflated = [SlowSendContext(ws=None) for i in range(2)]
+    unconflated = SlowSendContext(ws=None)
+    message = burst_message("1", {"conflate": True})
+    await asyncio.gather(
+        *(shared_server.process_message(context, message) for context in conflated),
+        shared_server.process_message(unconflated, burst_message("1")),
+    )
+    for context in conflated:
+        assert len(data_payloads(context)) < 50
+        assert data_payloads(context)[-1] == 49
+    assert data_payloads(unconflated) == list(range(50))
+    assert not shared_server.shared_subscriptions
+
+
+class StalledContext(TstConnectionContext):
+    async def send_encoded(self, frame):
+        await asyncio.Future()
+
+
+async def test_shared_subscription_stalled_subscriber(shared_server):
+    healthy, stalled = TstConnectionContext(ws=None), StalledContext(ws=None)
+    stalled_task = asyncio.ensure_future(
+        shared_server.process_message(stalled, start_message("1", 5))
+    )
+    await asyncio.sleep(0)
+    # A subscriber whose writes never finish doesn't hold up the others.
+    await asyncio.wait_for(
+        shared_server.process_message(healthy, start_message("1", 5)), 1
+    )
+    assert count_calls == [5]
+    assert [message["type"] for message in healthy.sent][-1] == constants.GQL_COMPLETE
+    assert len(healthy.sent) >= 4
+    stalled_task.cancel()
+    await asyncio.gather(stalled_task, return_exceptions=True)
+    await stalled.unsubscribe("1")
+
+
+async def test_shared_subscription_disabled():
+    server = TstServer(schema=schema)
+    assert server.get_shared_key(None, {"request_string": "query"}) is None
+
+
+async def test_shared_subscription_encoded_once(shared_server):
+    shared_server.encode_payload = mock.Mock(wraps=shared_server.encode_payload)
+    contexts = [TstConnectionContext(ws=None) for i in range(3)]
+    await asyncio.gather(
+        *(
+            shared_server.process_message(context, start_message(str(i), up_to=1))
+            for i, context in enumerate(contexts)
+        )
+    )
+    assert shared_server.encode_payload.call_count == 1
+    for context in contexts:
+        assert context.sent[0]["payload"] == {"data": {"count": 0}}
+
+
+async def test_keep_alive():
+    server = TstServer(schema=None, keep_alive=0.04)
+    context = TstConnectionContext(ws=None)
+    await server.on_connection_init(context, None, {})
+    assert context.sent == [
+        {"type": constants.GQL_CONNECTION_ACK},
+        {"type": constants.GQL_CONNECTION_KEEP_ALIVE},
+    ]
+    await asyncio.sleep(0.1)
+    assert len(context.sent) in (3, 4)
+    assert context.sent[-1] == {"type": constants.GQL_CONNECTION_KEEP_ALIVE}
+
+    await server.on_close(context)
+    await asyncio.sleep(0.05)
+    assert server.keep_alive_task.done()
+
+
+class StallingContext(TstConnectionContext):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writes = 0
+        self.stall = None
+
+    async def send_encoded(self, frame):
+        self.writes += 1
+        if self.stall is not None:
+            await self.stall
+        await super().send_encoded(frame)
+
+
+async def test_keep_alive_stalled_connection():
+    server = TstServer(schema=None, keep_alive=0.064)
+    healthy, stalled = TstConnectionContext(ws=None), StallingContext(ws=None)
+    await server.on_connection_init(healthy, None, {})
+    await server.on_connection_init(stalled, None, {})
+    stalled.stall = asyncio.Future()
+    await asyncio.sleep(0.35)
+    # The stalled connection doesn't hold up the others, and isn't sent
+    # another keep alive while one is still being written.
+    assert len(healthy.sent) >= 5
+    assert stalled.writes == 2
+    stalled.stall.set_result(None)
+    await server.on_close(healthy)
+    await server.on_close(stalled)
+    await asyncio.sleep(0.05)
+    assert server.keep_alive_task.done()
+
+
+async def test_keep_alive_disabled():
+    server = TstServer(schema=None, keep_alive=False)
+    context = TstConnectionContext(ws=None)
+    await server.on_connection_init(context, None, {})
+    assert context.sent == [{"type": constants.GQL_CONNECTION_ACK}]
+    assert server.keep_alive_task is None
+
+
+async def test_outbound_queue_writer():
+    server = queued_server(BLOCK)
+    context = SlowConnectionContext(ws=None)
+    context.writable.set()
+    await server.send_message(context, op_type=constants.GQL_CONNECTION_ACK)
+    await server.send_encoded_message(context, None, "data", "{}")
+    await asyncio.sleep(0)
+    assert context.sent == [
+        {"type": constants.GQL_CONNECTION_ACK},
+        {"type": "data", "payload": {}},
+    ]
+    assert context.outbound.stats["sent"] == 2
+    await server.on_close(context)
+    await asyncio.sleep(0)
+    assert context.writer_task.cancelled()
+
+
+async def test_outbound_queue_block():
+    server = queued_server(BLOCK)
+    context = SlowConnectionContext(ws=None)
+    context.register_operation("1", None)
+    sends = asyncio.ensure_future(
+        asyncio.gather(
+            *(
+                server.send_message(context, "1", constants.GQL_DATA, i)
+                for i in range(4)
+            )
+        )
+    )
+    await asyncio.sleep(0.01)
+    assert not sends.done()
+    assert context.outbound.paused
+    context.writable.set()
+    await sends
+    await asyncio.sleep(0.01)
+    assert [message["payload"] for message in context.sent] == [0, 1, 2, 3]
+    await server.on_close(context)
+
+
+async def test_outbound_queue_block_control_frames():
+    server = queued_server(BLOCK)
+    context = SlowConnectionContext(ws=None)
+    context.register_operation("1", None)
+    sends = asyncio.ensure_future(
+        asyncio.gather(
+            *(
+                server.send_message(context, "1", constants.GQL_DATA, i)
+                for i in range(4)
+            )
+        )
+    )
+    await asyncio.sleep(0.01)
+    assert context.outbound.paused
+    # Keep alives don't wait for the queue to drain.
+    await asyncio.wait_for(
+        server.send_message(context, op_type=constants.GQL_CONNECTION_KEEP_ALIVE),
+        0.1,
+    )
+    context.writable.set()
+    await sends
+    await asyncio.sleep(0.01)
+    assert {"type": constants.GQL_CONNECTION_KEEP_ALIVE} in context.sent
+    assert [message.get("payload") for message in context.sent] == [
+        0,
+        1,
+        2,
+        None,
+        3,
+    ]
+    await server.on_close(context)
+
+
+async def test_outbound_queue_drop_oldest():
+    server = queued_server(DROP_OLDEST)
+    context = SlowConnectionContext(ws=None)
+    context.register_operation("1", None)
+    for i in range(5):
+        await server.send_message(context, "1", constants.GQL_DATA, i)
+    await server.send_message(context, "1", constants.GQL_COMPLETE)
+    context.writable.set()
+    await asyncio.sleep(0.01)
+    assert [message.get("payload") for message in context.sent] == [3, 4, None]
+    assert context.outbound.dropped == 3
+    await server.on_close(context)
+
+
+async def test_outbound_queue_disconnect():
+    server = queued_server(DISCONNECT)
+    context = SlowConnectionContext(ws=None)
+    context.register_operation("1", None)
+    for i in range(4):
+        await server.send_message(context, "1", constants.GQL_DATA, i)
+    assert context.closed_with == 1013
+    await asyncio.sleep(0)
+    assert context.writer_task.cancelled()
+
+
+class SlowSendContext(TstConnectionContext):
+    async def send(self, data):
+        await asyncio.sleep(0.01)
+        await super().send(data)
+
+    async def send_encoded(self, frame):
+        await asyncio.sleep(0.01)
+        await super().send_encoded(frame)
+
+
+def burst_message(op_id, extensions=None):
+    payload = {"query": "subscription { burst(upTo: 50) }"}
+    if extensions is not None:
+        payload["extensions"] = extensions
+    return {"id": op_id, "type": constants.GQL_START, "payload": payload}
+
+
+def data_payloads(context):
+    return [
+        message["payload"]["data"]["burst"]
+        for message in context.sent
+        if message["type"] == constants.GQL_DATA
+    ]
+
+
+async def test_conflate_server():
+    server = TstServer(schema=schema, conflate_subscriptions=True)
+    context = SlowSendContext(ws=None)
+    await server.process_message(context, burst_message("1"))
+    payloads = data_payloads(context)
+    assert 0 < len(payloads) < 50
+    assert payloads == sorted(payloads)
+    assert payloads[-1] == 49
+    assert context.sent[-1] == {"id": "1", "type": constants.GQL_COMPLETE}
+
+
+async def test_conflate_client_extension():
+    server = TstServer(schema=schema)
+    conflated, unconflated = SlowSendContext(ws=None), SlowSendContext(ws=None)
+    await asyncio.gather(
+        server.process_message(conflated, burst_message("1", {"conflate": True})),
+        server.process_message(unconflated, burst_message("1")),
+    )
+    assert len(data_payloads(conflated)) < 50
+    assert data_payloads(conflated)[-1] == 49
+    assert data_payloads(unconflated) == list(range(50))
+
+
+async def test_should_conflate():
+    server = TstServer(schema=None)
+    assert not server.should_conflate(None, {})
+    assert not server.should_conflate(None, {"extensions": "conflate"})
+    assert server.should_conflate(None, {"extensions": {"conflate": True}})
+
+
+class BatchRecordingContext(TstConnectionContext):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    async def send_encoded_batch(self, frames):
+        self.batches.append(len(frames))
+        await super().send_encoded_batch(frames)
+
+
+async def test_coalesce_writes():
+    server = TstServer(schema=None, keep_alive=False, coalesce_writes=0)
+    context = BatchRecordingContext(ws=None)
+    context.register_operation("1", None)
+    for i in range(5):
+        await server.send_message(context, "1", constants.GQL_DATA, i)
+    await asyncio.sleep(0.01)
+    assert context.batches == [5]
+    assert [message["payload"] for message in context.sent] == list(range(5))
+    assert context.outbound.stats["flushes"] == 1
+    await server.on_close(context)
+
+
+async def test_coalesce_writes_window():
+    server = TstServer(schema=None, keep_alive=False, coalesce_writes=0.02)
+    context = BatchRecordingContext(ws=None)
+    context.register_operation("1", None)
+    await server.send_message(context, "1", constants.GQL_DATA, 0)
+    await asyncio.sleep(0)
+    await server.send_message(context, "1", constants.GQL_DATA, 1)
+    await asyncio.sleep(0.05)
+    assert context.batches == [2]
+    await server.on_close(context)
+
+
+async def test_no_coalescing():
+    server = queued_server(BLOCK, high_watermark=10)
+    context = BatchRecordingContext(ws=None)
+    context.register_operation("1", None)
+    for i in range(3):
+        await server.send_message(context, "1", constants.GQL_DATA, i)
+    await asyncio.sleep(0.01)
+    assert context.batches == [1, 1, 1]
+    await server.on_close(context)
+
+
+async def test_remember_task():
+    context = TstConnectionContext(ws=None)
+    event = asyncio.Event()
+    task = asyncio.ensure_future(event.wait())
+    context.remember_task(task)
+    assert context.in_flight == 1
+    event.set()
+    await task
+    await asyncio.sleep(0)
+    assert context.in_flight == 0
+    assert not context.pending_tasks
+
+
+async def test_remember_done_task():
+    context = TstConnectionContext(ws=None)
+    task = asyncio.ensure_future(asyncio.sleep(0))
+    await task
+    context.remember_task(task)
+    assert context.in_flight == 0
+
+
+async def test_unsubscribe_all_cancels_pending_tasks():
+    context = TstConnectionContext(ws=None)
+    task = asyncio.ensure_future(asyncio.Event().wait())
+    context.remember_task(task)
+    await context.unsubscribe_all()
+    assert task.cancelled()
+    await asyncio.sleep(0)
+    assert context.in_flight == 0
+
+
+@pytest.fixture
+def native_server():
+    del count_calls[:]
+    return TstServer(schema=schema, keep_alive=False, native_subscriptions=True)
+
+
+def native_params(server, query):
+    context = TstConnectionContext(ws=None)
+    return server.get_graphql_params(context, {"query": query})
+
+
+async def test_native_subscription(native_server):
+    context = TstConnectionContext(ws=None)
+    params = native_params(native_server, "subscription { count(upTo: 3) }")
+    assert isinstance(native_server.execute(params), SubscriptionIterator)
+    await native_server.process_message(context, start_message("1"))
+    assert [message["payload"]["data"]["count"] for message in context.sent[:3]] == [
+        0,
+        1,
+        2,
+    ]
+    assert context.sent[3] == {"id": "1", "type": constants.GQL_COMPLETE}
+
+
+async def test_native_subscription_falls_back(native_server):
+    assert native_server.subscribe(native_params(native_server, "{ hello }")) is None
+    invalid = native_params(native_server, "subscription { missing }")
+    assert native_server.subscribe(invalid) is None
+    assert (await native_server.execute_operation(invalid)).errors
+
+
+async def test_native_subscription_not_iterable(native_server):
+    params = native_params(native_server, "subscription { notIterable }")
+    result = native_server.execute(params)
+    assert "async iterable" in str(result.errors[0])
+
+
+async def test_observable_subscription_stop():
+    server = TstServer(schema=schema, keep_alive=False)
+    context = TstConnectionContext(ws=None)
+    task = server.process_message(context, start_message("1", up_to=100))
+    await asyncio.sleep(0.05)
+    await context.unsubscribe("1")
+    await asyncio.wait_for(task, 1)
+    assert 0 < len(context.sent) < 100
+    assert constants.GQL_COMPLETE not in [message["type"] for message in context.sent]
+
+
+async def test_native_subscription_stop(native_server):
+    context = TstConnectionContext(ws=None)
+    task = native_server.process_message(context, start_message("1", up_to=100))
+    await asyncio.sleep(0.05)
+    with pytest.raises(asyncio.CancelledError):
+        await context.unsubscribe("1")
+    assert task.cancelled()
+    assert len(context.sent) < 100
+
+
+async def test_native_shared_subscription(native_server):
+    native_server.share_subscriptions = True
+    contexts = [TstConnectionContext(ws=None) for i in range(3)]
+    await asyncio.gather(
+        *(
+            native_server.process_message(context, start_message(str(i)))
+            for i, context in enumerate(contexts)
+        )
+    )
+    assert count_calls == [3]
+    for context in contexts:
+        assert context.sent[2]["payload"] == {"data": {"count": 2}}
+
+
+class SlowQuery(graphene.ObjectType):
+    slow = graphene.String()
+
+    async def resolve_slow(root, info):
+        await asyncio.sleep(0.05)
+        return "done"
+
+
+class ClosingConnectionContext(TstConnectionContext):
+    close_code = None
+
+    @property
+    def closed(self):
+        return self.close_code is not None
+
+    async def close(self, code):
+        self.close_code = code
+
+
+@pytest.mark.parametrize("native", [False, True])
+@pytest.mark.parametrize("shared", [False, True])
+async def test_shutdown(native, shared):
+    server = TstServer(
+        schema=graphene.Schema(query=SlowQuery, subscription=Subscription),
+        keep_alive=False,
+        native_subscriptions=native,
+        share_subscriptions=shared,
+    )
+    contexts = [ClosingConnectionContext(ws=None) for i in range(3)]
+    for context in contexts:
+        await server.on_open(context)
+    server.process_message(contexts[0], start_message("1", up_to=100))
+    query = {"id": "2", "type": constants.GQL_START, "payload": {"query": "{ slow }"}}
+    server.process_message(contexts[1], query)
+    await asyncio.sleep(0.02)
+
+    start = asyncio.get_event_loop().time()
+    await server.shutdown(timeout=1, close_batch_size=1, close_interval=0.01)
+    assert asyncio.get_event_loop().time() - start >= 0.02
+    assert contexts[0].sent[-1] == {"id": "1", "type": constants.GQL_COMPLETE}
+    assert 1 <= len(contexts[0].sent) < 100
+    assert contexts[1].sent == [
+        {"id": "2", "type": constants.GQL_DATA, "payload": {"data": {"slow": "done"}}},
+        {"id": "2", "type": constants.GQL_COMPLETE},
+    ]
+    assert [context.close_code for context in contexts] == [
+        base_async.SHUTDOWN_CLOSE_CODE
+    ] * 3
+
+    await server.process_message(contexts[2], query)
+    assert contexts[2].sent[0]["type"] == constants.GQL_ERROR
+    late = ClosingConnectionContext(ws=None)
+    await server.on_open(late)
+    assert late.close_code == base_async.SHUTDOWN_CLOSE_CODE
+    assert late not in server.connections
+
+
+async def test_shutdown_timeout():
+    server = TstServer(schema=graphene.Schema(query=SlowQuery), keep_alive=False)
+    context = ClosingConnectionContext(ws=None)
+    await server.on_open(context)
+    query = {"id": "1", "type": constants.GQL_START, "payload": {"query": "{ slow }"}}
+    server.process_message(context, query)
+    await asyncio.sleep(0)
+    await server.shutdown(timeout=0.01)
+    assert context.sent == []
+    assert context.close_code == base_async.SHUTDOWN_CLOSE_CODE
+    await server.on_close(context)
+    assert not server.connections
+    # Let the abandoned resolver finish.
+    await asyncio.sleep(0.05)
@@ -0,0 +1,206 @@
+import asyncio
+import sys
+
+import pytest
+
+from graphql_ws.brokers import Broker, BrokerHub, InProcessBroker, UnixSocketBroker
+
+pytestmark = pytest.mark.asyncio
+
+
+def drain(subscription):
+    events = list(subscription.buffer)
+    subscription.buffer.clear()
+    return events
+
+
+class RecordingBroker(Broker):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def send_batch(self, data):
+        self.batches.append(data)
+
+
+async def test_in_process_broker():
+    broker = InProcessBroker()
+    subscription = broker.subscribe("messages", channel=1)
+    assert broker.publish("messages", "hi", channel=1) == 1
+    assert drain(subscription) == ["hi"]
+
+
+async def test_batches_per_loop_iteration():
+    broker = RecordingBroker()
+    subscription = broker.subscribe("messages")
+    for i in range(3):
+        broker.publish("messages", i, channel=i)
+    assert drain(subscription) == [0, 1, 2]
+    assert broker.batches == []
+    await asyncio.sleep(0)
+    assert len(broker.batches) == 1
+
+    other = RecordingBroker()
+    received = other.subscribe("messages", channel=2)
+    other.receive_batch(broker.batches[0])
+    assert drain(received) == [2]
+    assert other.batches_received == 1
+
+
+async def test_max_batch_size():
+    broker = RecordingBroker(max_batch_size=2)
+    for i in range(5):
+        broker.publish("messages", i)
+    assert len(broker.batches) == 2
+    await broker.close()
+    assert len(broker.batches) == 3
+    await asyncio.sleep(0)
+    assert broker.batches_sent == 3
+
+
+async def test_filter_values_must_be_scalars():
+    broker = RecordingBroker()
+    with pytest.raises(TypeError):
+        broker.subscribe("messages", channel=(1, 2))
+    with pytest.raises(TypeError):
+        broker.publish("messages", "hi", channel=[1, 2])
+    assert broker.outbox == []
+
+
+async def test_receive_batch_delivery_errors():
+    broker = RecordingBroker()
+    subscription = broker.subscribe("messages", channel=1)
+    broker.receive_batch(b"not json")
+    broker.receive_batch(
+        broker.codec.dumpb(
+            [["messages", "bad", {"channel": [1]}], ["messages", "ok", {"channel": 1}]]
+        )
+    )
+    assert drain(subscription) == ["ok"]
+    assert broker.delivery_errors == 2
+    assert broker.batches_received == 2
+
+
+class FakeTransport:
+    def __init__(self):
+        self.buffer_size = 0
+
+    def get_write_buffer_size(self):
+        return self.buffer_size
+
+
+class FakeWriter:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.frames = []
+        self.closed = False
+
+    def write(self, data):
+        self.frames.append(data)
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+async def test_hub_drops_batches_for_slow_broker():
+    hub = BrokerHub(max_buffer_size=10)
+    sender, fast, slow = FakeWriter(), FakeWriter(), FakeWriter()
+    hub.writers.update((fast, slow))
+    slow.transport.buffer_size = 11
+    reader = asyncio.StreamReader()
+    reader.feed_data(b"\x00\x00\x00\x05batch")
+    reader.feed_eof()
+    await hub.handle(reader, sender)
+    assert fast.frames == [b"\x00\x00\x00\x05batch"]
+    assert slow.frames == []
+    assert hub.dropped_batches == 1
+
+
+async def test_unix_socket_broker_drops_batches_when_backed_up(socket_path):
+    broker = UnixSocketBroker(socket_path, max_buffer_size=10)
+    broker.writer = FakeWriter()
+    broker.send_batch(b"first")
+    broker.writer.transport.buffer_size = 11
+    broker.send_batch(b"second")
+    assert len(broker.writer.frames) == 1
+    assert broker.dropped_batches == 1
+
+
+async def wait_for_events(subscription, count):
+    for _ in range(100):
+        if len(subscription.buffer) >= count:
+            return drain(subscription)
+        await asyncio.sleep(0.01)
+    return drain(subscription)
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "broker.sock")
+
+
+async def test_unix_socket_broker(socket_path):
+    brokers = [UnixSocketBroker(socket_path) for i in range(3)]
+    for broker in brokers:
+        await broker.start()
+    assert [broker.hub is not None for broker in brokers] == [True, False, False]
+    subscriptions = [broker.subscribe("messages", channel=1) for broker in brokers]
+
+    for i in range(10):
+        brokers[1].publish("messages", i, channel=1)
+    brokers[1].publish("messages", "other", channel=2)
+    for subscription in subscriptions:
+        assert await wait_for_events(subscription, 10) == list(range(10))
+    assert brokers[1].batches_sent == 1
+    assert brokers[2].batches_received == 1
+
+    for broker in brokers:
+        await broker.close()
+
+
+async def test_unix_socket_broker_hub_failover(socket_path):
+    first, second, third = (UnixSocketBroker(socket_path) for i in range(3))
+    for broker in (first, second, third):
+        await broker.start()
+    await first.close()
+    subscription = third.subscribe("messages")
+    for _ in range(100):
+        second.publish("messages", "hello")
+        await asyncio.sleep(0.01)
+        if subscription.buffer:
+            break
+    assert drain(subscription)[-1] == "hello"
+    assert (second.hub is None) != (third.hub is None)
+    await second.close()
+    await third.close()
+
+
+PUBLISHER = """
+import asyncio, sys
+from graphql_ws.brokers import UnixSocketBroker
+
+async def main():
+    broker = UnixSocketBroker(sys.argv[1])
+    await broker.start()
+    for i in range(100):
+        broker.publish("messages", {"n": i}, channel=1)
+    await broker.close()
+
+asyncio.run(main())
+"""
+
+
+async def test_unix_socket_broker_processes(socket_path):
+    broker = UnixSocketBroker(socket_path)
+    await broker.start()
+    subscription = broker.subscribe("messages", channel=1)
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", PUBLISHER, socket_path
+    )
+    assert await process.wait() == 0
+    events = await wait_for_events(subscription, 100)
+    assert events == [{"n": i} for i in range(100)]
+    await broker.close()
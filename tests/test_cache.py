@@ -0,0 +1,93 @@
+import graphene
+import pytest
+from graphql.language.parser import parse
+
+from graphql_ws import base
+from graphql_ws.cache import DocumentCache
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+
+    def resolve_hello(root, info):
+        return "world"
+
+
+schema = graphene.Schema(query=Query)
+
+
+@pytest.fixture
+def cache():
+    return DocumentCache(maxsize=2)
+
+
+def test_miss_then_hit(cache):
+    first = cache.document_from_string(schema, "{ hello }")
+    second = cache.document_from_string(schema, "{ hello }")
+    assert first is second
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_keyed_by_schema(cache):
+    other_schema = graphene.Schema(query=Query)
+    cache.document_from_string(schema, "{ hello }")
+    cache.document_from_string(other_schema, "{ hello }")
+    assert cache.misses == 2
+    assert len(cache) == 2
+
+
+def test_evicts_least_recently_used(cache):
+    cache.document_from_string(schema, "{ hello }")
+    cache.document_from_string(schema, "query A { hello }")
+    cache.document_from_string(schema, "{ hello }")
+    cache.document_from_string(schema, "query B { hello }")
+    assert cache.evictions == 1
+    assert (schema, "{ hello }") in cache
+    assert (schema, "query A { hello }") not in cache
+
+
+def test_execute(cache):
+    document = cache.document_from_string(schema, "{ hello }")
+    assert document.execute().data == {"hello": "world"}
+
+
+def test_validation_errors_cached(cache):
+    document = cache.document_from_string(schema, "{ missing }")
+    result = document.execute()
+    assert result.invalid
+    assert cache.document_from_string(schema, "{ missing }") is document
+
+
+def test_document_ast_not_cached(cache):
+    document = cache.document_from_string(schema, parse("{ hello }"))
+    assert document.execute().data == {"hello": "world"}
+    assert len(cache) == 0
+
+
+def test_disabled():
+    cache = DocumentCache(maxsize=0)
+    cache.document_from_string(schema, "{ hello }")
+    assert len(cache) == 0
+    assert cache.stats["misses"] == 0
+
+
+def test_server_execute_uses_cache():
+    server = base.BaseSubscriptionServer(schema)
+    params = {"request_string": "{ hello }"}
+    assert server.execute(params).data == {"hello": "world"}
+    assert server.execute(params).data == {"hello": "world"}
+    assert server.document_cache.stats == {
+        "size": 1,
+        "maxsize": 1000,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+    }
+
+
+def test_server_syntax_error():
+    server = base.BaseSubscriptionServer(schema)
+    result = server.execute({"request_string": "{ hello"})
+    assert result.invalid
+    assert len(server.document_cache) == 0
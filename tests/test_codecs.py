@@ -0,0 +1,78 @@
+import json
+from collections import OrderedDict
+
+import pytest
+
+from graphql_ws import base
+from graphql_ws.codecs import (
+    CODECS,
+    JSONCodec,
+    OrjsonCodec,
+    get_codec,
+)
+
+MESSAGE = {
+    "id": "1",
+    "type": "data",
+    "payload": OrderedDict(
+        [("data", {"ticker": {"symbol": "ABC", "price": 1.5, "volume": 100}})]
+    ),
+}
+
+
+def installed_codecs():
+    codecs = []
+    for codec_class in CODECS:
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            pass
+    return codecs
+
+
+@pytest.fixture(params=installed_codecs(), ids=lambda codec: codec.name)
+def codec(request):
+    return request.param
+
+
+def test_round_trip(codec):
+    assert codec.loads(codec.dumps(MESSAGE)) == MESSAGE
+    assert codec.loads(codec.dumpb(MESSAGE)) == MESSAGE
+    assert isinstance(codec.dumps(MESSAGE), str)
+    assert isinstance(codec.dumpb(MESSAGE), bytes)
+
+
+def test_wide_integers(codec):
+    assert codec.loads(codec.dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+
+
+def test_get_codec_default():
+    assert isinstance(get_codec(), type(installed_codecs()[0]))
+
+
+def test_get_codec_by_name():
+    assert isinstance(get_codec("json"), JSONCodec)
+
+
+def test_get_codec_instance():
+    codec = JSONCodec()
+    assert get_codec(codec) is codec
+
+
+def test_get_codec_unknown():
+    with pytest.raises(ValueError):
+        get_codec("yaml")
+
+
+def test_get_codec_not_installed(monkeypatch):
+    monkeypatch.setattr(OrjsonCodec, "module_name", "not_installed_orjson")
+    with pytest.raises(ImportError):
+        get_codec("orjson")
+    assert not isinstance(get_codec(), OrjsonCodec)
+
+
+def test_server_uses_codec():
+    server = base.BaseSubscriptionServer(schema=None, codec="json")
+    assert isinstance(server.codec, JSONCodec)
+    frame = server.build_encoded_message("1", "data", server.encode_payload([1]))
+    assert json.loads(frame) == {"id": "1", "type": "data", "payload": [1]}
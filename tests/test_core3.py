@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+import pytest
+
+graphql = pytest.importorskip("graphql")
+if not graphql.__version__.startswith("3."):
+    pytest.skip("requires graphql-core 3", allow_module_level=True)
+
+from graphql import (  # noqa: E402
+    GraphQLArgument,
+    GraphQLField,
+    GraphQLInt,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+)
+
+from graphql_ws import constants  # noqa: E402
+from graphql_ws.base_async import (  # noqa: E402
+    BaseAsyncConnectionContext,
+    BaseAsyncSubscriptionServer,
+)
+from graphql_ws.core3 import DocumentCache, GraphQLCore3Mixin  # noqa: E402
+
+pytestmark = pytest.mark.asyncio
+
+
+async def count(root, info, upTo):
+    for i in range(upTo):
+        await asyncio.sleep(0.01)
+        yield i
+
+
+schema = GraphQLSchema(
+    query=GraphQLObjectType(
+        "Query", {"hello": GraphQLField(GraphQLString, resolve=lambda *_: "world")}
+    ),
+    subscription=GraphQLObjectType(
+        "Subscription",
+        {
+            "count": GraphQLField(
+                GraphQLInt,
+                args={"upTo": GraphQLArgument(GraphQLInt)},
+                subscribe=count,
+                resolve=lambda event, info, upTo: event,
+            )
+        },
+    ),
+)
+
+
+class TstServer(GraphQLCore3Mixin, BaseAsyncSubscriptionServer):
+    def handle(self, *args, **kwargs):
+        pass  # pragma: no cover
+
+
+class TstConnectionContext(BaseAsyncConnectionContext):
+    closed = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    async def receive(self):
+        pass  # pragma: no cover
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def send_encoded(self, frame):
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code):
+        pass  # pragma: no cover
+
+
+def start_message(op_id, query):
+    return {"id": op_id, "type": constants.GQL_START, "payload": {"query": query}}
+
+
+@pytest.fixture
+def server():
+    return TstServer(schema, keep_alive=False)
+
+
+async def test_query(server):
+    context = TstConnectionContext(ws=None)
+    await server.process_message(context, start_message("1", "{ hello }"))
+    assert context.sent == [
+        {
+            "id": "1",
+            "type": constants.GQL_DATA,
+            "payload": {"data": {"hello": "world"}},
+        },
+        {"id": "1", "type": constants.GQL_COMPLETE},
+    ]
+    assert server.document_cache.stats["misses"] == 1
+
+
+async def test_invalid_query(server):
+    context = TstConnectionContext(ws=None)
+    await server.process_message(context, start_message("1", "{ missing }"))
+    errors = context.sent[0]["payload"]["errors"]
+    assert "missing" in errors[0]["message"]
+
+
+async def test_syntax_error(server):
+    context = TstConnectionContext(ws=None)
+    await server.process_message(context, start_message("1", "{"))
+    assert context.sent[0]["payload"]["errors"][0]["message"].startswith(
+        "Syntax Error"
+    )
+
+
+async def test_missing_query(server):
+    context = TstConnectionContext(ws=None)
+    message = {"id": "1", "type": constants.GQL_START, "payload": {}}
+    await server.process_message(context, message)
+    assert context.sent[0]["type"] == constants.GQL_DATA
+    assert context.sent[0]["payload"]["errors"][0]["message"]
+    assert context.sent[1] == {"id": "1", "type": constants.GQL_COMPLETE}
+
+
+async def test_subscription(server):
+    context = TstConnectionContext(ws=None)
+    query = "subscription { count(upTo: 3) }"
+    await server.process_message(context, start_message("1", query))
+    assert [message["payload"] for message in context.sent[:3]] == [
+        {"data": {"count": i}} for i in range(3)
+    ]
+    assert context.sent[3] == {"id": "1", "type": constants.GQL_COMPLETE}
+
+
+async def test_subscription_stop(server):
+    context = TstConnectionContext(ws=None)
+    query = "subscription { count(upTo: 100) }"
+    task = server.process_message(context, start_message("1", query))
+    await asyncio.sleep(0.05)
+    await context.unsubscribe("1")
+    await asyncio.wait_for(task, 1)
+    assert len(context.sent) < 10
+
+
+async def test_shared_subscription():
+    server = TstServer(schema, keep_alive=False, share_subscriptions=True)
+    contexts = [TstConnectionContext(ws=None) for i in range(2)]
+    query = "subscription { count(upTo: 2) }"
+    await asyncio.gather(
+        *(
+            server.process_message(context, start_message(str(i), query))
+            for i, context in enumerate(contexts)
+        )
+    )
+    for context in contexts:
+        assert context.sent[1]["payload"] == {"data": {"count": 1}}
+
+
+@pytest.mark.parametrize(
+    "option", ["native_subscriptions", "thread_pool", "process_pool"]
+)
+async def test_graphql_core2_options(option):
+    with pytest.raises(ValueError, match=option):
+        TstServer(schema, keep_alive=False, **{option: 2})
+
+
+async def test_document_cache():
+    cache = DocumentCache(maxsize=1)
+    first = cache.document_from_string(schema, "{ hello }")
+    assert cache.document_from_string(schema, "{ hello }") is first
+    assert first.get_operation_type(None) == "query"
+    cache.document_from_string(schema, "subscription { count(upTo: 1) }")
+    assert cache.stats == {
+        "size": 1,
+        "maxsize": 1,
+        "hits": 1,
+        "misses": 2,
+        "evictions": 1,
+    }
@@ -3,7 +3,21 @@ try:
 except ImportError:
     import mock
 
+import json
+import time
+
+import gevent
+import pytest
+from graphql.execution import ExecutionResult
+from rx import Observable
+from rx.concurrency import GEventScheduler
+
+from graphql_ws.base import ConnectionClosedException
+from graphql_ws.constants import GQL_DATA, GQL_START, GQL_STOP
 from graphql_ws.gevent import GeventConnectionContext, GeventSubscriptionServer
+from graphql_ws.outbound import OutboundQueue
+
+from .test_codecs import installed_codecs
 
 
 class TestConnectionContext:
@@ -20,6 +34,27 @@ class TestConnectionContext:
         connection_context.send({"text": "test"})
         ws.send.assert_called_with('{"text": "test"}')
 
+    def test_send_encoded(self):
+        ws = mock.Mock()
+        ws.closed = False
+        connection_context = GeventConnectionContext(ws=ws)
+        connection_context.send_encoded(b'{"type": "ka"}')
+        ws.send.assert_called_with('{"type": "ka"}')
+
+    @pytest.mark.parametrize(
+        "codec", installed_codecs(), ids=lambda codec: codec.name
+    )
+    def test_send_text(self, codec):
+        ws = mock.Mock()
+        ws.closed = False
+        connection_context = GeventConnectionContext(ws=ws, codec=codec)
+        connection_context.send({"text": "test"})
+        # gevent-websocket would send the repr of bytes.
+        (frame,), kwargs = ws.send.call_args
+        assert isinstance(frame, str)
+        assert json.loads(frame) == {"text": "test"}
+        assert not kwargs
+
     def test_send_closed(self):
         ws = mock.Mock()
         ws.closed = True
@@ -36,3 +71,90 @@ class TestConnectionContext:
 
 def test_subscription_server_smoke():
     GeventSubscriptionServer(schema=None)
+
+
+class FakeWs:
+    def __init__(self, messages):
+        self.messages = [json.dumps(message) for message in messages]
+        self.sent = []
+        self.closed = False
+
+    def receive(self):
+        if not self.messages:
+            # Let the operations finish before closing.
+            gevent.sleep(0.2)
+            self.closed = True
+            raise ConnectionClosedException()
+        return self.messages.pop(0)
+
+    def send(self, frame):
+        self.sent.append(json.loads(frame))
+
+    def close(self, code):
+        self.closed = True
+
+
+class SlowServer(GeventSubscriptionServer):
+    executed = ()
+
+    def execute(self, params):
+        gevent.sleep(0.05)
+        self.executed += (params["request_string"],)
+        result = ExecutionResult(data={"query": params["request_string"]})
+        return Observable.just(result, scheduler=GEventScheduler())
+
+
+def start_message(op_id):
+    return {"id": op_id, "type": GQL_START, "payload": {"query": op_id}}
+
+
+@pytest.mark.parametrize(
+    "pool_size, max_greenlets, concurrent",
+    [(10, None, True), (1, None, False), (10, 1, False)],
+)
+def test_start_concurrently(pool_size, max_greenlets, concurrent):
+    server = SlowServer(
+        schema=None, keep_alive=False, pool_size=pool_size, max_greenlets=max_greenlets
+    )
+    ws = FakeWs([start_message("1"), start_message("2")])
+    start = time.time()
+    greenlet = gevent.spawn(server.handle, ws)
+    gevent.sleep(0.08)
+    data = [message["id"] for message in ws.sent if message["type"] == GQL_DATA]
+    assert data == (["1", "2"] if concurrent else ["1"])
+    greenlet.join()
+    assert time.time() - start < 1
+
+
+def test_stop_while_starting():
+    server = SlowServer(schema=None, keep_alive=False)
+    stop_message = {"id": "1", "type": GQL_STOP}
+    ws = FakeWs([start_message("1"), stop_message, start_message("2")])
+    gevent.spawn(server.handle, ws).join()
+    assert server.executed == ("2",)
+    assert [message["id"] for message in ws.sent] == ["2", "2"]
+
+
+def test_outbound_writer():
+    server = GeventSubscriptionServer(
+        schema=None, keep_alive=False, outbound_queue=OutboundQueue
+    )
+    ws = mock.Mock()
+    ws.closed = False
+    ws.send.side_effect = lambda frame: gevent.sleep(0.01)
+    connection_context = GeventConnectionContext(ws=ws)
+    connection_context.register_operation("1", None)
+    for i in range(3):
+        server.send_execution_result(
+            connection_context, "1", ExecutionResult(data={"i": i})
+        )
+    assert not ws.send.called
+    assert len(connection_context.outbound) == 3
+    gevent.sleep(0.05)
+    sent = [json.loads(call[0][0]) for call in ws.send.call_args_list]
+    assert [message["payload"] for message in sent] == [
+        {"data": {"i": i}} for i in range(3)
+    ]
+    server.on_close(connection_context)
+    connection_context.writer.worker.join(1)
+    assert connection_context.writer.worker.dead
@@ -1,3 +1,6 @@
+import json
+import threading
+import time
 from collections import OrderedDict
 
 try:
@@ -14,7 +17,7 @@ from graphql_ws import base, base_sync, constants
 @pytest.fixture
 def cc():
     cc = base.BaseConnectionContext(ws=None)
-    cc.operations = {"yes": "1"}
+    cc.register_operation("yes", "1")
     return cc
 
 
@@ -55,6 +58,10 @@ class TestConnectionContextNotImplentedMethods:
         with pytest.raises(NotImplementedError):
             base.BaseConnectionContext(ws=None).send("TEST")
 
+    def test_send_encoded(self):
+        with pytest.raises(NotImplementedError):
+            base.BaseConnectionContext(ws=None).send_encoded("TEST")
+
     def test_closed(self):
         with pytest.raises(NotImplementedError):
             base.BaseConnectionContext(ws=None).closed
@@ -165,6 +172,32 @@ def test_build_message_partial(ss):
         ss.build_message(id=None, op_type=None, payload=None)
 
 
+def test_build_encoded_message(ss):
+    frame = ss.build_encoded_message("1", "data", ss.encode_payload({"a": [1]}))
+    assert json.loads(frame) == {"id": "1", "type": "data", "payload": {"a": [1]}}
+
+
+def test_build_encoded_message_bytes(ss):
+    frame = ss.build_encoded_message(None, None, b'{"a": 1}')
+    assert frame == '{"payload": {"a": 1}}'
+
+
+def test_build_encoded_message_partial(ss):
+    assert json.loads(ss.build_encoded_message("1", None, None)) == {"id": "1"}
+    with pytest.raises(AssertionError):
+        ss.build_encoded_message(None, None, None)
+
+
+def test_send_encoded_message(ss, cc):
+    cc.send_encoded = mock.Mock()
+    ss.send_encoded_message(cc, "yes", "data", '{"data": null}')
+    cc.send_encoded.assert_called_with(
+        '{"id": "yes", "type": "data", "payload": {"data": null}}'
+    )
+    ss.send_encoded_message(cc, "no", "data", '{"data": null}')
+    assert cc.send_encoded.call_count == 1
+
+
 def test_send_execution_result(ss):
     ss.execution_result_to_dict = mock.Mock()
     ss.execution_result_to_dict.return_value = {"res": "ult"}
@@ -199,3 +232,77 @@ class TestSSNotImplemented:
     def test_handle(self, ss):
         with pytest.raises(NotImplementedError):
             ss.handle(ws=None, request_context=None)
+
+
+class KeepAliveContext(base.BaseConnectionContext):
+    closed = False
+
+    def __init__(self):
+        super(KeepAliveContext, self).__init__(ws=None)
+        self.sent = []
+        self.writes = 0
+        self.stall = threading.Event()
+        self.stall.set()
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def send_encoded(self, frame):
+        self.writes += 1
+        self.stall.wait()
+        self.sent.append(json.loads(frame))
+
+
+class TestKeepAlive:
+    def test_connection_init(self, ss, cc):
+        ss.spawn = mock.Mock()
+        cc.send = mock.Mock()
+        cc.send_encoded = mock.Mock()
+        ss.on_connection_init(cc, None, {})
+        cc.send.assert_called_with({"type": constants.GQL_CONNECTION_ACK})
+        cc.send_encoded.assert_called_with('{"type": "ka"}')
+        ss.spawn.assert_called_once_with(ss.run_keep_alive)
+        assert cc in ss.keep_alive_wheel
+
+        ss.on_connection_init(mock.Mock(), None, {})
+        assert ss.spawn.call_count == 1
+
+    def test_tick(self, ss):
+        open_cc, closed_cc = mock.Mock(closed=False), mock.Mock(closed=True)
+        ss.keep_alive_wheel.add(open_cc)
+        ss.keep_alive_wheel.add(closed_cc)
+        for _ in range(len(ss.keep_alive_wheel.slots) - 1):
+            assert ss.tick_keep_alive() == []
+        assert ss.tick_keep_alive() == [open_cc]
+        assert closed_cc not in ss.keep_alive_wheel
+
+    def test_close(self, ss, cc):
+        ss.keep_alive_wheel.add(cc)
+        ss.on_close(cc)
+        assert cc not in ss.keep_alive_wheel
+
+    def test_stalled_connection(self):
+        ss = base_sync.BaseSyncSubscriptionServer(schema=None, keep_alive=0.064)
+        healthy, stalled = KeepAliveContext(), KeepAliveContext()
+        ss.on_connection_init(healthy, None, {})
+        ss.on_connection_init(stalled, None, {})
+        stalled.stall.clear()
+        time.sleep(0.35)
+        # The stalled connection doesn't hold up the others, and isn't sent
+        # another keep alive while one is still being written.
+        assert len(healthy.sent) >= 4
+        assert stalled.writes == 2
+        stalled.stall.set()
+        ss.on_close(healthy)
+        ss.on_close(stalled)
+        time.sleep(0.05)
+        # The driver stops once no connections are left.
+        assert ss.keep_alive_thread is None
+
+    def test_disabled(self, cc):
+        ss = base_sync.BaseSyncSubscriptionServer(schema=None, keep_alive=False)
+        ss.spawn = mock.Mock()
+        cc.send = mock.Mock()
+        ss.on_connection_init(cc, None, {})
+        assert not ss.spawn.called
+        assert ss.keep_alive_wheel is None
@@ -0,0 +1,45 @@
+import pytest
+
+from graphql_ws.keepalive import TimerWheel
+
+
+@pytest.fixture
+def wheel():
+    return TimerWheel(interval=4, slots=4)
+
+
+def tick(wheel, times):
+    return [sorted(wheel.tick()) for _ in range(times)]
+
+
+def test_tick_interval(wheel):
+    assert wheel.tick_interval == 1.0
+
+
+def test_due_once_per_interval(wheel):
+    wheel.add("a")
+    assert tick(wheel, 8) == [[], [], [], ["a"], [], [], [], ["a"]]
+
+
+def test_items_hashed_by_tick(wheel):
+    wheel.add("a")
+    wheel.tick()
+    wheel.add("b")
+    wheel.add("c")
+    assert tick(wheel, 4) == [[], [], ["a"], ["b", "c"]]
+
+
+def test_add_again_reschedules(wheel):
+    wheel.add("a")
+    wheel.tick()
+    wheel.add("a")
+    assert len(wheel) == 1
+    assert tick(wheel, 4) == [[], [], [], ["a"]]
+
+
+def test_remove(wheel):
+    wheel.add("a")
+    wheel.remove("a")
+    wheel.remove("missing")
+    assert "a" not in wheel
+    assert tick(wheel, 4) == [[], [], [], []]
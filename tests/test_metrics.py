@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+from graphql.execution import ExecutionResult
+
+from graphql_ws import base, base_sync, constants
+from graphql_ws.metrics import Histogram, Metrics
+
+from .test_base_async import TstConnectionContext, TstServer, schema, start_message
+
+
+class SyncConnectionContext(base.BaseConnectionContext):
+    closed = False
+
+    def send_encoded(self, frame):
+        self.frame = frame
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 2))
+    for value in (0.5, 1, 1.5, 3):
+        histogram.observe(value)
+    assert histogram.cumulative_counts() == [2, 3, 4]
+    assert histogram.count == 4
+    assert histogram.sum == 6
+
+
+def test_operation_names_are_bounded():
+    metrics = Metrics(max_operation_names=1)
+    context = SyncConnectionContext(ws=None)
+    metrics.operation_started(context, "1", "First")
+    metrics.message_sent(context, "1", constants.GQL_DATA, "{}", 0)
+    metrics.operation_started(context, "2", "Second")
+    metrics.operation_started(context, "3", None)
+    assert context.operation_names == {"1": "First", "2": "other", "3": "other"}
+    context.remove_operation("1")
+    assert "1" not in context.operation_names
+
+
+def test_exposition():
+    metrics = Metrics(latency_buckets=(0.1,))
+    context = SyncConnectionContext(ws=None)
+    metrics.connection_opened(context)
+    context.register_operation("1", None)
+    metrics.operation_started(context, "1", 'Say "hi"')
+    metrics.message_received(constants.GQL_START, 10)
+    metrics.message_received("made-up", 5)
+    metrics.message_sent(context, "1", constants.GQL_DATA, "{}", 0.05)
+    metrics.error(ValueError())
+    lines = metrics.exposition().splitlines()
+    assert "# TYPE graphql_ws_connections gauge" in lines
+    assert "graphql_ws_connections 1" in lines
+    assert "graphql_ws_operations 1" in lines
+    assert 'graphql_ws_messages_received_total{type="start"} 1' in lines
+    assert 'graphql_ws_messages_received_total{type="unknown"} 1' in lines
+    assert "graphql_ws_received_bytes_total 15" in lines
+    assert 'graphql_ws_send_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'graphql_ws_send_latency_seconds_bucket{le="+Inf"} 1' in lines
+    assert "graphql_ws_send_latency_seconds_count 1" in lines
+    assert 'graphql_ws_errors_total{type="ValueError"} 1' in lines
+    assert 'graphql_ws_data_messages_total{operation="Say \\"hi\\""} 1' in lines
+
+
+def test_sync_server():
+    metrics = Metrics()
+    server = base_sync.BaseSyncSubscriptionServer(
+        schema=None, keep_alive=False, metrics=metrics
+    )
+    context = SyncConnectionContext(ws=None)
+    server.on_open(context)
+    context.register_operation("1", None)
+    server.send_execution_result(context, "1", ExecutionResult(data={"hello": 1}))
+    server.on_close(context)
+    snapshot = metrics.snapshot()
+    assert snapshot["connections"] == 0
+    assert snapshot["messages_sent"] == {constants.GQL_DATA: 1}
+    assert snapshot["bytes_sent"] == len(context.frame)
+    assert snapshot["send_latency"]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_server():
+    metrics = Metrics()
+    server = TstServer(schema=schema, keep_alive=False, metrics=metrics)
+    context = TstConnectionContext(ws=None)
+    await server.on_open(context)
+    message = start_message("1")
+    message["payload"] = {
+        "query": "subscription Count { count(upTo: 2) }",
+        "operationName": "Count",
+    }
+    task = server.on_message(context, json.dumps(message))
+    await asyncio.sleep(0.005)
+    assert (metrics.connections, metrics.operations) == (1, 1)
+    await task
+    assert metrics.operations == 0
+    await server.on_message(context, "'not-json")
+    await server.on_close(context)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["connections"] == 0
+    assert snapshot["messages_received"] == {
+        constants.GQL_START: 1,
+        "unknown": 1,
+    }
+    assert snapshot["bytes_received"] == len(json.dumps(message)) + len("'not-json")
+    assert snapshot["messages_sent"] == {
+        constants.GQL_DATA: 2,
+        constants.GQL_COMPLETE: 1,
+        constants.GQL_ERROR: 1,
+    }
+    assert snapshot["data_messages"] == {"Count": 2}
+    assert snapshot["send_latency"]["count"] == 4
+    assert sum(snapshot["errors"].values()) == 1
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+
+import pytest
+from rx import Observable
+from rx.subjects import Subject
+
+from graphql_ws.observable_aiter import (
+    DROP_NEWEST,
+    ERROR,
+    AIterator,
+    BufferOverflow,
+    setup_observable_extension,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+async def test_iterate():
+    assert await collect(AIterator(Observable.from_([1, 2, 3]))) == [1, 2, 3]
+
+
+async def test_extension():
+    setup_observable_extension()
+    iterator = await Observable.from_([1, 2]).__aiter__()
+    assert await collect(iterator) == [1, 2]
+
+
+async def test_error():
+    subject = Subject()
+    iterator = AIterator(subject)
+    subject.on_next(1)
+    subject.on_error(ValueError("failed"))
+    assert await iterator.__anext__() == 1
+    with pytest.raises(ValueError):
+        await iterator.__anext__()
+
+
+async def test_waits_for_items():
+    subject = Subject()
+    iterator = AIterator(subject)
+    next_item = asyncio.ensure_future(iterator.__anext__())
+    await asyncio.sleep(0)
+    assert not next_item.done()
+    subject.on_next("a")
+    assert await next_item == "a"
+    subject.on_completed()
+    assert await collect(iterator) == []
+
+
+async def test_cancel_waiting_consumer():
+    subject = Subject()
+    iterator = AIterator(subject)
+    wakeup = iterator.wakeup
+    next_item = asyncio.ensure_future(iterator.__anext__())
+    await asyncio.sleep(0)
+    next_item.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await next_item
+    # The same wakeup is used by the next consumer.
+    next_item = asyncio.ensure_future(iterator.__anext__())
+    await asyncio.sleep(0)
+    subject.on_next("a")
+    assert await next_item == "a"
+    assert iterator.wakeup is wakeup
+
+
+async def test_aclose():
+    subject = Subject()
+    iterator = AIterator(subject)
+    subject.on_next(1)
+    await iterator.aclose()
+    assert not subject.observers
+    with pytest.raises(StopAsyncIteration):
+        await iterator.__anext__()
+
+    iterator = AIterator(Subject())
+    next_item = asyncio.ensure_future(iterator.__anext__())
+    await asyncio.sleep(0)
+    await iterator.aclose()
+    with pytest.raises(StopAsyncIteration):
+        await next_item
+
+
+async def test_drop_oldest():
+    iterator = AIterator(Observable.from_(range(5)), max_buffer_size=2)
+    assert await collect(iterator) == [3, 4]
+    assert iterator.dropped == 3
+
+
+async def test_drop_newest():
+    iterator = AIterator(
+        Observable.from_(range(5)), max_buffer_size=2, overflow=DROP_NEWEST
+    )
+    assert await collect(iterator) == [0, 1]
+    assert iterator.dropped == 3
+
+
+async def test_overflow_error():
+    subject = Subject()
+    iterator = AIterator(subject, max_buffer_size=1, overflow=ERROR)
+    subject.on_next(1)
+    subject.on_next(2)
+    assert not subject.observers
+    with pytest.raises(BufferOverflow):
+        await iterator.__anext__()
+
+
+async def test_next_batch():
+    subject = Subject()
+    iterator = AIterator(subject)
+    for i in range(5):
+        subject.on_next(i)
+    assert await iterator.next_batch(max_items=2) == [0, 1]
+    assert await iterator.next_batch() == [2, 3, 4]
+    subject.on_completed()
+    with pytest.raises(StopAsyncIteration):
+        await iterator.next_batch()
+
+
+async def test_emit_from_thread():
+    subject = Subject()
+    iterator = AIterator(subject)
+    next_item = asyncio.ensure_future(iterator.__anext__())
+    await asyncio.sleep(0)
+    thread = threading.Thread(target=subject.on_next, args=("threaded",))
+    thread.start()
+    thread.join()
+    assert await asyncio.wait_for(next_item, 1) == "threaded"
+
+
+async def test_dispose():
+    subject = Subject()
+    iterator = AIterator(subject)
+    iterator.dispose()
+    assert not subject.observers
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry.sdk.trace import TracerProvider  # noqa: E402
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor  # noqa: E402
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (  # noqa: E402
+    InMemorySpanExporter,
+)
+from opentelemetry.trace import StatusCode  # noqa: E402
+
+from graphql_ws.opentelemetry import OpenTelemetryTracer  # noqa: E402
+
+from .test_base_async import (  # noqa: E402
+    TstConnectionContext,
+    TstServer,
+    schema,
+    start_message,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def exporter():
+    return InMemorySpanExporter()
+
+
+@pytest.fixture
+def server(exporter):
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = OpenTelemetryTracer(tracer_provider=provider)
+    return TstServer(schema=schema, keep_alive=False, tracer=tracer)
+
+
+async def test_spans(server, exporter):
+    context = TstConnectionContext(ws=None)
+    await server.on_message(context, json.dumps(start_message("1", up_to=1)))
+    spans = exporter.get_finished_spans()
+    assert [span.name for span in spans[:4]] == [
+        "graphql_ws.decode",
+        "graphql_ws.parse",
+        "graphql_ws.execute",
+        "graphql_ws.resolve",
+    ]
+    assert "graphql_ws.operation_id" not in spans[0].attributes
+    assert spans[1].attributes["graphql_ws.operation_id"] == "1"
+    assert spans[1].attributes["graphql_ws.connection"] == id(context)
+
+
+async def test_error(server, exporter):
+    await server.on_message(TstConnectionContext(ws=None), "'not-json")
+    span = exporter.get_finished_spans()[0]
+    assert span.name == "graphql_ws.decode"
+    assert span.status.status_code == StatusCode.ERROR
+    assert span.events[0].name == "exception"
@@ -0,0 +1,210 @@
+import threading
+import time
+
+import pytest
+
+from graphql_ws.outbound import (
+    BLOCK,
+    CONFLATE,
+    DISCONNECT,
+    DROP_OLDEST,
+    SLOW_CONSUMER_CLOSE_CODE,
+    OutboundQueue,
+    OutboundWriter,
+    SlowConsumer,
+)
+
+
+def fill(queue, frames, op_id="1", droppable=True):
+    for frame in frames:
+        queue.put(frame, op_id, droppable)
+
+
+def drain(queue):
+    frames = []
+    while queue:
+        frames.append(queue.get())
+    return frames
+
+
+def test_fifo():
+    queue = OutboundQueue()
+    fill(queue, ["a", "b", "c"])
+    assert drain(queue) == ["a", "b", "c"]
+    assert queue.stats == {
+        "depth": 0,
+        "max_depth": 3,
+        "enqueued": 3,
+        "sent": 3,
+        "dropped": 0,
+        "conflated": 0,
+        "flushes": 3,
+        "max_flush_size": 1,
+    }
+
+
+def test_get_all():
+    queue = OutboundQueue(high_watermark=2, low_watermark=0)
+    fill(queue, "abc")
+    assert queue.paused
+    assert queue.get_all() == ["a", "b", "c"]
+    assert not queue
+    assert not queue.paused
+    assert queue.stats["flushes"] == 1
+    assert queue.stats["max_flush_size"] == 3
+
+
+def test_invalid_policy():
+    with pytest.raises(AssertionError):
+        OutboundQueue(policy="unknown")
+
+
+def test_block_pauses_until_low_watermark():
+    queue = OutboundQueue(high_watermark=4, low_watermark=1, policy=BLOCK)
+    fill(queue, "abcd")
+    assert not queue.paused
+    queue.put("e")
+    assert queue.paused
+    assert len(queue) == 5
+    queue.get()
+    queue.get()
+    queue.get()
+    assert queue.paused
+    queue.get()
+    assert not queue.paused
+
+
+def test_drop_oldest():
+    queue = OutboundQueue(high_watermark=3, policy=DROP_OLDEST)
+    queue.put("ack")
+    fill(queue, "ab")
+    queue.put("c", "1", droppable=True)
+    queue.put("complete")
+    assert drain(queue) == ["ack", "b", "c", "complete"]
+    assert queue.dropped == 1
+
+
+def test_conflate():
+    queue = OutboundQueue(high_watermark=2, policy=CONFLATE)
+    fill(queue, "ab", op_id="1")
+    fill(queue, "cd", op_id="1")
+    fill(queue, "x", op_id="2")
+    queue.put("complete", "1")
+    assert drain(queue) == ["a", "d", "x", "complete"]
+    assert queue.conflated == 2
+
+
+def test_conflate_after_sent():
+    queue = OutboundQueue(high_watermark=1, policy=CONFLATE)
+    fill(queue, "a")
+    assert queue.get() == "a"
+    fill(queue, "bc")
+    assert drain(queue) == ["c"]
+    assert queue.conflated == 1
+
+
+def test_disconnect():
+    queue = OutboundQueue(high_watermark=2, policy=DISCONNECT)
+    fill(queue, "ab")
+    with pytest.raises(SlowConsumer):
+        queue.put("c")
+
+
+def test_clear():
+    queue = OutboundQueue(high_watermark=1)
+    fill(queue, "ab")
+    queue.clear()
+    assert not queue
+    assert not queue.paused
+    assert queue.dropped == 2
+
+
+class SlowConnectionContext:
+    closed = False
+    close_code = None
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.sent = []
+        self.done = threading.Event()
+
+    def send_encoded(self, frame):
+        time.sleep(self.delay)
+        self.sent.append(frame)
+        if frame == "last":
+            self.done.set()
+
+    def close(self, code):
+        self.close_code = code
+
+
+def spawn_thread(func):
+    thread = threading.Thread(target=func)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def test_writer_doesnt_block_producers():
+    context = SlowConnectionContext()
+    writer = OutboundWriter(
+        context, OutboundQueue(high_watermark=2, policy=DROP_OLDEST), spawn_thread
+    )
+    start = time.time()
+    for frame in "abcde":
+        writer.put(frame, "1", droppable=True)
+    writer.put("last")
+    assert time.time() - start < 0.01
+    assert context.done.wait(1)
+    assert context.sent[-1] == "last"
+    assert len(context.sent) + writer.outbound.dropped == 6
+    assert writer.outbound.dropped > 0
+    writer.stop()
+    writer.worker.join(1)
+    assert not writer.worker.is_alive()
+
+
+def test_writer_blocks_producers():
+    context = SlowConnectionContext()
+    writer = OutboundWriter(
+        context,
+        OutboundQueue(high_watermark=2, low_watermark=0, policy=BLOCK),
+        spawn_thread,
+    )
+    for frame in "abcdef":
+        writer.put(frame, "1", droppable=True)
+    writer.put("last")
+    assert context.done.wait(1)
+    assert context.sent == list("abcdef") + ["last"]
+    writer.stop()
+
+
+def test_writer_doesnt_block_control_frames():
+    context = SlowConnectionContext(delay=0.05)
+    writer = OutboundWriter(
+        context,
+        OutboundQueue(high_watermark=2, low_watermark=0, policy=BLOCK),
+        spawn_thread,
+    )
+    for frame in "abc":
+        writer.put(frame, "1", droppable=True)
+    assert writer.outbound.paused
+    start = time.time()
+    writer.put("last")
+    assert time.time() - start < 0.01
+    assert context.done.wait(1)
+    assert context.sent == list("abc") + ["last"]
+    writer.stop()
+
+
+def test_writer_disconnects_slow_consumer():
+    context = SlowConnectionContext(delay=0.1)
+    writer = OutboundWriter(
+        context, OutboundQueue(high_watermark=1, policy=DISCONNECT), spawn_thread
+    )
+    for frame in "abc":
+        writer.put(frame)
+    assert context.close_code == SLOW_CONSUMER_CLOSE_CODE
+    assert writer.stopped
+    writer.put("d")
+    assert not writer.outbound
@@ -0,0 +1,144 @@
+import json
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import graphene
+import pytest
+
+from graphql_ws import base, base_sync, constants
+from graphql_ws.persisted_queries import (
+    FileQueryStore,
+    MemoryQueryStore,
+    PersistedQueryMismatch,
+    PersistedQueryNotFound,
+    PersistedQueryNotSupported,
+    get_query_hash,
+)
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+
+    def resolve_hello(root, info):
+        return "world"
+
+
+schema = graphene.Schema(query=Query)
+
+QUERY = "{ hello }"
+QUERY_HASH = get_query_hash(QUERY)
+
+
+def apq_payload(query_hash=QUERY_HASH, query=None, version=1):
+    payload = {
+        "extensions": {"persistedQuery": {"version": version, "sha256Hash": query_hash}}
+    }
+    if query is not None:
+        payload["query"] = query
+    return payload
+
+
+@pytest.fixture
+def store():
+    return MemoryQueryStore()
+
+
+@pytest.fixture
+def ss(store):
+    return base_sync.BaseSyncSubscriptionServer(schema, query_store=store)
+
+
+def test_plain_query(ss):
+    assert ss.get_query({"query": QUERY}) == QUERY
+
+
+def test_not_found(ss):
+    with pytest.raises(PersistedQueryNotFound):
+        ss.get_query(apq_payload())
+
+
+def test_register_then_lookup(ss, store):
+    assert ss.get_query(apq_payload(query=QUERY)) == QUERY
+    assert store.get(QUERY_HASH) == QUERY
+    assert ss.get_query(apq_payload()) == QUERY
+
+
+def test_hash_mismatch(ss):
+    with pytest.raises(PersistedQueryMismatch):
+        ss.get_query(apq_payload(query_hash="bad", query=QUERY))
+
+
+def test_read_only_store_not_updated():
+    store = MemoryQueryStore(read_only=True)
+    ss = base_sync.BaseSyncSubscriptionServer(schema, query_store=store)
+    assert ss.get_query(apq_payload(query=QUERY)) == QUERY
+    assert store.get(QUERY_HASH) is None
+
+
+def test_no_store():
+    ss = base_sync.BaseSyncSubscriptionServer(schema)
+    with pytest.raises(PersistedQueryNotSupported):
+        ss.get_query(apq_payload())
+
+
+def test_unsupported_version(ss):
+    with pytest.raises(PersistedQueryNotSupported):
+        ss.get_query(apq_payload(version=2))
+
+
+def test_precompiled():
+    store = MemoryQueryStore({QUERY_HASH: QUERY, "broken": "{ hello"})
+    ss = base_sync.BaseSyncSubscriptionServer(schema, query_store=store)
+    assert (schema, QUERY) in ss.document_cache
+    assert ss.execute({"request_string": ss.get_query(apq_payload())}).data == {
+        "hello": "world"
+    }
+    assert ss.document_cache.hits == 1
+
+
+def test_start_not_found_sends_error(ss):
+    cc = base.BaseConnectionContext(ws=None)
+    cc.send = mock.Mock()
+    ss.on_start = mock.Mock()
+    ss.process_message(
+        cc, {"id": "1", "type": constants.GQL_START, "payload": apq_payload()}
+    )
+    assert not ss.on_start.called
+    cc.send.assert_called_with(
+        {
+            "id": "1",
+            "type": constants.GQL_ERROR,
+            "payload": {"message": "PersistedQueryNotFound"},
+        }
+    )
+
+
+def test_known_query_not_registered_again():
+    store = mock.Mock(wraps=MemoryQueryStore({QUERY_HASH: QUERY}), read_only=False)
+    ss = base_sync.BaseSyncSubscriptionServer(schema, query_store=store)
+    assert ss.get_query(apq_payload(query=QUERY)) == QUERY
+    assert not store.set.called
+
+
+def test_max_size():
+    store = MemoryQueryStore(max_size=1)
+    assert store.set("a", "{ a }")
+    assert not store.set("b", "{ b }")
+    assert store.set("a", "{ a2 }")
+    assert store.queries() == ["{ a2 }"]
+
+
+def test_file_store(tmpdir):
+    path = str(tmpdir.join("queries.json"))
+    store = FileQueryStore(path, read_only=False)
+    assert store.get(QUERY_HASH) is None
+    store.set(QUERY_HASH, QUERY)
+    store.flush()
+    with open(path) as f:
+        assert json.load(f) == {QUERY_HASH: QUERY}
+    store = FileQueryStore(path)
+    assert store.read_only
+    assert store.get(QUERY_HASH) == QUERY
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+
+import graphene
+import pytest
+
+from graphql_ws import constants
+from graphql_ws.metrics import Metrics
+from graphql_ws.processpool import OperationProcessPool
+
+from .test_base_async import TstConnectionContext, TstServer
+
+pytestmark = pytest.mark.asyncio
+
+
+class Event(graphene.ObjectType):
+    value = graphene.Int()
+    pid = graphene.Int()
+
+    def resolve_value(root, info):
+        return root
+
+    def resolve_pid(root, info):
+        return os.getpid()
+
+
+class Query(graphene.ObjectType):
+    pid = graphene.Int()
+    fail = graphene.Int()
+
+    def resolve_pid(root, info):
+        return os.getpid()
+
+    def resolve_fail(root, info):
+        raise ValueError("failed")
+
+
+class Subscription(graphene.ObjectType):
+    events = graphene.Field(Event, up_to=graphene.Int())
+
+    async def resolve_events(root, info, up_to):
+        for i in range(up_to):
+            await asyncio.sleep(0)
+            yield i
+
+
+schema = graphene.Schema(query=Query, subscription=Subscription)
+
+
+@pytest.fixture(scope="module")
+def process_pool():
+    process_pool = OperationProcessPool(
+        "tests.test_processpool:schema",
+        operation_names=["Pid", "Fail", "Events"],
+        max_workers=1,
+    )
+    yield process_pool
+    process_pool.shutdown()
+
+
+async def start(server, query, op_id="1"):
+    context = TstConnectionContext(ws=None)
+    message = {"id": op_id, "type": constants.GQL_START, "payload": {"query": query}}
+    await server.on_message(context, json.dumps(message))
+    return context.sent
+
+
+async def test_query(process_pool):
+    metrics = Metrics()
+    server = TstServer(
+        schema=schema, keep_alive=False, process_pool=process_pool, metrics=metrics
+    )
+    assert process_pool.codec == server.codec.name
+    sent = await start(server, "query Pid { pid }")
+    assert sent[0]["payload"]["data"]["pid"] != os.getpid()
+    assert sent[1] == {"id": "1", "type": constants.GQL_COMPLETE}
+
+    sent = await start(server, "query Fail { fail }")
+    assert sent[0]["payload"]["errors"][0]["message"] == "failed"
+    assert metrics.snapshot()["errors"] == {"GraphQLLocatedError": 1}
+
+    # Other operations run in the server.
+    sent = await start(server, "{ pid }")
+    assert sent[0]["payload"]["data"]["pid"] == os.getpid()
+
+
+async def test_invalid_query(process_pool):
+    server = TstServer(schema=schema, keep_alive=False, process_pool=process_pool)
+    sent = await start(server, "query Pid { missing }")
+    assert "missing" in sent[0]["payload"]["errors"][0]["message"]
+
+
+@pytest.mark.parametrize("shared", [False, True])
+async def test_subscription(process_pool, shared):
+    server = TstServer(
+        schema=schema,
+        keep_alive=False,
+        process_pool=process_pool,
+        share_subscriptions=shared,
+    )
+    query = "subscription Events { events(upTo: 3) { value pid } }"
+    sent = await start(server, query)
+    events = [message["payload"]["data"]["events"] for message in sent[:-1]]
+    assert [event["value"] for event in events] == [0, 1, 2]
+    assert all(event["pid"] != os.getpid() for event in events)
+    assert sent[-1]["type"] == constants.GQL_COMPLETE
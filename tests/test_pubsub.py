@@ -0,0 +1,127 @@
+import asyncio
+
+import graphene
+import pytest
+
+from graphql_ws import constants
+from graphql_ws.pubsub import PubSub
+
+from .test_base_async import TstConnectionContext, TstServer
+
+pytestmark = pytest.mark.asyncio
+
+
+def drain(subscription):
+    events = list(subscription.buffer)
+    subscription.buffer.clear()
+    return events
+
+
+async def test_publish_by_topic():
+    pubsub = PubSub()
+    first, second = pubsub.subscribe("a"), pubsub.subscribe("b")
+    assert pubsub.publish("a", 1) == 1
+    assert pubsub.publish("c", 2) == 0
+    assert drain(first) == [1]
+    assert drain(second) == []
+
+
+async def test_publish_by_filters():
+    pubsub = PubSub()
+    everything = pubsub.subscribe("messages")
+    one = pubsub.subscribe("messages", channel=1)
+    two = pubsub.subscribe("messages", channel=2)
+    one_by_alice = pubsub.subscribe("messages", channel=1, author="alice")
+    assert pubsub.publish("messages", "hi", channel=1, author="bob") == 2
+    assert pubsub.publish("messages", "hey", channel=1, author="alice") == 3
+    assert pubsub.publish("messages", "ho") == 1
+    assert drain(everything) == ["hi", "hey", "ho"]
+    assert drain(one) == ["hi", "hey"]
+    assert drain(two) == []
+    assert drain(one_by_alice) == ["hey"]
+
+
+async def test_iterate():
+    pubsub = PubSub()
+    subscription = pubsub.subscribe("topic")
+
+    async def consume():
+        return [event async for event in subscription]
+
+    consumer = asyncio.ensure_future(consume())
+    await asyncio.sleep(0)
+    pubsub.publish("topic", 1)
+    pubsub.publish("topic", 2)
+    subscription.close()
+    assert await consumer == [1, 2]
+
+
+async def test_close_unsubscribes():
+    pubsub = PubSub()
+    async with pubsub.subscribe("topic", channel=1) as subscription:
+        assert len(pubsub) == 1
+    assert subscription.closed
+    assert len(pubsub) == 0
+    assert pubsub.topics == {}
+    assert pubsub.publish("topic", 1, channel=1) == 0
+    subscription.close()
+    assert len(pubsub) == 0
+
+
+async def test_close_all():
+    pubsub = PubSub()
+    subscriptions = [pubsub.subscribe("topic", channel=i % 2) for i in range(4)]
+    pubsub.close()
+    assert all(subscription.closed for subscription in subscriptions)
+    assert len(pubsub) == 0
+
+
+async def test_max_buffer_size():
+    pubsub = PubSub(max_buffer_size=2)
+    subscription = pubsub.subscribe("topic")
+    for i in range(5):
+        pubsub.publish("topic", i)
+    assert drain(subscription) == [3, 4]
+    assert subscription.dropped == 3
+
+
+pubsub = PubSub()
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+
+
+class Subscription(graphene.ObjectType):
+    messages = graphene.String(channel=graphene.Int())
+
+    async def resolve_messages(root, info, channel):
+        async with pubsub.subscribe("messages", channel=channel) as events:
+            async for message in events:
+                yield message
+
+
+schema = graphene.Schema(query=Query, subscription=Subscription)
+
+
+@pytest.mark.parametrize("native", [False, True])
+async def test_subscription_resolver(native):
+    server = TstServer(schema=schema, keep_alive=False, native_subscriptions=native)
+    context = TstConnectionContext(ws=None)
+    message = {
+        "id": "1",
+        "type": constants.GQL_START,
+        "payload": {"query": "subscription { messages(channel: 1) }"},
+    }
+    task = server.process_message(context, message)
+    await asyncio.sleep(0.01)
+    assert len(pubsub) == 1
+    pubsub.publish("messages", "other", channel=2)
+    pubsub.publish("messages", "hello", channel=1)
+    await asyncio.sleep(0.01)
+    assert [message["payload"] for message in context.sent] == [
+        {"data": {"messages": "hello"}}
+    ]
+    pubsub.close()
+    await asyncio.wait_for(task, 1)
+    assert context.sent[-1] == {"id": "1", "type": constants.GQL_COMPLETE}
@@ -0,0 +1,179 @@
+import json
+import random
+import threading
+import time
+from threading import Lock
+
+import pytest
+from graphql.execution import ExecutionResult
+from rx import Observable
+from rx.concurrency import ThreadPoolScheduler
+
+from graphql_ws import base, base_sync, constants
+from graphql_ws.registry import OperationRegistry, RegistryClosed
+
+
+def test_register_and_remove():
+    registry = OperationRegistry()
+    assert registry.register("1", "a") is None
+    assert registry.register("1", "a") == "a"
+    assert "1" in registry
+    assert registry.get("1") == "a"
+    # Only the given operation is removed.
+    assert registry.remove("1", "b") is None
+    assert registry.remove("1", "a") == "a"
+    assert not registry
+    assert registry.remove("1") is None
+
+
+def test_register_none():
+    registry = OperationRegistry()
+    registry.register("1", None)
+    assert "1" in registry
+    registry.remove("1")
+    assert "1" not in registry
+
+
+def test_close():
+    registry = OperationRegistry()
+    registry.register("1", "a")
+    assert registry.close() == {"1": "a"}
+    with pytest.raises(RegistryClosed):
+        registry.register("2", "b")
+    assert len(registry) == 0
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_updates():
+    registry = OperationRegistry()
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        while not stop.is_set():
+            try:
+                for op_id, operation in registry.items():
+                    assert operation == op_id
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+
+    def update(index):
+        for i in range(500):
+            op_id = "{}-{}".format(index, i % 10)
+            registry.register(op_id, op_id)
+            registry.remove(op_id, op_id)
+
+    run_threads(update, 8)
+    stop.set()
+    reader.join()
+    assert not errors
+    assert len(registry) == 0
+
+
+class ThreadedConnectionContext(base.BaseConnectionContext):
+    closed = False
+
+    def __init__(self, *args, **kwargs):
+        super(ThreadedConnectionContext, self).__init__(*args, **kwargs)
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def send_encoded(self, frame):
+        self.sent.append(json.loads(frame))
+
+
+class ThreadedServer(base_sync.BaseSyncSubscriptionServer):
+    """
+    Executes every operation as an endless Observable emitting on a thread
+    pool, and counts the subscriptions still running.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ThreadedServer, self).__init__(*args, **kwargs)
+        self.scheduler = ThreadPoolScheduler(8)
+        self.lock = Lock()
+        self.running = 0
+
+    def finished(self):
+        with self.lock:
+            self.running -= 1
+
+    def execute(self, params):
+        def subscribe(observer):
+            with self.lock:
+                self.running += 1
+            return (
+                Observable.interval(5, scheduler=self.scheduler)
+                .map(lambda i: ExecutionResult(data={"i": i}))
+                .finally_action(self.finished)
+                .subscribe(observer)
+            )
+
+        return Observable.create(subscribe)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_concurrent_subscriptions():
+    server = ThreadedServer(schema=None, keep_alive=False)
+    context = ThreadedConnectionContext(ws=None)
+
+    def start_and_stop(index):
+        rng = random.Random(index)
+        for i in range(50):
+            # Operation ids are reused, across threads too.
+            server.on_start(context, str(rng.randrange(10)), {})
+            if rng.random() < 0.5:
+                server.on_stop(context, str(rng.randrange(10)))
+
+    run_threads(start_and_stop, 8)
+    assert len(context.operations) == server.running
+    server.on_close(context)
+    # No subscription was lost track of.
+    assert wait_for(lambda: server.running == 0)
+    assert not context.operations
+
+
+def test_close_while_starting():
+    server = ThreadedServer(schema=None, keep_alive=False)
+    context = ThreadedConnectionContext(ws=None)
+
+    def start_and_close(index):
+        for i in range(50):
+            server.on_start(context, "{}-{}".format(index, i), {})
+            if index == 0 and i == 25:
+                server.on_close(context)
+
+    run_threads(start_and_close, 8)
+    # Operations started after the connection closed are disposed of.
+    assert wait_for(lambda: server.running == 0)
+    assert not context.operations
+
+
+def test_complete_while_subscribing():
+    server = base_sync.BaseSyncSubscriptionServer(schema=None, keep_alive=False)
+    server.execute = lambda params: Observable.just(ExecutionResult(data={"i": 1}))
+    context = ThreadedConnectionContext(ws=None)
+    server.on_start(context, "1", {})
+    assert [message["type"] for message in context.sent] == [
+        constants.GQL_DATA,
+        constants.GQL_COMPLETE,
+    ]
+    assert not context.operations
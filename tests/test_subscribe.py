@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from graphql import (
+    GraphQLField,
+    GraphQLInt,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    parse,
+)
+from graphql.execution.executors.asyncio import AsyncioExecutor
+from rx import Observable
+
+from graphql_ws.base_async import resolve
+from graphql_ws.subscribe import SubscriptionIterator, subscribe
+
+pytestmark = pytest.mark.asyncio
+
+
+async def numbers(root, info, **args):
+    for i in range(3):
+        yield i
+
+
+def fail(value, info):
+    if value == 1:
+        raise ValueError("odd")
+    return str(value)
+
+
+async def fail_later(value, info):
+    await asyncio.sleep(0)
+    if value == 0:
+        raise ValueError("zero")
+    return str(value)
+
+
+Event = GraphQLObjectType(
+    "Event",
+    {
+        "value": GraphQLField(GraphQLInt, resolver=lambda value, info: value),
+        "label": GraphQLField(GraphQLString, resolver=fail),
+        "later": GraphQLField(GraphQLString, resolver=fail_later),
+    },
+)
+
+schema = GraphQLSchema(
+    query=GraphQLObjectType("Query", {"hello": GraphQLField(GraphQLString)}),
+    subscription=GraphQLObjectType(
+        "Subscription",
+        {
+            "numbers": GraphQLField(GraphQLInt, resolver=numbers),
+            "events": GraphQLField(Event, resolver=numbers),
+            "observed": GraphQLField(
+                GraphQLInt, resolver=lambda root, info: Observable.from_([1, 2])
+            ),
+        },
+    ),
+)
+
+
+async def test_subscribe():
+    iterator = subscribe(schema, parse("subscription { total: numbers }"))
+    assert isinstance(iterator, SubscriptionIterator)
+    results = [result async for result in iterator]
+    assert [result.data for result in results] == [{"total": i} for i in range(3)]
+    assert not any(result.errors for result in results)
+
+
+async def test_subscribe_errors_per_event():
+    iterator = subscribe(schema, parse("subscription { events { value label } }"))
+    results = [result async for result in iterator]
+    assert results[0].data == {"events": {"value": 0, "label": "0"}}
+    assert results[1].data == {"events": {"value": 1, "label": None}}
+    assert str(results[1].errors[0]) == "odd"
+    assert results[2].errors is None
+
+
+async def test_subscribe_async_errors_per_event():
+    document = parse("subscription { events { value later } }")
+    iterator = subscribe(schema, document, executor=AsyncioExecutor())
+    results = []
+    async for result in iterator:
+        await resolve(result.data)
+        results.append(result)
+    assert results[0].data == {"events": {"value": 0, "later": None}}
+    assert [str(error) for error in results[0].errors] == ["zero"]
+    assert results[1].data == {"events": {"value": 1, "later": "1"}}
+    assert not results[1].errors
+
+
+async def test_subscribe_observable():
+    observable = subscribe(schema, parse("subscription { observed }"))
+    results = await observable.to_list().to_future()
+    assert [result.data for result in results] == [{"observed": 1}, {"observed": 2}]
+
+
+async def test_subscribe_invalid_variables():
+    document = parse("subscription ($n: Int!) { numbers }")
+    result = subscribe(schema, document, variable_values={"n": "x"})
+    assert result.invalid
+    assert result.errors
+
+
+async def test_subscription_iterator_cancel():
+    closed = []
+
+    async def source():
+        try:
+            await asyncio.Event().wait()
+            yield  # pragma: no cover
+        finally:
+            closed.append(True)
+
+    iterator = SubscriptionIterator(source(), lambda event: event)
+    task = asyncio.ensure_future(iterator.__anext__())
+    await asyncio.sleep(0)
+    assert iterator.future is task
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert closed == [True]
+    assert iterator.future is None
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import threading
+import time
+
+import graphene
+import pytest
+from rx import Observable
+
+from graphql_ws import constants
+from graphql_ws.metrics import Metrics
+from graphql_ws.threadpool import ResolverThreadPool
+
+from .test_base_async import TstConnectionContext, TstServer
+
+pytestmark = pytest.mark.asyncio
+
+
+class Item(graphene.ObjectType):
+    name = graphene.String()
+    thread = graphene.String()
+
+    def resolve_thread(root, info):
+        return threading.current_thread().name
+
+
+class Query(graphene.ObjectType):
+    blocking = graphene.String()
+    nonblocking = graphene.String()
+    inline = graphene.String()
+    item = graphene.Field(Item)
+
+    def resolve_blocking(root, info):
+        time.sleep(0.05)
+        return threading.current_thread().name
+
+    async def resolve_nonblocking(root, info):
+        return threading.current_thread().name
+
+    def resolve_inline(root, info):
+        return threading.current_thread().name
+
+    def resolve_item(root, info):
+        return Item(name="item")
+
+
+class Subscription(graphene.ObjectType):
+    count = graphene.Field(Item, up_to=graphene.Int())
+    observed = graphene.Field(Item)
+
+    async def resolve_count(root, info, up_to):
+        for i in range(up_to):
+            await asyncio.sleep(0)
+            yield Item(name=str(i))
+
+    def resolve_observed(root, info):
+        return Observable.from_([Item(name="a"), Item(name="b")])
+
+
+schema = graphene.Schema(query=Query, subscription=Subscription)
+
+
+async def run_query(server, query):
+    context = TstConnectionContext(ws=None)
+    message = {"id": "1", "type": constants.GQL_START, "payload": {"query": query}}
+    await server.on_message(context, json.dumps(message))
+    return context.sent[0]["payload"]["data"]
+
+
+async def test_offload_sync_resolvers():
+    server = TstServer(
+        schema=schema,
+        keep_alive=False,
+        thread_pool=ResolverThreadPool(2, offload_fields={"Query.inline": False}),
+    )
+    query = "{ blocking nonblocking inline item { name thread } }"
+    data = await run_query(server, query)
+    main = threading.current_thread().name
+    assert data["blocking"].startswith("graphql_ws-resolver")
+    assert data["item"]["thread"].startswith("graphql_ws-resolver")
+    assert data["item"]["name"] == "item"
+    assert data["nonblocking"] == main
+    assert data["inline"] == main
+    assert server.thread_pool.busy == server.thread_pool.queued == 0
+
+
+async def test_offload_selected_fields():
+    thread_pool = ResolverThreadPool(
+        offload_fields={"Query.inline": True}, offload_sync_resolvers=False
+    )
+    server = TstServer(schema=schema, keep_alive=False, thread_pool=thread_pool)
+    data = await run_query(server, "{ blocking inline }")
+    assert data["blocking"] == threading.current_thread().name
+    assert data["inline"].startswith("graphql_ws-resolver")
+
+
+async def test_loop_keeps_running():
+    server = TstServer(schema=schema, keep_alive=False, thread_pool=4)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    ticker = asyncio.ensure_future(tick())
+    await asyncio.gather(*(run_query(server, "{ blocking }") for i in range(4)))
+    ticker.cancel()
+    assert ticks >= 5
+
+
+async def test_metrics():
+    metrics = Metrics()
+    server = TstServer(schema=schema, keep_alive=False, thread_pool=1, metrics=metrics)
+    await asyncio.gather(
+        run_query(server, "{ blocking }"), run_query(server, "{ blocking }")
+    )
+    await run_query(server, "{ nonblocking }")
+    snapshot = metrics.snapshot()
+    assert snapshot["thread_pool"] == {"max_workers": 1, "busy": 0, "queued": 0}
+    assert snapshot["thread_wait"]["count"] == 2
+    # One of the two resolvers waited for the other.
+    assert snapshot["thread_wait"]["sum"] >= 0.04
+    assert snapshot["loop_blocked"]["count"] == 1
+    lines = metrics.exposition().splitlines()
+    assert "graphql_ws_resolver_threads 1" in lines
+    assert "graphql_ws_resolver_threads_busy 0" in lines
+    assert "graphql_ws_loop_blocked_seconds_count 1" in lines
+
+
+@pytest.mark.parametrize(
+    "query, names",
+    [
+        ("subscription { item: count(upTo: 2) { name thread } }", ["0", "1"]),
+        ("subscription { item: observed { name thread } }", ["a", "b"]),
+    ],
+)
+async def test_subscription(query, names):
+    server = TstServer(schema=schema, keep_alive=False, thread_pool=2)
+    context = TstConnectionContext(ws=None)
+    message = {"id": "1", "type": constants.GQL_START, "payload": {"query": query}}
+    await server.on_message(context, json.dumps(message))
+    # Wait for the subscription to complete.
+    for i in range(100):
+        if context.sent and context.sent[-1]["type"] == constants.GQL_COMPLETE:
+            break
+        await asyncio.sleep(0.01)
+    items = [sent["payload"]["data"]["item"] for sent in context.sent[:-1]]
+    assert [item["name"] for item in items] == names
+    # The fields of events still run in the pool.
+    assert all(item["thread"].startswith("graphql_ws-resolver") for item in items)
+    assert context.sent[-1]["type"] == constants.GQL_COMPLETE
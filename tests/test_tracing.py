@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from graphql.execution import ExecutionResult
+
+from graphql_ws import base, base_sync, constants, tracing
+
+from .test_base_async import TstConnectionContext, TstServer, schema, start_message
+
+
+class RecordingTracer(tracing.Tracer):
+    def __init__(self):
+        self.started = []
+        self.ended = []
+
+    def on_start(self, span):
+        self.started.append(span)
+
+    def on_end(self, span):
+        self.ended.append(span)
+
+    def phases(self, op_id=None):
+        return [span.phase for span in self.ended if span.op_id == op_id]
+
+
+def test_span():
+    tracer = RecordingTracer()
+    with tracer.span(tracing.ENCODE, "context", "1") as span:
+        assert tracer.started == [span]
+        assert span.duration is None
+    assert tracer.ended == [span]
+    assert span.duration >= 0
+    assert span.error is None
+    assert (span.phase, span.connection_context, span.op_id) == (
+        tracing.ENCODE,
+        "context",
+        "1",
+    )
+
+
+def test_span_error():
+    tracer = RecordingTracer()
+    error = ValueError("failed")
+    with pytest.raises(ValueError):
+        with tracer.span(tracing.EXECUTE):
+            raise error
+    assert tracer.ended[0].error is error
+
+
+class SyncConnectionContext(base.BaseConnectionContext):
+    closed = False
+
+    def send_encoded(self, frame):
+        self.frame = frame
+
+
+def test_trace_sync_send():
+    tracer = RecordingTracer()
+    server = base_sync.BaseSyncSubscriptionServer(
+        schema=None, keep_alive=False, tracer=tracer
+    )
+    context = SyncConnectionContext(ws=None)
+    context.register_operation("1", None)
+    server.send_execution_result(context, "1", ExecutionResult(data={"hello": 1}))
+    assert json.loads(context.frame)["payload"] == {"data": {"hello": 1}}
+    assert tracer.phases("1") == [tracing.SERIALIZE, tracing.ENCODE, tracing.WRITE]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("native", [False, True])
+async def test_trace_subscription(native):
+    tracer = RecordingTracer()
+    server = TstServer(
+        schema=schema, keep_alive=False, native_subscriptions=native, tracer=tracer
+    )
+    context = TstConnectionContext(ws=None)
+    await server.on_message(context, json.dumps(start_message("1", up_to=2)))
+    assert [message["type"] for message in context.sent] == [
+        constants.GQL_DATA,
+        constants.GQL_DATA,
+        constants.GQL_COMPLETE,
+    ]
+    assert tracer.phases() == [tracing.DECODE]
+    sent = [tracing.ENCODE, tracing.WRITE]
+    event = [tracing.RESOLVE, tracing.SERIALIZE] + sent
+    assert tracer.phases("1") == [tracing.PARSE, tracing.EXECUTE] + event * 2 + sent
+    assert all(span.connection_context is context for span in tracer.ended)
+    assert len(tracer.started) == len(tracer.ended)
+
+
+@pytest.mark.asyncio
+async def test_trace_decode_error():
+    tracer = RecordingTracer()
+    server = TstServer(schema=schema, keep_alive=False, tracer=tracer)
+    context = TstConnectionContext(ws=None)
+    await server.on_message(context, "'not-json")
+    assert isinstance(tracer.ended[0].error, ValueError)
+    assert context.sent[0]["type"] == constants.GQL_ERROR
+
+
+@pytest.mark.asyncio
+async def test_trace_shared_subscription():
+    tracer = RecordingTracer()
+    server = TstServer(
+        schema=schema, keep_alive=False, share_subscriptions=True, tracer=tracer
+    )
+    context = TstConnectionContext(ws=None)
+    await server.process_message(context, start_message("1", up_to=1))
+    assert tracer.phases() == [tracing.RESOLVE, tracing.SERIALIZE, tracing.ENCODE]
+    assert tracer.phases("1") == [
+        tracing.PARSE,
+        tracing.EXECUTE,
+        tracing.WRITE,
+        tracing.ENCODE,
+        tracing.WRITE,
+    ]
@@ -0,0 +1,42 @@
+from unittest import mock
+
+import pytest
+
+from graphql_ws.outbound import OutboundQueue
+
+try:
+    import websockets
+    from graphql_ws.websockets_lib import WsLibConnectionContext
+except ImportError:  # pragma: no cover
+    websockets = None
+
+pytestmark = [
+    pytest.mark.skipif(websockets is None, reason="websockets is not installed"),
+    pytest.mark.asyncio,
+]
+
+
+async def test_send_encoded_batch():
+    frames = ['{"n": 1}', b'{"n": 2}', "x" * 200, "x" * 70000]
+    sent = []
+
+    async def handler(ws, path=None):
+        connection_context = WsLibConnectionContext(ws)
+        with mock.patch.object(ws, "send") as send:
+            await connection_context.send_encoded_batch(frames)
+        assert not send.called
+        # Queued frames are encoded straight to bytes.
+        assert isinstance(connection_context.encode({"n": 1}), str)
+        connection_context.start_writer(OutboundQueue())
+        assert isinstance(connection_context.encode({"n": 1}), bytes)
+        connection_context.stop_writer()
+        sent.append(len(frames))
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        async with websockets.connect("ws://127.0.0.1:{}".format(port)) as ws:
+            received = [await ws.recv() for frame in frames]
+    assert received == [
+        frame.decode() if isinstance(frame, bytes) else frame for frame in frames
+    ]
+    assert sent == [4]